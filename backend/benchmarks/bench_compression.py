@@ -0,0 +1,54 @@
+"""
+Estimates the wall-clock time of sending a graph download and a model upload over slow links, with and without compression.
+
+    python benchmarks/bench_compression.py [number of atoms and nodes]
+
+The time of a transfer is the measured compression and decompression time plus the payload size over the bandwidth.
+zstd is measured if zstandard is installed.
+"""
+import sys
+import time
+
+import networkx as nx
+
+from viasp.shared.compression import compress, content_encodings, decompress
+from viasp.shared.io import dumps
+
+sys.path.insert(0, __file__.rsplit("/", 1)[0])
+from bench_serialization import make_graph  # noqa: E402
+from bench_wire_formats import make_models  # noqa: E402
+
+BANDWIDTHS = {"10 Mbit/s": 10e6 / 8, "100 Mbit/s": 100e6 / 8, "1 Gbit/s": 1e9 / 8}
+LEVELS = {"gzip": [1, 6, 9], "zstd": [1, 3, 9]}
+
+
+def best_of(function, repeat=3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def measure(title, payload: bytes):
+    print(f"{title}: {len(payload) / 1e6:.2f} MB")
+    print(f"{'':>14} {'size':>9} " + " ".join(f"{name:>11}" for name in BANDWIDTHS))
+    rows = [("uncompressed", 0, payload)]
+    for encoding in content_encodings():
+        for level in LEVELS[encoding]:
+            compress_time, compressed = best_of(lambda: compress(payload, encoding, level))
+            decompress_time, _ = best_of(lambda: decompress(compressed, encoding))
+            rows.append((f"{encoding} {level}", compress_time + decompress_time, compressed))
+    for name, codec_time, data in rows:
+        times = " ".join(f"{codec_time + len(data) / bandwidth:10.3f}s" for bandwidth in BANDWIDTHS.values())
+        print(f"{name:>14} {len(data) / 1e6:7.2f}MB {times}")
+
+
+def main(size: int):
+    measure(f"download of a graph with {size} nodes", dumps(nx.node_link_data(make_graph(size))).encode("utf-8"))
+    measure(f"upload of 4 models with {size} atoms each", dumps(make_models(size)).encode("utf-8"))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
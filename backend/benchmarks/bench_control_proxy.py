@@ -0,0 +1,74 @@
+"""
+Compares the overhead of viASP's Control proxy with clingo's Control in a multi-shot loop,
+which assigns an external, solves and reads the symbolic atoms in every step.
+
+    python benchmarks/bench_control_proxy.py [number of steps]
+
+The proxy records its calls with a client that only collects them, so no request is sent.
+"""
+import sys
+import time
+from typing import Any, Dict, Sequence
+
+from clingo import Control as InnerControl, Function, Number
+
+from viasp.shared.interfaces import ViaspClient
+from viasp.shared.model import ClingoMethodCall, Signature
+from viasp.wrapper import Control
+
+PROGRAM = "#external e(1..10). a(X) :- e(X). {b(X)} :- a(X)."
+
+
+class CollectingClient(ViaspClient):
+
+    def __init__(self):
+        self.calls = []
+
+    def is_available(self):
+        return True
+
+    def register_function_call(self, name: str, sig: Signature, args: Sequence[Any], kwargs: Dict[str, Any]):
+        self.calls.append(ClingoMethodCall.merge(name, sig, args, kwargs))
+
+    def set_target_stable_model(self, stable_models):
+        pass
+
+    def show(self):
+        pass
+
+
+def run(ctl, steps: int):
+    ctl.add("base", [], PROGRAM)
+    ctl.ground([("base", [])])
+    for step in range(steps):
+        ctl.assign_external(Function("e", [Number(step % 10 + 1)]), step % 2 == 0)
+        ctl.solve()
+        len(ctl.symbolic_atoms)
+        ctl.configuration.solve.models
+
+
+def best_of(function, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(steps: int):
+    controls = {
+        "clingo": lambda: InnerControl(["0"]),
+        "viasp, all recorded": lambda: Control(["0"], _viasp_client=CollectingClient()),
+        "viasp, none recorded": lambda: Control(["0"], _viasp_client=CollectingClient(), recorded_methods=()),
+    }
+    baseline = None
+    print(f"{steps} steps")
+    for name, create in controls.items():
+        seconds = best_of(lambda: run(create(), steps))
+        baseline = baseline or seconds
+        print(f"{name:>22} {seconds:8.3f}s {seconds / baseline:6.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
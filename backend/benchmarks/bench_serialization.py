@@ -0,0 +1,69 @@
+"""
+Compares the JSON serialization of node-link graphs.
+
+    python benchmarks/bench_serialization.py [number of nodes]
+
+"legacy" emulates the previous encoder: isinstance dispatch only, atoms sorted on every encode,
+indented output of the pure Python json encoder, as it was used to store the graph.
+"""
+import json
+import sys
+import time
+from unittest import mock
+
+import networkx as nx
+from clingo import Function, Number
+
+from viasp.shared import io
+from viasp.shared.io import DataclassJSONEncoder, dumps
+from viasp.shared.model import Node, SymbolIdentifier, Transformation
+
+
+def make_graph(size: int) -> nx.DiGraph:
+    graph = nx.DiGraph()
+    atoms = set()
+    previous = None
+    for i in range(size):
+        diff = frozenset([SymbolIdentifier(Function("p", [Number(i), Function(f"s{i % 7}")]))])
+        atoms = atoms.union(diff) if i % 10 else set(diff)
+        node = Node(diff, i, frozenset(atoms))
+        if previous is not None:
+            graph.add_edge(previous, node, transformation=Transformation(i, (), (f"p({i},X) :- q(X).",)))
+        else:
+            graph.add_node(node)
+        previous = node
+    return graph
+
+
+def measure(name, serialize, data, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        io.encode_symbol.cache_clear()
+        start = time.perf_counter()
+        result = serialize(data)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:>12}: {best:.3f}s ({len(result) / 1e6:.1f} MB)")
+    return result
+
+
+def legacy(data):
+    def uncached(self, name):
+        return sorted(getattr(self, name), key=lambda x: x.symbol)
+    with mock.patch.dict(io.ENCODERS, clear=True), mock.patch.object(Node, "_get_sorted", uncached):
+        return json.dumps(data, cls=DataclassJSONEncoder, ensure_ascii=False, indent=2)
+
+
+def main(size: int):
+    data = nx.node_link_data(make_graph(size))
+    print(f"node-link graph with {size} nodes")
+    expected = json.loads(measure("legacy", legacy, data))
+    for backend in ("json", "orjson"):
+        if backend == "orjson" and io.orjson is None:
+            print(f"{backend:>12}: not installed")
+            continue
+        result = measure(backend, lambda d: dumps(d, backend=backend), data)
+        assert json.loads(result) == expected
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,65 @@
+"""
+Compares the wire formats of model uploads and graph downloads: payload size, encode and decode time.
+
+    python benchmarks/bench_wire_formats.py [number of atoms and nodes]
+
+MessagePack and CBOR are measured if msgpack and cbor2 are installed.
+"""
+import sys
+import time
+
+import networkx as nx
+from clingo import Function, Number
+
+from viasp.shared import io
+from viasp.shared.defaults import JSON_MIMETYPE
+from viasp.shared.io import dumps, loads, binary_mimetypes, dumps_binary, loads_binary
+from viasp.shared.model import StableModel
+
+sys.path.insert(0, __file__.rsplit("/", 1)[0])
+from bench_serialization import make_graph  # noqa: E402
+
+
+def make_models(size: int, count: int = 4):
+    return [StableModel(atoms=[Function("p", [Number(i), Function("q", [Function(f"s{i % 7}"), Number(m)])])
+                               for i in range(size)]) for m in range(count)]
+
+
+def best_of(function, repeat=3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        io.encode_symbol.cache_clear()
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def measure(title, data):
+    print(title)
+    formats = [JSON_MIMETYPE] + binary_mimetypes()
+    for mimetype in formats:
+        for compact_symbols in [False, True]:
+            if mimetype == JSON_MIMETYPE:
+                encode = lambda: dumps(data, compact_symbols=compact_symbols).encode("utf-8")
+                decode = loads
+            else:
+                encode = lambda: dumps_binary(data, mimetype, compact_symbols)
+                decode = lambda payload: loads_binary(payload, mimetype)
+            encode_time, payload = best_of(encode)
+            decode_time, _ = best_of(lambda: decode(payload))
+            symbols = "text" if compact_symbols else "dict"
+            print(f"{mimetype:>20} {symbols:>4}: {len(payload) / 1e6:6.2f} MB, "
+                  f"encode {encode_time:.3f}s, decode {decode_time:.3f}s")
+    for name in ["msgpack", "cbor2"]:
+        if getattr(io, name) is None:
+            print(f"{name:>20}: not installed")
+
+
+def main(size: int):
+    measure(f"upload of 4 models with {size} atoms each", make_models(size))
+    measure(f"download of a graph with {size} nodes", nx.node_link_data(make_graph(size)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -19,8 +19,9 @@ from clingo import ast
 from clingo.ast import AST, ASTSequence, ASTType, Transformer
 from clingo.symbol import Symbol
 
-from .shared.defaults import STDIN_TMP_STORAGE_PATH
 from .shared.io import clingo_symbols_to_stable_model
+from .server.database import ProgramFileStore
+from .asp.parse_cache import parse_program
 from .wrapper import ShowConnector, Control as viaspControl
 from .exceptions import InvalidSyntax
 
@@ -55,13 +56,10 @@ def _get_connector(**kwargs):
 
 
 def _get_program_string(path: Union[str, List[str]]) -> str:
-    prg = ""
     if isinstance(path, str):
         path = [path]
-    for p in path:
-        with open(p, encoding="utf-8") as f:
-            prg += "".join(f.readlines())
-    return prg
+    store = ProgramFileStore()
+    return "".join(store.read(p)[1] for p in path)
 
 
 def load_program_file(path: Union[str, List[str]], **kwargs) -> None:
@@ -75,6 +73,7 @@ def load_program_file(path: Union[str, List[str]], **kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
     
     See Also
     --------
@@ -99,16 +98,16 @@ def load_program_string(program: str, **kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
     
     See Also
     --------
     ``load_program_file``
     """
     connector = _get_connector(**kwargs)
-    with open(STDIN_TMP_STORAGE_PATH, "w", encoding="utf-8") as f:
-        f.write(program)
+    path = ProgramFileStore().put(program)
     connector.register_function_call("load", signature(
-        InnerControl.load), [], kwargs={"path": STDIN_TMP_STORAGE_PATH})
+        InnerControl.load), [], kwargs={"path": path})
 
 
 
@@ -136,6 +135,7 @@ def add_program_file(*args, **kwargs):
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) -- 
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
 
     See Also
     --------
@@ -180,6 +180,7 @@ def add_program_string(*args, **kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
 
     See also
     ---------
@@ -217,6 +218,7 @@ def show(**kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
 
     """
     connector = _get_connector(**kwargs)
@@ -235,6 +237,7 @@ def mark_from_clingo_model(model: clingo_Model, **kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
 
     See Also
     --------
@@ -257,6 +260,7 @@ def unmark_from_clingo_model(model: clingo_Model, **kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
     
     See Also
     --------
@@ -277,6 +281,7 @@ def clear(**kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
 
     """
     connector = _get_connector(**kwargs)
@@ -295,6 +300,7 @@ def get_relaxed_program(*args, **kwargs) -> Union[str, None]:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
     
     See also
     --------
@@ -318,6 +324,7 @@ def relax_constraints(*args, **kwargs) -> viaspControl:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
 
     See also
     --------
@@ -343,6 +350,7 @@ def clingraph(viz_encoding, engine="dot", graphviz_type="graph", **kwargs) -> No
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
     
     Note
     --------
@@ -369,6 +377,7 @@ def register_transformer(transformer: Transformer, imports: str = "", path: str
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
     """
     connector = _get_connector(**kwargs)
     connector.register_transformer(transformer, imports, path)
@@ -473,12 +482,9 @@ def parse_fact_string(aspstr: str, raise_nonfact: bool = False) -> List[Symbol]:
         if raise_nonfact:
             with ast.ProgramBuilder(ctl) as bld:
                 nfv = NonFactVisitor()
-
-                def on_rule(ast: AST) -> None:
-                    nonlocal nfv, bld
-                    if nfv: nfv(ast)
-                    bld.add(ast)
-                ast.parse_string(aspstr, on_rule)
+                for statement in parse_program(aspstr).statements:
+                    nfv(statement)
+                    bld.add(statement)
         else:
             ctl.add("base", [], aspstr)
     except ClingoParserWrapperError as e:
@@ -508,6 +514,7 @@ def mark_from_string(model: str, **kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
         
     :raises: :py:class:`InvalidSyntax` if the string contains non-facts.
 
@@ -546,6 +553,7 @@ def mark_from_file(path: Union[str, List[str]], **kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
     
     :raises: :py:class:`InvalidSyntax` if the string contains non-facts.
 
@@ -578,6 +586,7 @@ def unmark_from_string(model: str, **kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
 
     :raises: :py:class:`InvalidSyntax` if the string contains non-facts.
 
@@ -616,6 +625,7 @@ def unmark_from_file(path: str, **kwargs) -> None:
           url of the viasp backend
         * *_viasp_client* (``ClingoClient``) --
           a viasp client object
+        * the options of the connection to the backend, see ``viasp.wrapper.ShowConnector``
     
     :raises: :py:class:`InvalidSyntax` if the string contains non-facts.
 
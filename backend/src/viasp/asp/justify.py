@@ -9,7 +9,7 @@ from clingo import Control, Symbol, Model, ast
 from clingo.ast import AST, Function
 from networkx import DiGraph
 
-from .reify import ProgramAnalyzer, has_an_interval
+from .reify import ProgramAnalyzer, has_an_interval, extract_ground_facts
 from .recursion import RecursionReasoner
 from .utils import insert_atoms_into_nodes, identify_reasons
 from ..shared.model import Node, Transformation, SymbolIdentifier
@@ -45,9 +45,12 @@ def get_h_symbols_from_model(wrapped_stable_model: Iterable[Symbol],
 
 
 def get_facts(original_program) -> Collection[Symbol]:
+    as_string = "".join(map(str, original_program))
+    ground_facts = extract_ground_facts(as_string)
+    if ground_facts is not None:
+        return frozenset(ground_facts)
     ctl = Control()
     facts = set()
-    as_string = "".join(map(str, original_program))
     ctl.add("__facts", [], as_string)
     ctl.ground([("__facts", [])])
     for atom in ctl.symbolic_atoms:
@@ -0,0 +1,101 @@
+"""Parsed programs, cached by their text and position, so every program version is parsed once."""
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+from clingo.ast import AST, ASTType, Location, parse_string
+
+from ..shared.defaults import PARSE_CACHE_SIZE
+
+
+class SourceIndex:
+    """
+    Byte offsets of the line starts of a program, to look up the source text of locations.
+    The program can be a part of a larger program that starts at the given 0-based line and column.
+    """
+
+    def __init__(self, program: str, line: int = 0, column: int = 0):
+        self.data = program.encode("utf-8")
+        self.line = line
+        self.column = column
+        self.line_starts = [0]
+        position = self.data.find(b"\n")
+        while position != -1:
+            self.line_starts.append(position + 1)
+            position = self.data.find(b"\n", position + 1)
+
+    def offset(self, line: int, column: int) -> int:
+        """
+        Returns the byte offset of a clingo position (1-based line and byte column) in the program.
+        """
+        local_line = line - 1 - self.line
+        if local_line == 0:
+            return column - 1 - self.column
+        return self.line_starts[local_line] + column - 1
+
+    def get_span(self, location: Location) -> Tuple[int, int]:
+        return (self.offset(location.begin.line, location.begin.column),
+                self.offset(location.end.line, location.end.column))
+
+    def get_source(self, location: Location) -> str:
+        begin, end = self.get_span(location)
+        return self.data[begin:end].decode("utf-8")
+
+
+class ParsedProgram:
+    """
+    The statements of a program, as emitted by ``clingo.ast.parse_string``, and the index of its source.
+    The statements are shared between all users of the cache and must not be modified.
+    """
+
+    def __init__(self, program: str, statements: Sequence[AST], line: int = 0, column: int = 0):
+        self.program = program
+        self.statements: Tuple[AST, ...] = tuple(statements)
+        self.source = SourceIndex(program, line, column)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_program(program: str, line: int = 0, column: int = 0) -> ParsedProgram:
+    """
+    Parses a program that starts at the given 0-based line and column of a larger program,
+    so that the locations of its statements refer to the larger program.
+
+    :raises RuntimeError: if the program is not syntactically correct.
+    """
+    statements: List[AST] = []
+    parse_string("\n" * line + " " * column + program, statements.append)
+    return ParsedProgram(program, statements, line, column)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def get_source_index(program: str) -> SourceIndex:
+    return SourceIndex(program)
+
+
+def parse_programs(programs: Sequence[str]) -> List[AST]:
+    """
+    Returns the statements of the concatenation of the programs, parsing every part on its own.
+    The implicit ``#program base.`` of all but the first part is left out.
+    """
+    statements: List[AST] = []
+    line, column = 0, 0
+    for i, program in enumerate(programs):
+        parsed = parse_program(program, line, column)
+        statements.extend(statement for statement in parsed.statements
+                          if i == 0 or not is_implicit_program_statement(statement))
+        line, column = advance_position(line, column, program)
+    return statements
+
+
+def is_implicit_program_statement(statement: AST) -> bool:
+    return statement.ast_type == ASTType.Program and statement.location.begin == statement.location.end
+
+
+def advance_position(line: int, column: int, program: str) -> Tuple[int, int]:
+    """
+    Returns the line and column offset after appending the program at the given offset.
+    Like clingo's locations, columns count bytes.
+    """
+    newlines = program.count("\n")
+    if newlines == 0:
+        return line, column + len(program.encode("utf-8"))
+    return line + newlines, len(program[program.rfind("\n") + 1:].encode("utf-8"))
@@ -1,5 +1,6 @@
 from collections import defaultdict
-from typing import Dict, List, Tuple, Iterable, Set, Collection, Any, Union, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Iterable, Set, Collection, Any, Union, Sequence, Optional
 
 import clingo
 import networkx as nx
@@ -9,6 +10,8 @@ from clingo.ast import Transformer, parse_string, Rule, ASTType, AST, Literal, M
 from .utils import is_constraint, merge_constraints, topological_sort
 from ..asp.utils import merge_cycles, remove_loops
 from viasp.asp.ast_types import SUPPORTED_TYPES, ARITH_TYPES, UNSUPPORTED_TYPES, UNKNOWN_TYPES
+from .parse_cache import SourceIndex, advance_position, get_source_index, parse_program
+from ..shared.defaults import ANALYSIS_PROCESSES, PARALLEL_ANALYSIS_THRESHOLD
 from ..shared.model import Transformation, TransformationError, FailedReason
 from ..shared.simple_logging import warn, error
 
@@ -204,16 +207,25 @@ class ProgramAnalyzer(DependencyCollector, FilteredTransformer):
         self.positive_conditions: Dict[Tuple[str, int], Set[Rule]] = defaultdict(set)
         self.rule2signatures = defaultdict(set)
         self.facts: Set[Symbol] = set()
+        self.fact_symbols: Set[Symbol] = set()
+        self._facts_cache: Optional[List[Symbol]] = None
         self.constants: Set[Symbol] = set()
         self.constraints: Set[Rule] = set()
         self.pass_through: Set[AST] = set()
         self.rules: List[Rule] = []
         self.names: Set[str] = set()
+        self._end: Tuple[int, int] = (0, 0)
+        self._dependency_graph = nx.DiGraph()
+        self._sorted: Optional[List[frozenset]] = None
+        self._unsorted_rules: List[Rule] = []
+        self._source: Optional[SourceIndex] = None
+        self.rule_sources: Dict[Rule, str] = {}
 
     def _get_conflict_free_version_of_name(self, name: str) -> Collection[str]:
         candidates = [name for name, _ in self.dependants.keys()]
         candidates.extend([name for name, _ in self.conditions.keys()])
         candidates.extend([getattr(getattr(getattr(fact,"atom"), "symbol"), "name", "") for fact in self.facts])
+        candidates.extend([fact.name for fact in self.fact_symbols if fact.type == clingo.SymbolType.Function])
         candidates.extend([name for name in self.names])
         candidates = set(candidates)
         current_best = name
@@ -247,8 +259,35 @@ class ProgramAnalyzer(DependencyCollector, FilteredTransformer):
         """
         return self._get_conflict_free_version_of_name("n")
 
-    def get_facts(self):
-        return extract_symbols(self.facts, self.constants)
+    def get_facts(self) -> List[Symbol]:
+        """
+        Returns the symbols of all facts. Ground facts are converted directly,
+        only facts with intervals, pools, arithmetic or constants are grounded.
+        The result is cached until facts or constants are added.
+        """
+        if self._facts_cache is None:
+            constant_names = {str(constant.name) for constant in self.constants}
+
+            def uses_constants(text: str, symbol: Symbol) -> bool:
+                return any(name in text for name in constant_names) and mentions_any_name(symbol, constant_names)
+
+            direct: Set[Symbol] = set()
+            needs_grounding: List[Union[AST, Symbol]] = []
+            facts = list(self.facts)
+            texts = list(map(str, facts))
+            for fact, text, symbol in zip(facts, texts, ground_terms_to_symbols(texts)):
+                if symbol is None or uses_constants(text, symbol):
+                    needs_grounding.append(fact)
+                else:
+                    direct.add(symbol)
+            for symbol in self.fact_symbols:
+                if constant_names and uses_constants(str(symbol), symbol):
+                    needs_grounding.append(symbol)
+                else:
+                    direct.add(symbol)
+            grounded = extract_symbols(needs_grounding, self.constants) if needs_grounding else []
+            self._facts_cache = grounded + list(direct.difference(grounded))
+        return self._facts_cache
 
     def get_constants(self):
         return self.constants
@@ -264,10 +303,13 @@ class ProgramAnalyzer(DependencyCollector, FilteredTransformer):
             self.conditions[c_sig].add(rule)
 
     def register_rule_dependencies(self, rule: Rule, deps: Dict[Literal, List[Literal]]) -> None:
+        condition_signatures = set()
+        head_signatures = set()
         for uu in deps.values():
             for u in filter(filter_body_arithmetic,uu):
                 u_sig = make_signature(u)
                 self.conditions[u_sig].add(rule)
+                condition_signatures.add(u_sig)
                 for body_item in rule.body:
                     if hasattr(body_item, "atom") and hasattr(body_item.atom, "ast_type") and body_item.atom.ast_type == ASTType.SymbolicAtom:
                         if (
@@ -283,6 +325,25 @@ class ProgramAnalyzer(DependencyCollector, FilteredTransformer):
         for v in filter(lambda symbol: symbol.atom.ast_type != ASTType.BooleanConstant if hasattr(symbol, "atom") else False, deps.keys()):
             v_sig = make_signature(v)
             self.dependants[v_sig].add(rule)
+            head_signatures.add(v_sig)
+        self.link_rule(rule, head_signatures, condition_signatures)
+
+    def link_rule(self, rule: Rule, head_signatures: Set[Tuple[str, int]],
+                  condition_signatures: Set[Tuple[str, int]]) -> None:
+        """
+        Adds the rule to the dependency graph, with the same nodes and edges ``make_dependency_graph``
+        creates for it, so the graph does not have to be rebuilt when the program grows.
+        """
+        if not head_signatures and not condition_signatures:
+            return
+        node = frozenset([rule])
+        self._dependency_graph.add_node(node)
+        for signature in head_signatures:
+            for dependent_rule in self.conditions.get(signature, []):
+                self._dependency_graph.add_edge(node, frozenset([dependent_rule]))
+        for signature in condition_signatures:
+            for parent_rule in self.dependants.get(signature, []):
+                self._dependency_graph.add_edge(frozenset([parent_rule]), node)
 
     def visit_Rule(self, rule: Rule):
         deps = defaultdict(list)
@@ -293,6 +354,7 @@ class ProgramAnalyzer(DependencyCollector, FilteredTransformer):
 
         if is_fact(rule, deps):
             self.facts.add(rule.head)
+            self._facts_cache = None
         if not len(deps) and len(rule.body):
             deps[rule.head] = []
         for _, cond in deps.items():
@@ -302,6 +364,27 @@ class ProgramAnalyzer(DependencyCollector, FilteredTransformer):
         self.names = self.names.union(names)
         self.register_rule_dependencies(rule, deps)
         self.rules.append(rule)
+        self._unsorted_rules.append(rule)
+        self.register_rule_source(rule)
+
+    def register_rule_source(self, rule: Rule) -> None:
+        """
+        Keeps the source text of the rule, if it is read from a parsed program.
+        """
+        if self._source is None or rule in self.rule_sources:
+            return
+        try:
+            self.rule_sources[rule] = self._source.get_source(rule.location)
+        except (IndexError, ValueError):
+            self.rule_sources[rule] = str(rule)
+
+    def visit_parsed(self, statements: Sequence[AST], source: SourceIndex) -> None:
+        self._source = source
+        try:
+            for statement in statements:
+                self.visit(statement)
+        finally:
+            self._source = None
     
     def get_body_aggregate_elements(self, body: Sequence[AST]) -> List[AST]:
         body_aggregate_elements: List[AST] = []
@@ -318,9 +401,16 @@ class ProgramAnalyzer(DependencyCollector, FilteredTransformer):
 
     def visit_Definition(self, definition):
         self.constants.add(definition)
+        self._facts_cache = None
         return definition
 
     def add_program(self, program: str, registered_transformer: Transformer = None) -> None:
+        """
+        Adds a program to the analysis. Only the new statements are parsed, they are positioned
+        so that their locations refer to the concatenation of all programs added so far.
+        """
+        line, column = self._end
+        parsed = parse_program(program, line, column)
         if registered_transformer is not None:
             registered_visitor = registered_transformer()
             new_program: List[AST] = []
@@ -331,20 +421,158 @@ class ProgramAnalyzer(DependencyCollector, FilteredTransformer):
                     new_program.extend(statement)
                 else:
                     new_program.append(statement)
-            parse_string(program, lambda statement: add(registered_visitor.visit(statement)))
-            for statement in new_program:
-                self.visit(statement)
+            for statement in parsed.statements:
+                add(registered_visitor.visit(statement))
+            self.visit_parsed(new_program, parsed.source)
         else: 
-            parse_string(program, lambda statement: self.visit(statement))
+            self.visit_parsed(parsed.statements, parsed.source)
+        self._end = advance_position(line, column, program)
+
+    def add_programs(self, programs: Sequence[str], registered_transformer: Transformer = None,
+                     processes: Optional[int] = None,
+                     parallel_threshold: int = PARALLEL_ANALYSIS_THRESHOLD) -> None:
+        """
+        Adds a program that is split into several parts, e.g. one per loaded file, after the programs added so far.
+
+        Parts that only contain ground facts skip the transformer and are turned into symbols directly.
+        If the parts are large enough, they are parsed in a process pool. All other parts are
+        analyzed in this process, positioned so that their locations refer to the concatenated program.
+
+        :param programs: The parts of the program in the order they were added.
+        :param registered_transformer: A transformer for the program. If given, the program is analyzed as a whole.
+        :param processes: The maximal number of worker processes. Defaults to ``ANALYSIS_PROCESSES``.
+        :param parallel_threshold: The minimal size of the program in characters to use the process pool.
+        """
+        if registered_transformer is not None:
+            self.add_program("".join(programs), registered_transformer)
+            return
+        if processes is None:
+            processes = ANALYSIS_PROCESSES
+        if processes > 1 and len(programs) > 1 and sum(map(len, programs)) >= parallel_threshold:
+            with ProcessPoolExecutor(max_workers=min(processes, len(programs))) as pool:
+                extracted = [None if fact_strings is None else ground_terms_to_symbols(fact_strings)
+                             for fact_strings in pool.map(extract_ground_fact_strings, programs)]
+        else:
+            extracted = list(map(extract_ground_facts, programs))
+
+        line, column = self._end
+        for program, fact_symbols in zip(programs, extracted):
+            if fact_symbols is not None:
+                self.fact_symbols.update(fact_symbols)
+                self._facts_cache = None
+            else:
+                parsed = parse_program(program, line, column)
+                self.visit_parsed(parsed.statements, parsed.source)
+            line, column = advance_position(line, column, program)
+        self._end = (line, column)
+
+    def to_snapshot(self, program: str) -> Dict[str, Any]:
+        """
+        Returns the state of the analyzer as a JSON serializable dictionary.
+        Rules and constants are stored with their source text and location in ``program``,
+        so that ``from_snapshot`` only needs to parse them again, not to analyze them.
+        Pass through statements are rewritten by clingo and are stored as strings.
+        """
+        statements = list(self.rules)
+        statements.extend(self.constants)
+        statements.sort(key=lambda statement: (statement.location.begin.line, statement.location.begin.column))
+        index = {id(statement): i for i, statement in enumerate(statements)}
+        fact_index = {statement.head: i for i, statement in enumerate(statements)
+                      if statement.ast_type == ASTType.Rule and not len(statement.body)}
+        source = get_source_index(program)
+
+        def dump_dependencies(dependencies: Dict[Tuple[Any, int], Set[Rule]]) -> List[Any]:
+            # Body aggregates are their own signature, they are kept by their string representation
+            return [[str(name), arity, sorted(index[id(rule)] for rule in rules)]
+                    for (name, arity), rules in dependencies.items()]
+
+        return {
+            "statements": [[statement.location.begin.line, statement.location.begin.column,
+                            source.get_source(statement.location)]
+                           for statement in statements],
+            "rules": [index[id(rule)] for rule in self.rules],
+            "facts": sorted(fact_index[fact] for fact in self.facts),
+            "fact_symbols": [str(symbol) for symbol in self.fact_symbols],
+            "constants": sorted(index[id(constant)] for constant in self.constants),
+            "pass_through": [str(statement) for statement in self.pass_through],
+            "dependants": dump_dependencies(self.dependants),
+            "conditions": dump_dependencies(self.conditions),
+            "positive_conditions": dump_dependencies(self.positive_conditions),
+            "names": sorted(self.names),
+            "filtered": [[str(f.ast), f.reason.value] for f in self._filtered],
+            "end": list(self._end),
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> "ProgramAnalyzer":
+        """
+        Restores an analyzer from the result of ``to_snapshot``.
+        All statements are parsed at once at their original location.
+
+        :raises ValueError: if the statements can not be restored.
+        """
+        analyzer = cls()
+        text: List[str] = []
+        line, column = 1, 1
+        for begin_line, begin_column, source in snapshot["statements"]:
+            if (begin_line, begin_column) < (line, column):
+                raise ValueError("Overlapping statements in snapshot.")
+            if begin_line > line:
+                text.append("\n" * (begin_line - line))
+                line, column = begin_line, 1
+            text.append(" " * (begin_column - column))
+            text.append(source)
+            line, column = advance_position(begin_line - 1, begin_column - 1, source)
+            line, column = line + 1, column + 1
+
+        statements: List[AST] = []
+        parse_string("".join(text), lambda statement: statements.append(statement)
+                     if statement.ast_type != ASTType.Program else None)
+        if len(statements) != len(snapshot["statements"]) or \
+                any((statement.location.begin.line, statement.location.begin.column) != (begin_line, begin_column)
+                    for statement, (begin_line, begin_column, _) in zip(statements, snapshot["statements"])):
+            raise ValueError("Snapshot does not match the parsed statements.")
+        pass_through: List[AST] = []
+        parse_string("".join(snapshot["pass_through"]), lambda statement: pass_through.append(statement)
+                     if statement.ast_type != ASTType.Program else None)
+
+        def load_dependencies(dumped: List[Any]) -> Dict[Tuple[str, int], Set[Rule]]:
+            dependencies = defaultdict(set)
+            for name, arity, rules in dumped:
+                dependencies[(name, arity)] = set(statements[i] for i in rules)
+            return dependencies
+
+        analyzer.rules = [statements[i] for i in snapshot["rules"]]
+        for i in snapshot["rules"]:
+            analyzer.rule_sources.setdefault(statements[i], snapshot["statements"][i][2])
+        analyzer.facts = set(statements[i].head for i in snapshot["facts"])
+        analyzer.fact_symbols = set(ground_terms_to_symbols(snapshot["fact_symbols"]))
+        analyzer.constants = set(statements[i] for i in snapshot["constants"])
+        analyzer.pass_through = set(pass_through)
+        analyzer.dependants = load_dependencies(snapshot["dependants"])
+        analyzer.conditions = load_dependencies(snapshot["conditions"])
+        analyzer.positive_conditions = load_dependencies(snapshot["positive_conditions"])
+        analyzer.names = set(snapshot["names"])
+        analyzer._filtered = [TransformationError(ast, FailedReason(reason)) for ast, reason in snapshot["filtered"]]
+        analyzer._end = tuple(snapshot["end"])
+        analyzer._dependency_graph = analyzer.make_dependency_graph(analyzer.dependants, analyzer.conditions)
+        analyzer._unsorted_rules = list(analyzer.rules)
+        return analyzer
 
     def sort_program(self, program) -> List[Transformation]:
-        parse_string(program, lambda rule: self.visit(rule))
-        sorted_program = self.sort_program_by_dependencies()
-        return [Transformation(i, prg) for i, prg in enumerate(sorted_program)]
+        self.add_program(program)
+        return self.get_sorted_program()
 
     def get_sorted_program(self) -> List[Transformation]:
         sorted_program = self.sort_program_by_dependencies()
-        return [Transformation(i, prg) for i, prg in enumerate(sorted_program)]
+        return [Transformation(i, prg, self.get_rule_sources(prg)) for i, prg in enumerate(sorted_program)]
+
+    def get_rule_sources(self, rules: Iterable[Rule]) -> List[str]:
+        """
+        Returns the source texts of the rules, or an empty list if not all of them are known.
+        """
+        sources = [self.rule_sources.get(rule) for rule in rules]
+        return [] if None in sources else sources
 
     def make_dependency_graph(self, head_dependencies: Dict[Tuple[str, int], Iterable[clingo.ast.AST]],
                               body_dependencies: Dict[Tuple[str, int], Iterable[clingo.ast.AST]]) -> nx.DiGraph:
@@ -374,12 +602,36 @@ class ProgramAnalyzer(DependencyCollector, FilteredTransformer):
         return g
 
     def sort_program_by_dependencies(self):
-        deps = self.make_dependency_graph(self.dependants, self.conditions)
-        deps = merge_constraints(deps)
-        deps, _ = merge_cycles(deps)
-        deps, _ = remove_loops(deps)
-        program = topological_sort(deps, self.rules)
-        return program
+        """
+        Sorts the rules by their dependencies. If no rule depends on the rules added since the last
+        call, they are appended to the previous order, otherwise the whole dependency graph is sorted.
+        """
+        if self._sorted is None or not self.can_append_to_sorted(self._unsorted_rules):
+            deps = merge_constraints(self._dependency_graph)
+            deps, _ = merge_cycles(deps)
+            deps, _ = remove_loops(deps)
+            self._sorted = topological_sort(deps, self.rules)
+        else:
+            self._sorted.extend(frozenset([rule]) for rule in self._unsorted_rules
+                                if frozenset([rule]) in self._dependency_graph)
+        self._unsorted_rules = []
+        return list(self._sorted)
+
+    def can_append_to_sorted(self, new_rules: Sequence[Rule]) -> bool:
+        """
+        New rules come last in the topological sort if they are no constraints, are not already
+        part of the program and no other rule depends on them.
+        """
+        sorted_rules = set(rule for node in self._sorted for rule in node)
+        for rule in new_rules:
+            node = frozenset([rule])
+            if is_constraint(rule) or rule in sorted_rules:
+                return False
+            if node in self._dependency_graph and any(successor != node
+                                                      for successor in self._dependency_graph.successors(node)):
+                return False
+            sorted_rules.add(rule)
+        return True
 
     def check_positive_recursion(self):
         deps1 = self.make_dependency_graph(self.dependants, self.positive_conditions)
@@ -533,6 +785,96 @@ def extract_symbols(facts, constants=None):
         result.append(fact.symbol)
     return result
 
+
+class _NotOnlyFacts(Exception):
+    pass
+
+
+# clingo.parse_term evaluates arithmetic, but may crash or overflow where the grounder would not.
+ARITHMETIC_OPERATORS = ("+", "*", "/", "\\", "&", "?", "^", "~", "|")
+
+
+def ground_terms_to_symbols(texts: Sequence[str]) -> List[Optional[Symbol]]:
+    """
+    Converts the strings of ground terms to their symbols without grounding.
+    Terms that are not ground, or contain arithmetic, are converted to None.
+    """
+    symbols: List[Optional[Symbol]] = [None] * len(texts)
+    indices = [i for i, text in enumerate(texts)
+               if not any(operator in text for operator in ARITHMETIC_OPERATORS)]
+    for i, symbol in zip(indices, parse_terms([texts[i] for i in indices])):
+        symbols[i] = symbol
+    return symbols
+
+
+def parse_terms(texts: Sequence[str]) -> List[Optional[Symbol]]:
+    """
+    Parses all terms at once as a tuple. If that fails, the terms are split in halves
+    until the terms that can not be parsed are found.
+    """
+    if not texts:
+        return []
+    try:
+        symbols = clingo.parse_term(f"({','.join(texts)},)", logger=lambda code, message: None).arguments
+        if len(symbols) == len(texts):
+            return symbols
+    except RuntimeError:
+        pass
+    if len(texts) == 1:
+        return [None]
+    middle = len(texts) // 2
+    return parse_terms(texts[:middle]) + parse_terms(texts[middle:])
+
+
+def extract_ground_facts(program: str) -> Optional[List[Symbol]]:
+    """
+    Returns the symbols of a program that only consists of ground facts.
+    Returns None if any other statement is found.
+    """
+    texts: List[str] = []
+
+    def on_statement(statement: AST):
+        if statement.ast_type == ASTType.Program:
+            return
+        if statement.ast_type != ASTType.Rule:
+            raise _NotOnlyFacts()
+        text = str(statement)
+        if ":-" in text:
+            raise _NotOnlyFacts()
+        texts.append(text[:-1])
+
+    try:
+        parse_string(program, on_statement)
+    except _NotOnlyFacts:
+        return None
+    symbols = ground_terms_to_symbols(texts)
+    if any(symbol is None for symbol in symbols):
+        return None
+    return symbols
+
+
+def extract_ground_fact_strings(program: str) -> Optional[List[str]]:
+    """
+    Like ``extract_ground_facts``, but returns the symbols as strings.
+    Symbols are only valid in the process that created them, so this is what worker processes return.
+    """
+    symbols = extract_ground_facts(program)
+    if symbols is None:
+        return None
+    return list(map(str, symbols))
+
+
+def mentions_any_name(symbol: Symbol, names: Collection[str]) -> bool:
+    """
+    Checks if a symbol contains a constant with one of the given names.
+    """
+    if not names or symbol.type != clingo.SymbolType.Function:
+        return False
+    if not symbol.arguments:
+        return symbol.name in names
+    return any(mentions_any_name(argument, names) for argument in symbol.arguments)
+
+
 def has_an_interval(literal):
     """
     Checks if a literal has an interval as one of its symbols.
@@ -1,8 +1,9 @@
 from clingo.ast import (AST, Transformer, SymbolicTerm, Function, Literal,
-                    SymbolicAtom, parse_string, Sign)
+                    SymbolicAtom, Sign)
 from clingo import Function as ClingoFunction
+from .parse_cache import parse_programs
 from .utils import is_constraint
-from typing import List
+from typing import List, Sequence, Union
 
 
 class TermRelaxer(Transformer):
@@ -73,13 +74,13 @@ class ProgramRelaxer(TermRelaxer):
                 if variables != []:
                     args.append(Function(location, '', variables, 0))
 
-            rule.head = Literal(location = location,
+            rule = rule.update(head = Literal(location = location,
                         sign = 0,
-                        atom = SymbolicAtom(Function(location, self.head_name, args, 0)))
+                        atom = SymbolicAtom(Function(location, self.head_name, args, 0))))
         return rule
 
 
-def relax_constraints(relaxer: ProgramRelaxer, program: str) -> List[AST]:
+def relax_constraints(relaxer: ProgramRelaxer, program: Union[str, Sequence[str]]) -> List[AST]:
     """
     Relax constraints in a program and add minimization statement.
     The minimization statement changes depending on whether the
@@ -87,12 +88,11 @@ def relax_constraints(relaxer: ProgramRelaxer, program: str) -> List[AST]:
     Returns the relaxed program as a list of AST.
 
     :param relaxer: An instance of the relaxer class.
-    :param program: The program to relax..
+    :param program: The program to relax, or its parts.
     :return: The relaxed program as a list of AST.
     """
+    programs = [program] if isinstance(program, str) else list(program)
     # Add minimization statement
-    program += f"\n:~ {relaxer.head_name}(R,T).[1,R,T]" if \
-                    relaxer.collect_variables else f"\n:~ {relaxer.head_name}(R).[1,R]"
-    relaxed_program: List[AST] = []
-    parse_string(program, lambda stm: relaxed_program.append(relaxer.visit(stm)))
-    return relaxed_program
+    programs.append(f"\n:~ {relaxer.head_name}(R,T).[1,R,T]" if
+                    relaxer.collect_variables else f"\n:~ {relaxer.head_name}(R).[1,R]")
+    return [relaxer.visit(stm) for stm in parse_programs(programs)]
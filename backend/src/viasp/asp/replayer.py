@@ -1,9 +1,14 @@
-from typing import Sequence, Optional, Callable
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Sequence, Optional, Callable, FrozenSet, List, Any
 
 from clingo import Control
 
-from ..server.database import ProgramDatabase
+from ..server.database import ProgramDatabase, CallCenter, ProgramFileStore, ProgramSegment
+from ..shared.defaults import REPLAY_SKIPPED_CALLS, REPLAY_CHECKPOINTS
 from ..shared.event import Event, publish
+from ..shared.io import dumps
 from ..shared.model import ClingoMethodCall
 from ..shared.simple_logging import warn
 
@@ -26,6 +31,22 @@ def handles(*args):
     return wrapper
 
 
+@dataclass(frozen=True)
+class ReplayPolicy:
+    """
+    What replaying the calls materializes: the program text in the ``ProgramDatabase``, a ``clingo.Control``, or both.
+    The calls named in ``skip`` are not replayed, but still count as executed.
+    """
+    program: bool = True
+    control: bool = True
+    skip: FrozenSet[str] = field(default_factory=frozenset)
+
+
+FULL_REPLAY = ReplayPolicy()
+# only the program text, without grounding
+PROGRAM_REPLAY = ReplayPolicy(control=False, skip=frozenset(REPLAY_SKIPPED_CALLS))
+
+
 @handler
 class ClingoReconstructor:
 
@@ -34,59 +55,129 @@ class ClingoReconstructor:
             if func_name in responsive_for:
                 return func
 
-    def apply(self, call: ClingoMethodCall, ctl: Control) -> Control:
+    def apply(self, call: ClingoMethodCall, ctl: Optional[Control],
+              policy: ReplayPolicy = FULL_REPLAY) -> Optional[Control]:
+        if call.name in policy.skip:
+            return ctl
         func = self.handlers.get(call.name, None)
         if func is None:
             warn(f"No function for {call.name} found. Defaulting to NOOP.")
-            return self.no_op(ctl, call)
-        return func(self, ctl, call)
+            return self.no_op(ctl, call, policy)
+        return func(self, ctl, call, policy)
 
     @handles("DEFAULT", "solve")
-    def no_op(self, ctl, _) -> Control:
+    def no_op(self, ctl, *_) -> Optional[Control]:
         return ctl
 
     @handles("ground")
-    def identity(self, ctl: Control, call: ClingoMethodCall) -> Control:
-        func = getattr(ctl, call.name)
-        func(**call.kwargs)
+    def identity(self, ctl: Optional[Control], call: ClingoMethodCall, policy: ReplayPolicy) -> Optional[Control]:
+        if ctl is not None:
+            func = getattr(ctl, call.name)
+            func(**call.kwargs)
         return ctl
 
     @handles("add")
-    def add(self, ctl: Control, call: ClingoMethodCall) -> Control:
-        db = ProgramDatabase()
-        db.add_to_program(call.kwargs["program"])
-        func = getattr(ctl, call.name)
-        func(**call.kwargs)
+    def add(self, ctl: Optional[Control], call: ClingoMethodCall, policy: ReplayPolicy) -> Optional[Control]:
+        if policy.program:
+            db = ProgramDatabase()
+            db.add_to_program(call.kwargs["program"])
+        if ctl is not None:
+            func = getattr(ctl, call.name)
+            func(**call.kwargs)
         return ctl
 
     @handles("__init__")
-    def create_(self, _, call: ClingoMethodCall):
-        db = ProgramDatabase()
-        db.clear_program()
-        return Control(**call.kwargs)
+    def create_(self, _, call: ClingoMethodCall, policy: ReplayPolicy) -> Optional[Control]:
+        if policy.program:
+            db = ProgramDatabase()
+            db.clear_program()
+        return Control(**call.kwargs) if policy.control else None
 
     @handles("load")
-    def load(self, ctl: Control, call: ClingoMethodCall):
+    def load(self, ctl: Optional[Control], call: ClingoMethodCall, policy: ReplayPolicy) -> Optional[Control]:
         path = call.kwargs["path"]
-        prg = ""
-        with open(path, encoding="utf-8") as f:
-            prg = "".join(f.readlines())
-        db = ProgramDatabase()
-        db.add_to_program(prg)
-        ctl.load(path)
+        if policy.program:
+            db = ProgramDatabase()
+            db.add_file_to_program(path)
+        if ctl is not None:
+            ctl.load(path)
         return ctl
 
 
 BOB_THE_BUILDER = ClingoReconstructor()
 
 
-def apply_multiple(calls: Sequence[ClingoMethodCall], ctl=None) -> Control:
+def apply_multiple(calls: Sequence[ClingoMethodCall], ctl=None, policy: ReplayPolicy = FULL_REPLAY,
+                   call_center: Optional[CallCenter] = None) -> Control:
+    """
+    Replays the calls. They are marked as used in the call center of their session, if one is passed.
+    """
     for call in calls:
-        ctl = apply(call, ctl)
+        ctl = apply(call, ctl, policy, call_center)
     return ctl
 
 
-def apply(call: ClingoMethodCall, ctl=None):
-    result = BOB_THE_BUILDER.apply(call, ctl)
-    publish(Event.CALL_EXECUTED, call=call)
+def apply(call: ClingoMethodCall, ctl=None, policy: ReplayPolicy = FULL_REPLAY,
+          call_center: Optional[CallCenter] = None):
+    result = BOB_THE_BUILDER.apply(call, ctl, policy)
+    _executed(call, call_center)
     return result
+
+
+def _executed(call: ClingoMethodCall, call_center: Optional[CallCenter]):
+    if call_center is not None:
+        call_center.mark_call_as_used(call)
+    publish(Event.CALL_EXECUTED, call=call)
+
+
+class ReplayCheckpoints:
+    """
+    The programs built by the program replays of a session, keyed by the hash of the calls since their ``__init__``.
+    The hash covers the names and arguments of the calls and the content of the loaded files, but not the uuids,
+    so that a script that runs again continues from the checkpoint of the longest equal prefix of its calls,
+    instead of adding and loading its program again. The calls before the last ``__init__`` are not replayed at all,
+    as it clears the program. Only the ``max_entries`` most recently used checkpoints are kept.
+    """
+
+    def __init__(self, max_entries: int = REPLAY_CHECKPOINTS):
+        self.max_entries = max_entries
+        self.checkpoints: "OrderedDict[str, List[ProgramSegment]]" = OrderedDict()
+        # the hash of the calls that built the current program, None before the first __init__
+        self.prefix: Optional[Any] = None
+
+    def replay(self, calls: Sequence[ClingoMethodCall], db: ProgramDatabase,
+               call_center: Optional[CallCenter] = None):
+        """
+        Replays the calls into the program, like ``apply_multiple`` with ``PROGRAM_REPLAY``.
+        """
+        inits = [index for index, call in enumerate(calls) if call.name == "__init__"]
+        begin, prefix = (inits[-1], hashlib.sha256()) if inits else (0, self.prefix)
+        start, restored = begin, None
+        if prefix is not None:
+            for index in range(begin, len(calls)):
+                _hash_call(prefix, calls[index], db.files)
+                if prefix.hexdigest() in self.checkpoints:
+                    start, restored = index + 1, prefix.hexdigest()
+        if restored is not None:
+            self.checkpoints.move_to_end(restored)
+            # unchanged programs are not restored, which would invalidate what was derived from them
+            if db.get_stored_segments() != self.checkpoints[restored]:
+                db.restore_segments(self.checkpoints[restored])
+        for call in calls[:start]:
+            _executed(call, call_center)
+        apply_multiple(calls[start:], policy=PROGRAM_REPLAY, call_center=call_center)
+        self.prefix = prefix
+        if prefix is not None and start < len(calls):
+            self.checkpoints[prefix.hexdigest()] = db.get_stored_segments()
+            self.checkpoints.move_to_end(prefix.hexdigest())
+            while len(self.checkpoints) > self.max_entries:
+                self.checkpoints.popitem(last=False)
+
+
+def _hash_call(digest, call: ClingoMethodCall, files: ProgramFileStore):
+    encoded = dumps(call.kwargs).encode("utf-8")
+    digest.update(f"{call.name}:{len(encoded)}:".encode("utf-8"))
+    digest.update(encoded)
+    if call.name == "load":
+        digest.update(files.read(call.kwargs["path"])[0].encode("utf-8"))
+
@@ -0,0 +1,235 @@
+"""
+Clients of the backend that do not block the solving thread: ``AsyncClingoClient`` for asyncio code,
+and ``BackgroundClingoClient``, which runs one on a background event loop behind the blocking ``ViaspClient`` interface.
+"""
+import asyncio
+import atexit
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence
+
+from .clingoApiClient import ClingoClient, _flush_at_exit
+from .shared.defaults import HTTP_POOL_SIZE, JOB_POLL_INTERVAL
+from .shared.interfaces import ViaspClient
+from .shared.model import ClingoMethodCall, Signature, StableModel
+from .shared.simple_logging import log, error
+
+FINISHED_JOB = ("done", "failed", "cancelled")
+
+
+class AsyncClingoClient:
+    """
+    A client of the backend for asyncio. Its requests are sent with the pooled session of a ``ClingoClient``
+    on a thread pool, so that up to ``pool_size`` of them are in flight at once without blocking the event loop.
+    Calls and models are uploaded concurrently, but the calls, and the models, reach the backend in the order
+    they were made. The calls that are registered while a batch is uploaded are sent together in the next one.
+    Drawing, relaxing and clingraph wait for all uploads.
+    The client can be created in a running event loop, the health of the backend is checked by the first request.
+    """
+
+    def __init__(self, **kwargs):
+        self.client = ClingoClient(**{**kwargs, "connect": False})
+        self.executor = ThreadPoolExecutor(max_workers=kwargs.get("pool_size", HTTP_POOL_SIZE),
+                                           thread_name_prefix="viasp-client")
+        self.calls: List[ClingoMethodCall] = []
+        self.calls_lock: Optional[asyncio.Lock] = None
+        self.models_lock: Optional[asyncio.Lock] = None
+        self.connect_lock: Optional[asyncio.Lock] = None
+
+    async def _run(self, function: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        if not self.client.connected:
+            self._locks()
+            async with self.connect_lock:
+                if not self.client.connected:
+                    await loop.run_in_executor(self.executor, self.client.connect)
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    def _locks(self):
+        # the locks are created in the event loop that uses them, as they are bound to it before Python 3.10
+        if self.calls_lock is None:
+            self.calls_lock = asyncio.Lock()
+            self.models_lock = asyncio.Lock()
+            self.connect_lock = asyncio.Lock()
+        return self.calls_lock, self.models_lock
+
+    def is_available(self) -> bool:
+        """
+        Returns whether the backend was available at the last request. Before the first one, its health is checked,
+        which blocks.
+        """
+        return self.client.is_available()
+
+    async def register_function_call(self, name: str, sig: Signature, args: Sequence[Any], kwargs: Dict[str, Any]):
+        self.calls.append(ClingoMethodCall.merge(name, sig, args, kwargs))
+        await self.flush()
+
+    async def flush(self):
+        """
+        Sends the registered calls that were not sent yet. If that fails, they are sent again with the next batch.
+        """
+        calls_lock, _ = self._locks()
+        async with calls_lock:
+            calls, self.calls = self.calls, []
+            if calls:
+                try:
+                    await self._run(self.client._register_function_calls, calls)
+                except BaseException:
+                    self.calls[:0] = calls
+                    raise
+
+    async def _uploaded(self):
+        await self.flush()
+        _, models_lock = self._locks()
+        async with models_lock:
+            pass
+
+    async def set_target_stable_model(self, stable_models: Collection[StableModel]):
+        _, models_lock = self._locks()
+        async with models_lock:
+            return await self._run(self.client.set_target_stable_model, stable_models)
+
+    async def update_target_stable_models(self, stable_models: Collection[StableModel],
+                                          added: Collection[StableModel], removed: Collection[StableModel]):
+        _, models_lock = self._locks()
+        async with models_lock:
+            return await self._run(self.client.update_target_stable_models, stable_models, added, removed)
+
+    async def show(self, wait: bool = True, poll_interval: float = JOB_POLL_INTERVAL,
+                   timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        Draws the graph of the marked models in a job of the backend, once all uploads are done.
+
+        :param wait: Poll the job until it is finished. Otherwise its status is returned right away.
+        :param poll_interval: Seconds between the polls.
+        :param timeout: Seconds after which waiting is given up, by default never.
+        :return: The status of the job, or None if the backend does not run jobs.
+        """
+        await self._uploaded()
+        job = await self._run(self.client.show, False)
+        if job is None or not wait or job["status"] in FINISHED_JOB:
+            return job
+        job = await self.wait_for_job(job["id"], poll_interval, timeout)
+        if job["status"] == "failed":
+            error(f"Drawing failed ({job['error']})")
+        else:
+            log(f"Drawing {job['status']}.")
+        return job
+
+    async def wait_for_job(self, id: str, poll_interval: float = JOB_POLL_INTERVAL,
+                           timeout: Optional[float] = None) -> dict:
+        """
+        Polls the status of the job until it is finished or the timeout is over.
+        A job that the backend does not know, e.g. because its session was evicted, is reported as failed.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            job = await self._run(self.client._job_status, id)
+            if job["status"] in FINISHED_JOB or deadline is not None and loop.time() >= deadline:
+                return job
+            await asyncio.sleep(poll_interval)
+
+    async def cancel_job(self, id: str) -> Optional[dict]:
+        return await self._run(self.client.cancel_job, id)
+
+    async def _reconstruct(self):
+        await self._uploaded()
+        await self._run(self.client._reconstruct)
+
+    async def relax_constraints(self, *args, **kwargs) -> Optional[str]:
+        await self._uploaded()
+        return await self._run(lambda: self.client.relax_constraints(*args, **kwargs))
+
+    async def clingraph(self, viz_encoding_path, engine, graphviz_type):
+        await self._uploaded()
+        await self._run(self.client.clingraph, viz_encoding_path, engine, graphviz_type)
+
+    async def _register_transformer(self, transformer, imports, path):
+        await self._run(self.client._register_transformer, transformer, imports, path)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.client.session.close()
+
+
+class BackgroundClingoClient(ViaspClient):
+    """
+    A blocking facade of ``AsyncClingoClient``, which runs it on an event loop in a background thread.
+    Registering calls and uploading models return right away, so marking and uploading models never waits
+    for the network. Uploading models returns a future of whether they were received.
+    Drawing, relaxing and clingraph wait for the uploads and their own result.
+    Pending uploads are finished at exit.
+    """
+
+    def __init__(self, **kwargs):
+        self.client = AsyncClingoClient(**kwargs)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="viasp-client-loop", daemon=True)
+        self.thread.start()
+        atexit.register(_flush_at_exit, weakref.ref(self))
+
+    def _submit(self, coroutine) -> Future:
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        future.add_done_callback(_report_failure)
+        return future
+
+    def _wait(self, coroutine) -> Any:
+        return self._submit(coroutine).result()
+
+    def is_available(self):
+        return self.client.is_available()
+
+    def register_function_call(self, name: str, sig: Signature, args: Sequence[Any], kwargs: Dict[str, Any]):
+        self._submit(self.client.register_function_call(name, sig, args, kwargs))
+
+    def set_target_stable_model(self, stable_models: Collection[StableModel]):
+        return self._submit(self.client.set_target_stable_model(stable_models))
+
+    def update_target_stable_models(self, stable_models: Collection[StableModel], added: Collection[StableModel],
+                                    removed: Collection[StableModel]):
+        return self._submit(self.client.update_target_stable_models(stable_models, added, removed))
+
+    def flush(self):
+        """
+        Waits until the calls and models are uploaded.
+        """
+        if self.loop.is_running():
+            self._wait(self.client._uploaded())
+
+    def show(self, wait: bool = True, poll_interval: float = JOB_POLL_INTERVAL, timeout: Optional[float] = None):
+        return self._wait(self.client.show(wait, poll_interval, timeout))
+
+    def wait_for_job(self, id: str, poll_interval: float = JOB_POLL_INTERVAL, timeout: Optional[float] = None):
+        return self._wait(self.client.wait_for_job(id, poll_interval, timeout))
+
+    def cancel_job(self, id: str) -> Optional[dict]:
+        return self._wait(self.client.cancel_job(id))
+
+    def _reconstruct(self):
+        self._wait(self.client._reconstruct())
+
+    def relax_constraints(self, *args, **kwargs):
+        return self._wait(self.client.relax_constraints(*args, **kwargs))
+
+    def clingraph(self, viz_encoding_path, engine, graphviz_type):
+        self._wait(self.client.clingraph(viz_encoding_path, engine, graphviz_type))
+
+    def _register_transformer(self, transformer, imports, path):
+        self._wait(self.client._register_transformer(transformer, imports, path))
+
+    def close(self):
+        """
+        Finishes the pending uploads and stops the background loop.
+        """
+        self.flush()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.client.close()
+
+
+def _report_failure(future: Future):
+    if not future.cancelled() and future.exception() is not None:
+        error(f"Request to the backend failed ({future.exception()})")
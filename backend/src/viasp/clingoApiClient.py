@@ -1,20 +1,141 @@
-import json
-from typing import Collection
+import atexit
+import threading
+import time
+import weakref
+from typing import Any, Callable, Collection, List, Optional, Sequence, Union
 
 import requests
-from .shared.defaults import DEFAULT_BACKEND_URL
-from .shared.io import DataclassJSONEncoder
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from .shared.compression import compress, content_encodings
+from .shared.defaults import DEFAULT_BACKEND_URL, COMPACT_SYMBOL_ENCODING, SYMBOL_ENCODINGS_HEADER, \
+    CONTENT_TYPES_HEADER, JSON_MIMETYPE, CONTENT_ENCODINGS_HEADER, COMPRESSION_THRESHOLD, JOB_POLL_INTERVAL, \
+    HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_BACKOFF_FACTOR, HEALTH_RECHECK_INTERVAL, \
+    CALL_BUFFER_SIZE, CALL_BUFFER_DELAY
+from .shared.io import dumps, binary_mimetypes, dumps_binary, loads_binary
 from .shared.model import ClingoMethodCall, StableModel, TransformerTransport
 from .shared.interfaces import ViaspClient
 from .shared.simple_logging import log, Level, error
 
 
-def backend_is_running(url=DEFAULT_BACKEND_URL):
+def healthcheck(url=DEFAULT_BACKEND_URL, session: Optional[requests.Session] = None) -> Optional[requests.Response]:
+    """
+    Returns the response of the healthcheck, or None if the backend is not running.
+    """
     try:
-        r = requests.get(f"{url}/healthcheck")
-        return r.status_code == 200
+        r = (session or requests).get(f"{url}/healthcheck")
     except requests.exceptions.ConnectionError:
-        return False
+        return None
+    return r if r.status_code == 200 else None
+
+
+def _header_values(r: Optional[requests.Response], header: str, default: str = "") -> List[str]:
+    if r is None:
+        return []
+    return [value.strip() for value in r.headers.get(header, default).split(",")]
+
+
+def backend_is_running(url=DEFAULT_BACKEND_URL):
+    return healthcheck(url) is not None
+
+
+def backend_supports_compact_symbols(url=DEFAULT_BACKEND_URL):
+    return COMPACT_SYMBOL_ENCODING in _header_values(healthcheck(url), SYMBOL_ENCODINGS_HEADER)
+
+
+def backend_content_types(url=DEFAULT_BACKEND_URL) -> List[str]:
+    return _header_values(healthcheck(url), CONTENT_TYPES_HEADER, JSON_MIMETYPE)
+
+
+def preferred_content_type(url=DEFAULT_BACKEND_URL, health: Optional[requests.Response] = None) -> str:
+    """
+    Returns the first binary format that is installed and that the backend supports, or JSON.
+    """
+    supported = _header_values(health or healthcheck(url), CONTENT_TYPES_HEADER, JSON_MIMETYPE)
+    return next((mimetype for mimetype in binary_mimetypes() if mimetype in supported), JSON_MIMETYPE)
+
+
+def preferred_content_encoding(url=DEFAULT_BACKEND_URL, health: Optional[requests.Response] = None) -> Optional[str]:
+    """
+    Returns the first content encoding that can be used and that the backend can decompress, if any.
+    """
+    supported = _header_values(health or healthcheck(url), CONTENT_ENCODINGS_HEADER)
+    return next((encoding for encoding in content_encodings() if encoding in supported), None)
+
+
+def pooled_session(pool_size: int = HTTP_POOL_SIZE, retries: int = HTTP_RETRIES,
+                   backoff_factor: float = HTTP_BACKOFF_FACTOR) -> requests.Session:
+    """
+    Returns a session that keeps its connections alive and retries after connection errors and 502, 503 or 504.
+    Requests that may have reached the backend are only retried if their method is idempotent.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(502, 503, 504),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class CallBuffer:
+    """
+    Collects method calls to send them in batches: when ``max_size`` calls are buffered,
+    when a call is buffered ``max_delay`` seconds or more after the first of them, when it is flushed and at exit.
+    The batches are sent on the thread that buffers or flushes the calls, there is no background thread.
+    Calls that could not be sent stay buffered and are sent again with the next batch.
+    """
+
+    def __init__(self, send: Callable[[List[ClingoMethodCall]], None], max_size: int = CALL_BUFFER_SIZE,
+                 max_delay: Optional[float] = CALL_BUFFER_DELAY):
+        self.send = send
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.calls: List[ClingoMethodCall] = []
+        # when the first of the buffered calls was buffered
+        self.since: Optional[float] = None
+        # held while a batch is sent, so that the batches arrive in order
+        self.lock = threading.RLock()
+        atexit.register(_flush_at_exit, weakref.ref(self))
+
+    def __len__(self):
+        return len(self.calls)
+
+    def append(self, call: ClingoMethodCall):
+        """
+        Buffers the call. If that sends the batch and sending fails, the error is logged, as the calls are kept.
+        """
+        with self.lock:
+            if not self.calls:
+                self.since = time.monotonic()
+            self.calls.append(call)
+            if len(self.calls) >= self.max_size or \
+                    self.max_delay is not None and time.monotonic() - self.since >= self.max_delay:
+                try:
+                    self.flush()
+                except Exception as e:
+                    error(f"Sending calls failed, they are sent again with the next batch ({e})")
+
+    def flush(self):
+        """
+        Sends the buffered calls.
+
+        :raises Exception: the error of ``send``, in which case the calls stay buffered.
+        """
+        with self.lock:
+            if self.calls:
+                self.send(list(self.calls))
+                self.calls = []
+                self.since = None
+
+
+def _flush_at_exit(buffer: "weakref.ref"):
+    if buffer() is not None:
+        try:
+            buffer().flush()
+        except Exception as e:
+            error(f"Sending calls at exit failed ({e})")
 
 
 def dict_factory_that_supports_uuid(kv_pairs):
@@ -28,57 +149,189 @@ class ClingoClient(ViaspClient):
             self.backend_url = kwargs["viasp_backend_url"]
         else:
             self.backend_url = DEFAULT_BACKEND_URL
-        if not backend_is_running(self.backend_url):
+        self.session = pooled_session(kwargs.get("pool_size", HTTP_POOL_SIZE), kwargs.get("retries", HTTP_RETRIES),
+                                      kwargs.get("backoff_factor", HTTP_BACKOFF_FACTOR))
+        # the backend is assumed to stay available, its health is only checked again after a request failed
+        self.health_recheck_interval = kwargs.get("health_recheck_interval", HEALTH_RECHECK_INTERVAL)
+        self.compression_threshold = kwargs.get("compression_threshold", COMPRESSION_THRESHOLD)
+        self.compression_level = kwargs.get("compression_level")
+        self.calls = CallBuffer(self._register_function_calls, kwargs.get("call_buffer_size", CALL_BUFFER_SIZE),
+                                kwargs.get("call_buffer_delay", CALL_BUFFER_DELAY))
+        self.options = kwargs
+        self.connected = False
+        # with connect=False, the health of the backend is only checked before the first request
+        if kwargs.get("connect", True):
+            self.connect()
+
+    def connect(self):
+        """
+        Checks the health of the backend and chooses the encodings that it supports.
+        """
+        health = self._check_health()
+        if health is None:
             log(f"Backend is unavailable at ({self.backend_url})", Level.WARN)
+        # symbols are sent as strings only if the backend announces that it can decode them
+        self.compact_symbols = self.options.get("compact_symbols", False) and \
+            COMPACT_SYMBOL_ENCODING in _header_values(health, SYMBOL_ENCODINGS_HEADER)
+        self.content_type = self.options.get("content_type") or \
+            (preferred_content_type(self.backend_url, health) if health is not None else JSON_MIMETYPE)
+        # request bodies of at least compression_threshold bytes are compressed, if the backend supports it
+        self.content_encoding = preferred_content_encoding(self.backend_url, health) \
+            if health is not None and self.options.get("compression", True) else None
+        self.connected = True
+
+    def _check_health(self) -> Optional[requests.Response]:
+        self.health_checked = time.monotonic()
+        health = healthcheck(self.backend_url, self.session)
+        self.available = health is not None
+        return health
 
     def is_available(self):
-        return backend_is_running(self.backend_url)
+        """
+        Returns whether the backend was available at the last request.
+        After a failed request, its health is checked again at most every ``health_recheck_interval`` seconds.
+        """
+        if not self.connected:
+            self.connect()
+        if not self.available and time.monotonic() - self.health_checked >= self.health_recheck_interval:
+            self._check_health()
+        return self.available
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        if not self.connected:
+            self.connect()
+        try:
+            return self.session.request(method, f"{self.backend_url}{path}", **kwargs)
+        except requests.exceptions.ConnectionError:
+            self.available = False
+            raise
+
+    def _serialize(self, obj: Any) -> Union[str, bytes]:
+        if self.content_type == JSON_MIMETYPE:
+            return dumps(obj, compact_symbols=self.compact_symbols)
+        return dumps_binary(obj, self.content_type, compact_symbols=self.compact_symbols)
+
+    def _deserialize(self, r: requests.Response) -> Any:
+        mimetype = r.headers.get("Content-Type", "").split(";")[0].strip()
+        if mimetype in binary_mimetypes():
+            return loads_binary(r.content, mimetype)
+        return r.json()
+
+    def _post(self, path: str, obj: Any) -> requests.Response:
+        if not self.connected:
+            self.connect()
+        data = self._serialize(obj)
+        headers = {'Content-Type': self.content_type, 'Accept': self.content_type}
+        if self.content_encoding is not None and len(data) >= self.compression_threshold:
+            data = compress(data.encode("utf-8") if isinstance(data, str) else data, self.content_encoding,
+                            self.compression_level)
+            headers['Content-Encoding'] = self.content_encoding
+        return self._request("POST", path, data=data, headers=headers)
 
     def register_function_call(self, name, sig, args, kwargs):
         serializable_call = ClingoMethodCall.merge(name, sig, args, kwargs)
-        self._register_function_call(serializable_call)
+        self.calls.append(serializable_call)
+
+    def flush(self):
+        self.calls.flush()
 
     def _register_function_call(self, call: ClingoMethodCall):
-        if backend_is_running():
-            serialized = json.dumps(call, cls=DataclassJSONEncoder)
-            r = requests.post(f"{self.backend_url}/control/add_call",
-                              data=serialized,
-                              headers={'Content-Type': 'application/json'})
-            if not r.ok:
-                error(f"{r.status_code} {r.reason}")
+        self._register_function_calls([call])
+
+    def _register_function_calls(self, calls: Sequence[ClingoMethodCall]):
+        """
+        Registers a batch of calls in one request.
+        Calls that the backend rejects are dropped, with an error.
+
+        :raises requests.exceptions.ConnectionError: if the backend is unavailable, so that the calls are kept.
+        """
+        if not calls:
+            return
+        if not self.is_available():
+            raise requests.exceptions.ConnectionError(f"Backend is unavailable at ({self.backend_url})")
+        r = self._post("/control/add_call", list(calls))
+        if not r.ok:
+            error(f"{r.status_code} {r.reason}")
 
     def set_target_stable_model(self, stable_models: Collection[StableModel]):
-        serialized = json.dumps(stable_models, cls=DataclassJSONEncoder)
-        r = requests.post(f"{self.backend_url}/control/models", data=serialized,
-                          headers={'Content-Type': 'application/json'})
+        r = self._post("/control/models", stable_models)
         if r.ok:
             log(f"Set models.")
         else:
             error(f"Setting models failed [{r.status_code}] ({r.reason})")
+        return r.ok
 
-    def show(self):
-        self._reconstruct()
-        r = requests.post(f"{self.backend_url}/control/show")
+    def update_target_stable_models(self, stable_models: Collection[StableModel], added: Collection[StableModel],
+                                    removed: Collection[StableModel]):
+        r = self._post("/control/models/update", {"added": added, "removed": removed})
         if r.ok:
-            log(f"Drawing in progress.")
+            log(f"Updated models.")
         else:
+            error(f"Updating models failed [{r.status_code}] ({r.reason})")
+        return r.ok
+
+    def show(self, wait: bool = True, poll_interval: float = JOB_POLL_INTERVAL, timeout: Optional[float] = None):
+        """
+        Draws the graph of the marked models in a job of the backend.
+
+        :param wait: Poll the job until it is finished. Otherwise its status is returned right away.
+        :param poll_interval: Seconds between the polls.
+        :param timeout: Seconds after which waiting is given up, by default never.
+        :return: The status of the job, or None if the backend does not run jobs.
+        """
+        self._reconstruct()
+        r = self._request("POST", "/control/show", params={"async": "true"})
+        if not r.ok:
             error(f"Drawing failed [{r.status_code}] ({r.reason})")
+            return None
+        if r.status_code != 202:
+            log(f"Drawing in progress.")
+            return None
+        job = r.json()
+        if wait:
+            job = self.wait_for_job(job["id"], poll_interval, timeout)
+        if job["status"] == "failed":
+            error(f"Drawing failed ({job['error']})")
+        else:
+            log(f"Drawing {job['status']}.")
+        return job
+
+    def wait_for_job(self, id: str, poll_interval: float = JOB_POLL_INTERVAL, timeout: Optional[float] = None) -> dict:
+        """
+        Polls the status of the job until it is finished or the timeout is over.
+        A job that the backend does not know, e.g. because its session was evicted, is reported as failed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self._job_status(id)
+            if job["status"] in ("done", "failed", "cancelled"):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(poll_interval)
+
+    def _job_status(self, id: str) -> dict:
+        r = self._request("GET", f"/control/jobs/{id}")
+        if r.ok:
+            return r.json()
+        return {"id": id, "status": "failed", "error": f"[{r.status_code}] {r.reason}"}
+
+    def cancel_job(self, id: str) -> Optional[dict]:
+        r = self._request("DELETE", f"/control/jobs/{id}")
+        return r.json() if r.ok else None
 
     def _reconstruct(self):
-        r = requests.get(f"{self.backend_url}/control/reconstruct")
+        r = self._request("GET", "/control/reconstruct")
         if r.ok:
             log(f"Reconstructing in progress.")
         else:
             error(f"Reconstructing failed [{r.status_code}] ({r.reason})")
 
     def relax_constraints(self, *args, **kwargs):
-        serialized = json.dumps({"args": args, "kwargs": kwargs}, cls=DataclassJSONEncoder)
-        r = requests.post(f"{self.backend_url}/control/relax",
-                          data=serialized,
-                          headers={'Content-Type': 'application/json'})
+        r = self._post("/control/relax", {"args": args, "kwargs": kwargs})
         if r.ok:
             log(f"Program constraints transformed.")
-            return '\n'.join(r.json())
+            return '\n'.join(self._deserialize(r))
         else:
             error(f"Transforming constraints failed [{r.status_code}] ({r.reason})")    
             return None
@@ -88,11 +341,7 @@ class ClingoClient(ViaspClient):
             prg = f.read().splitlines()
             prg = '\n'.join(prg)
         
-        serialized = json.dumps({"viz-encoding":prg, "engine":engine, "graphviz-type":graphviz_type}, cls=DataclassJSONEncoder)
-
-        r = requests.post(f"{self.backend_url}/control/clingraph",
-                              data=serialized,
-                              headers={'Content-Type': 'application/json'})
+        r = self._post("/control/clingraph", {"viz-encoding":prg, "engine":engine, "graphviz-type":graphviz_type})
         if r.ok:
             log(f"Clingraph visualization in progress.")
         else:
@@ -100,11 +349,7 @@ class ClingoClient(ViaspClient):
 
     def _register_transformer(self, transformer, imports, path):
         serializable_transformer = TransformerTransport.merge(transformer, imports, path)
-        serialized = json.dumps(serializable_transformer,
-                                cls=DataclassJSONEncoder)
-        r = requests.post(f"{self.backend_url}/control/add_transformer",
-                          data=serialized,
-                          headers={'Content-Type': 'application/json'})
+        r = self._post("/control/add_transformer", serializable_transformer)
         if r.ok:
             log(f"Transformer registered.")
         else:
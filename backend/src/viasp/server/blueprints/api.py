@@ -1,4 +1,6 @@
-from typing import Tuple, Any, Dict, Iterable
+import copy
+from itertools import chain
+from typing import Tuple, Any, Callable, Dict, Iterable, Iterator, List
 from unittest.mock import NonCallableMagicMock
 
 from flask import request, Blueprint, jsonify, abort, Response
@@ -8,42 +10,49 @@ from uuid import uuid4
 from clingo import Control
 from clingraph.orm import Factbase
 from clingraph.graphviz import compute_graphs, render
-from ...shared.defaults import CLINGRAPH_PATH
+from ...shared.defaults import CLINGRAPH_PATH, UPLOAD_CHUNK_SIZE
 
 from .dag_api import set_graph, last_nodes_in_graph, get_graph
-from ..database import CallCenter, ProgramDatabase
+from ..database import ProgramDatabase, AnalyzerSnapshotStore
+from ..jobs import Job, track, DONE, FAILED, CANCELLED
+from ..session import get_session
 from ...asp.justify import build_graph
 from ...asp.reify import ProgramAnalyzer, reify_list
 from ...asp.relax import ProgramRelaxer, relax_constraints
+from ...shared.io import iter_loads, loads, binary_mimetypes
 from ...shared.model import ClingoMethodCall, StableModel
-from ...asp.replayer import apply_multiple
+from ...shared.simple_logging import warn
 
 bp = Blueprint("api", __name__, template_folder='../templates/')
 
-calls = CallCenter()
-ctl = None
-using_clingraph = []
 
 
 def handle_call_received(call: ClingoMethodCall) -> None:
-    global ctl
-    calls.append(call)
-    if ctl is not None:
-        ctl = apply_multiple(calls.get_pending(), ctl)
+    get_session().calls.append(call)
 
 
-def handle_calls_received(calls: Iterable[ClingoMethodCall]) -> None:
-    for call in calls:
-        handle_call_received(call)
+def handle_calls_received(received: Iterable[ClingoMethodCall]) -> None:
+    get_session().calls.extend(list(received))
+
+
+def replay_program() -> None:
+    """
+    Replays the pending calls into the program text of the ``ProgramDatabase``, without building a Control.
+    A script that runs again continues from the checkpoint of its program, see ``ReplayCheckpoints``.
+    """
+    session = get_session()
+    with session.replay_lock:
+        session.checkpoints.replay(session.calls.get_pending(), ProgramDatabase(), call_center=session.calls)
 
 
 @bp.route("/control/calls", methods=["GET"])
 def get_calls():
-    return jsonify(calls.get_all())
+    return jsonify(get_session().calls.get_all())
 
 
 @bp.route("/control/program", methods=["GET"])
 def get_program():
+    replay_program()
     db = ProgramDatabase()
     return db.get_program()
     
@@ -72,72 +81,87 @@ def get_by_name_or_index_from_args_or_kwargs(name: str, index: int, *args: Tuple
 
 @bp.route("/control/reconstruct", methods=["GET"])
 def reconstruct():
-    if calls:
-        global ctl
-        ctl = apply_multiple(calls.get_pending(), ctl)
+    replay_program()
     return "ok"
 
 
-class DataContainer:
-    def __init__(self):
-        self.models = []
-        self.warnings = []
-        self.transformer = None
-
+def handle_models_received(parsed_models):
+    get_session().models = parsed_models
 
-dc = DataContainer()
 
+def receive_models(chunks: Iterable[bytes]) -> Any:
+    """
+    Decodes an upload of marked models. An array is decoded model by model while its chunks are read,
+    an upload that is not an array is returned as it is.
 
-def handle_models_received(parsed_models):
-    dc.models = parsed_models
+    :raises ValueError: if the upload is not valid.
+    """
+    chunks = iter(chunks)
+    first = next(chunks, b"")
+    if first.lstrip()[:1] != b"[":
+        return loads(b"".join(chain([first], chunks)))
+    return list(iter_loads(chain([first], chunks)))
 
 
 @bp.route("/control/models", methods=["GET", "POST"])
 def set_stable_models():
     if request.method == "POST":
+        if request.mimetype not in binary_mimetypes() and not request.is_json:
+            return "Invalid model object", 400
+        # the models of the session are only replaced once the whole upload is decoded
         try:
-            parsed_models = request.json
+            if request.mimetype in binary_mimetypes():
+                parsed_models = request.json
+            else:
+                parsed_models = receive_models(iter(lambda: request.stream.read(UPLOAD_CHUNK_SIZE), b""))
         except BaseException:
             return "Invalid model object", 400
         handle_models_received(parsed_models)
     elif request.method == "GET":
-        return jsonify(dc.models)
+        return jsonify(get_session().models)
+    return "ok"
+
+
+@bp.route("/control/models/update", methods=["POST"])
+def update_stable_models():
+    try:
+        update = request.json
+        added = update["added"]
+        removed = set(update["removed"])
+    except BaseException:
+        return "Invalid model object", 400
+    handle_models_received([model for model in get_session().models if model not in removed] + added)
     return "ok"
 
 
 @bp.route("/control/models/clear", methods=["POST"])
 def models_clear():
     if request.method == "POST":
-        dc.models.clear()
-        global ctl
-        ctl = None
+        get_session().models = []
 
 @bp.route("/control/add_transformer", methods=["POST"])
 def set_transformer():
     if request.method == "POST":
         try:
-            dc.transformer = request.json
+            get_session().data.transformer = request.json
         except BaseException:
             return "Invalid transformer object", 400
     return "ok"
 
 
-def wrap_marked_models(marked_models: Iterable[StableModel]):
-    result = []
+def wrap_marked_models(marked_models: Iterable[StableModel]) -> Iterator[List[str]]:
+    """
+    Wraps the atoms of the models as facts. The models are wrapped as they are consumed.
+    """
     for model in marked_models:
-        wrapped = []
-        for part in model.atoms:
-            wrapped.append(f"{part}.")
-        result.append(wrapped)
-    return result
+        yield [f"{part}." for part in model.atoms]
 
 
 def _set_warnings(warnings):
-    dc.warnings = warnings
+    get_session().data.warnings = warnings
 
 def used_clingraph():
-    global using_clingraph
-    return using_clingraph
+    return get_session().using_clingraph
 
 
 @bp.route("/control/warnings", methods=["POST"])
@@ -149,74 +173,166 @@ def set_warnings():
 @bp.route("/control/warnings", methods=["DELETE"])
 @cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
 def clear_warnings():
-    dc.warnings = []
+    get_session().data.warnings = []
 
 
 @bp.route("/control/warnings", methods=["GET"])
 @cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
 def get_warnings():
-    return jsonify(dc.warnings)
+    return jsonify(get_session().data.warnings)
+
+
+def get_analyzer(programs, transformer=None) -> ProgramAnalyzer:
+    """
+    Analyzes the program, or restores the analysis of the same program from the snapshot store.
+    If the program was only extended since the last call, only the new parts are analyzed.
+    Programs with a registered transformer are always analyzed.
+    Returns a copy, so the kept analysis is not changed while reifying.
+    """
+    if transformer is not None:
+        analyzer = ProgramAnalyzer()
+        analyzer.add_programs(programs, transformer)
+        return analyzer
+    programs = list(programs)
+    dc = get_session().data
+    analyzed = dc.analyzed_programs
+    if dc.analyzer is not None and programs[:len(analyzed)] == analyzed:
+        if len(programs) > len(analyzed):
+            dc.analyzer.add_programs(programs[len(analyzed):])
+            AnalyzerSnapshotStore().save(AnalyzerSnapshotStore.key(programs), dc.analyzer.to_snapshot("".join(programs)))
+    else:
+        dc.analyzer = load_or_analyze(programs)
+    dc.analyzed_programs = programs
+    dc.analyzer.sort_program_by_dependencies()
+    return copy.copy(dc.analyzer)
 
 
-@bp.route("/control/show", methods=["POST"])
-@cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
-def show_selected_models():
-    marked_models = dc.models
-    marked_models = wrap_marked_models(marked_models)
-
-    db = ProgramDatabase()
+def load_or_analyze(programs) -> ProgramAnalyzer:
+    store = AnalyzerSnapshotStore()
+    key = store.key(programs)
+    snapshot = store.load(key)
+    if snapshot is not None:
+        try:
+            return ProgramAnalyzer.from_snapshot(snapshot)
+        except (ValueError, RuntimeError, KeyError, IndexError) as e:
+            warn(f"Could not restore the analysis of the program ({e}).")
     analyzer = ProgramAnalyzer()
-    analyzer.add_program(db.get_program(), dc.transformer)
+    analyzer.add_programs(programs)
+    store.save(key, analyzer.to_snapshot("".join(programs)))
+    return analyzer
+
+
+def run_as_job(kind: str, function: Callable[[Job], Any], response: Callable[[Any], Any]):
+    """
+    Runs the function as a job of the session. Requests with ``async=true`` get the job with status 202
+    and can follow it at ``/control/jobs/<id>``, all others wait for the response to its result.
+    """
+    job = get_session().jobs.start(kind, function)
+    if request.args.get("async", "false").lower() in ("1", "true"):
+        return jsonify(job.to_dict()), 202, {"Location": f"{request.script_root}/control/jobs/{job.id}"}
+    job.wait()
+    if job.status == FAILED:
+        return job.error, 500
+    if job.status == CANCELLED:
+        return "Cancelled", 409
+    return response(job.result)
+
+
+def show_models(job: Job) -> None:
+    job.report("replaying calls")
+    replay_program()
+    session = get_session()
+    dc = session.data
+    marked_models = session.models
+    total = len(marked_models) if isinstance(marked_models, list) else None
+    marked_models = wrap_marked_models(track(marked_models, "justifying models", total))
+
+    job.report("analyzing program")
+    db = ProgramDatabase()
+    analyzer = get_analyzer(db.get_program_segments(), dc.transformer)
     _set_warnings(analyzer.get_filtered())
     if analyzer.will_work():
         recursion_rules = analyzer.check_positive_recursion()
+        job.report("reifying program")
         reified = reify_list(analyzer.get_sorted_program(), h=analyzer.get_conflict_free_h(),
                              model=analyzer.get_conflict_free_model(),
                              get_conflict_free_variable=analyzer.get_conflict_free_variable)
         g = build_graph(marked_models, reified, analyzer, recursion_rules)
 
+        job.report("saving graph")
         set_graph(g)
-    return "ok", 200
+
+
+@bp.route("/control/show", methods=["POST"])
+@cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
+def show_selected_models():
+    return run_as_job("show", show_models, lambda _: ("ok", 200))
 
 @bp.route("/control/relax", methods=["POST"])
 @cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
 def transform_relax():
-    db = ProgramDatabase()
-    relaxer = ProgramRelaxer(*request.json["args"], **request.json["kwargs"])
-    relaxed = relax_constraints(relaxer, db.get_program())
-    return jsonify(relaxed)
+    args, kwargs = request.json["args"], request.json["kwargs"]
+
+    def relax(job: Job) -> List[Any]:
+        job.report("replaying calls")
+        replay_program()
+        db = ProgramDatabase()
+        relaxer = ProgramRelaxer(*args, **kwargs)
+        job.report("relaxing constraints")
+        return relax_constraints(relaxer, db.get_program_segments())
+
+    return run_as_job("relax", relax, jsonify)
 
 @bp.route("/control/clingraph", methods=["POST", "GET"])
 @cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
 def clingraph_generate():
-    global using_clingraph
+    using_clingraph = get_session().using_clingraph
 
     if request.method == "POST":
-        marked_models = dc.models
-        marked_models = wrap_marked_models(marked_models)
         viz_encoding = request.json["viz-encoding"]
         engine = request.json["engine"]
         graphviz_type = request.json["graphviz-type"]
 
-
-        # for every model that was maked
-        for model in marked_models:
-            # use clingraph to generate a graph
-            control = Control()
-            control.add("base", [], ''.join(model))
-            control.add("base", [], viz_encoding)
-            control.ground([("base", [])])
-            with control.solve(yield_=True) as handle:
-                for m in handle:
-                    fb = Factbase.from_model(m, default_graph="base")
-                    graphs = compute_graphs(fb, graphviz_type)
-
-                    filename = uuid4().hex
-                    using_clingraph.append(filename)
-                    
-                    render(graphs, format="png", directory=CLINGRAPH_PATH, name_format=filename, engine=engine)
+        def visualize(job: Job) -> None:
+            job.report("replaying calls")
+            replay_program()
+            marked_models = get_session().models
+            total = len(marked_models) if isinstance(marked_models, list) else None
+            marked_models = wrap_marked_models(track(marked_models, "visualizing models", total))
+
+            # for every model that was maked
+            for model in marked_models:
+                # use clingraph to generate a graph
+                control = Control()
+                control.add("base", [], ''.join(model))
+                control.add("base", [], viz_encoding)
+                control.ground([("base", [])])
+                with job.interruptible(control), control.solve(yield_=True) as handle, job.interruptible(handle):
+                    for m in handle:
+                        fb = Factbase.from_model(m, default_graph="base")
+                        graphs = compute_graphs(fb, graphviz_type)
+
+                        filename = uuid4().hex
+                        using_clingraph.append(filename)
+
+                        render(graphs, format="png", directory=CLINGRAPH_PATH, name_format=filename, engine=engine)
+
+        return run_as_job("clingraph", visualize, lambda _: ("ok", 200))
     if request.method == "GET":
         if len(using_clingraph) > 0:
             return jsonify({"using_clingraph": True}), 200
         return jsonify({"using_clingraph": False}), 200
     return "ok", 200
+
+
+@bp.route("/control/jobs/<id>", methods=["GET", "DELETE"])
+def job_status(id):
+    job = get_session().jobs.get(id)
+    if job is None:
+        abort(Response(f"No job with id {id}.", 404))
+    if request.method == "DELETE":
+        job.cancel()
+    status = job.to_dict()
+    if job.status == DONE and job.result is not None:
+        status["result"] = job.result
+    return jsonify(status)
@@ -1,10 +1,17 @@
 from flask import Blueprint
 from flask_cors import cross_origin
 
+from ...shared.compression import content_encodings
+from ...shared.defaults import COMPACT_SYMBOL_ENCODING, SYMBOL_ENCODINGS_HEADER, CONTENT_TYPES_HEADER, JSON_MIMETYPE, \
+    CONTENT_ENCODINGS_HEADER
+from ...shared.io import binary_mimetypes
+
 bp = Blueprint("app", __name__, template_folder='../templates', static_folder='../static/', static_url_path='/static')
 
 
 @bp.route("/healthcheck", methods=["GET"])
 @cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
 def check_available():
-    return "ok"
+    return "ok", 200, {SYMBOL_ENCODINGS_HEADER: f"dict, {COMPACT_SYMBOL_ENCODING}",
+                       CONTENT_TYPES_HEADER: ", ".join([JSON_MIMETYPE] + binary_mimetypes()),
+                       CONTENT_ENCODINGS_HEADER: ", ".join(content_encodings())}
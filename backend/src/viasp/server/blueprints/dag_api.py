@@ -1,4 +1,3 @@
-import json
 import os
 from collections import defaultdict
 from typing import Union, Collection, Dict, List
@@ -10,43 +9,38 @@ from flask import Blueprint, request, jsonify, abort, Response, send_file
 from flask_cors import cross_origin
 from networkx import DiGraph
 
-from ...shared.defaults import GRAPH_PATH, STATIC_PATH
-from ...shared.io import DataclassJSONDecoder, DataclassJSONEncoder
+from ...shared.defaults import STATIC_PATH
 from ...shared.model import Transformation, Node, Signature
 from ...shared.util import get_start_node_from_graph, is_recursive
+from ..database import SessionStore
+from ..session import get_session
 
 bp = Blueprint("dag_api", __name__, template_folder='../templates', static_folder='../static/',
                static_url_path='/static')
 
-GRAPH = None
-
 
 class GraphAccessor:
 
     def __init__(self):
-        self.path = os.path.join(os.path.dirname(os.path.abspath(__file__)), GRAPH_PATH)
+        self.store = SessionStore()
 
     def save(self, graph: Union[nx.Graph, dict]):
-        if isinstance(graph, nx.Graph):
-            serializable_graph = nx.node_link_data(graph)
-        else:
-            serializable_graph = graph
-        with open(self.path, "w", encoding="utf-8") as f:
-            json.dump(serializable_graph, f, cls=DataclassJSONEncoder, ensure_ascii=False, indent=2)
+        if not isinstance(graph, nx.Graph):
+            graph = nx.node_link_graph(graph)
+        self.store.save_graph(graph)
 
     def clear(self):
-        self.save(nx.Graph())
+        self.store.clear_graph()
 
     def load(self, as_json=True) -> Union[nx.DiGraph, dict]:
-        try:
-            with open(self.path, encoding="utf-8") as f:
-                result = json.load(f, cls=DataclassJSONDecoder)
-            if as_json:
-                return result
-            loaded_graph = nx.node_link_graph(result) if result is not None else nx.DiGraph()
-            return loaded_graph
-        except FileNotFoundError:
-            return nx.DiGraph()
+        loaded_graph = self.store.load_graph()
+        if as_json:
+            return nx.node_link_data(loaded_graph)
+        return loaded_graph
+
+    @property
+    def version(self) -> int:
+        return self.store.graph_version
 
 
 def get_database():
@@ -54,10 +48,16 @@ def get_database():
 
 
 def get_graph():
-    global GRAPH
-    if GRAPH is None:
-        GRAPH = GraphAccessor().load(False)
-    return GRAPH
+    """
+    Returns the graph of the session, which is only loaded again if it was saved since, by any thread or process.
+    """
+    session = get_session()
+    database = get_database()
+    version = database.version
+    if session.graph is None or version != session.graph_version:
+        session.graph = database.load(False)
+        session.graph_version = version
+    return session.graph
 
 
 def nx_to_igraph(nx_graph: DiGraph):
@@ -87,11 +87,7 @@ def get_sort(nx_graph: DiGraph):
 
 def handle_request_for_children(transformation_id, ids_only) -> Collection[Union[Node, int]]:
     graph = get_graph()
-    children = list()
-    for u, v, d in graph.edges(data=True):
-        edge: Transformation = d['transformation']
-        if str(edge.id) == transformation_id:
-            children.append(v)
+    children = get_database().store.get_children(transformation_id)
     pos: Dict[Node, List[float]] = get_sort(graph)
     ordered_children = sorted(children, key=lambda node: pos[node][0])
     if ids_only:
@@ -139,24 +135,15 @@ def get_src_tgt_mapping_from_graph(shown_nodes_ids=None, shown_recursive_ids=[])
     return [{"src": src.uuid, "tgt": tgt.uuid} for src, tgt in graph.edges()]
 
 def get_src_tgt_mapping_from_clingraph(ids=None):
-    from .api import using_clingraph, last_nodes_in_graph
     last = last_nodes_in_graph(get_graph())
-    imgs = using_clingraph
+    imgs = get_session().using_clingraph
     return [{"src": src, "tgt": tgt} for src, tgt in list(zip(last, imgs))]
 
 
 @bp.route("/graph/transformations", methods=["GET"])
 @cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
 def get_all_transformations():
-    graph = get_graph()
-    returning = []
-    for u, v in graph.edges:
-        transformation = graph[u][v]["transformation"]
-        if transformation not in returning:
-            returning.append(transformation)
-
-    r = jsonify(returning)
-    return r
+    return jsonify(get_database().store.get_transformations())
 
 
 @bp.route("/graph/edges", methods=["GET", "POST"])
@@ -187,22 +174,19 @@ def get_clingraph_edges():
 @bp.route("/graph/transformation/<uuid>", methods=["GET"])
 @cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
 def get_rule(uuid):
-    graph = get_graph()
-    for _, _, edge in graph.edges(data=True):
-        transformation: Transformation = edge["transformation"]
-        if str(transformation.id) == str(uuid):
-            return jsonify(transformation)
-    abort(404)
+    transformation = get_database().store.get_transformation(uuid)
+    if transformation is None:
+        abort(404)
+    return jsonify(transformation)
 
 
 @bp.route("/graph/model/<uuid>", methods=["GET"])
 @cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
 def get_node(uuid):
-    graph = get_graph()
-    for node in graph.nodes():
-        if node.uuid == uuid:
-            return jsonify(node)
-    abort(400)
+    node = get_database().store.get_node(uuid)
+    if node is None:
+        abort(400)
+    return jsonify(node)
 
 
 @bp.route("/graph/facts", methods=["GET"])
@@ -231,8 +215,7 @@ def entire_graph():
 def set_graph(data: DiGraph):
     database = get_database()
     database.save(data)
-    global GRAPH
-    GRAPH = None
+    get_session().graph = None
 
 
 def get_atoms_in_path_by_signature(uuid: str):
@@ -246,17 +229,15 @@ def get_atoms_in_path_by_signature(uuid: str):
 
 
 def find_node_by_uuid(uuid: str) -> Node:
-    graph = get_graph()
-    matching_nodes = [x for x, y in graph.nodes(data=True) if x.uuid == uuid]
-
-    if len(matching_nodes) != 1:
-        for node in graph.nodes():
-            if node.recursive is not False:
-                matching_nodes = [x for x, y in node.recursive.nodes(data=True) if x.uuid == uuid]
-                if len(matching_nodes) == 1:
-                    return matching_nodes[0]
-        abort(Response(f"No node with uuid {uuid}.", 404))
-    return matching_nodes[0]
+    node = get_database().store.get_node(uuid)
+    if node is not None:
+        return node
+    for node in get_graph().nodes():
+        if node.recursive is not False:
+            matching_nodes = [x for x, y in node.recursive.nodes(data=True) if x.uuid == uuid]
+            if len(matching_nodes) == 1:
+                return matching_nodes[0]
+    abort(Response(f"No node with uuid {uuid}.", 404))
 
 
 def get_kind(uuid: str) -> str:
@@ -337,7 +318,6 @@ def last_nodes_in_graph(graph):
 @cross_origin(origin='localhost', headers=['Content-Type', 'Authorization'])
 def get_clingraph_children(transformation_id):
     if request.method == "GET":
-        from .api import using_clingraph
-        to_be_returned = using_clingraph[::-1]
+        to_be_returned = get_session().using_clingraph[::-1]
         return jsonify(to_be_returned)
     raise NotImplementedError
\ No newline at end of file
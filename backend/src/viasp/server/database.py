@@ -1,57 +1,679 @@
-from os.path import join, dirname, abspath
-from typing import Optional, Set, List
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager, suppress
+from contextvars import ContextVar
+from functools import lru_cache
+from os.path import join, dirname, abspath, basename
+from typing import Optional, Set, List, Sequence, Dict, Any, Tuple, Iterator, Union, Callable
 from uuid import UUID
 
-from ..shared.defaults import PROGRAM_STORAGE_PATH
-from ..shared.event import Event, subscribe
-from ..shared.model import ClingoMethodCall
+import clingo
+import networkx as nx
 
+from ..shared.defaults import ANALYZER_CACHE_PATH, ANALYZER_CACHE_SIZE, \
+    SESSION_STORE_PATH, SESSION_STORE_TIMEOUT, PROGRAM_FILES_PATH, PROGRAM_FILE_CACHE_SIZE
+from ..shared.event import Event, publish
+from ..shared import io
+from ..shared.model import ClingoMethodCall, Node, Transformation
 
-class ProgramDatabase:
-    def __init__(self, path=PROGRAM_STORAGE_PATH):
+
+# a segment of the program as it is stored: its text, or the hash and path of the loaded file it refers to
+ProgramSegment = Tuple[Optional[str], Optional[str], Optional[str]]
+
+# the directory of the files of the current session, see ``server.session``, or None for the default paths
+storage_directory: "ContextVar[Optional[str]]" = ContextVar("viasp_storage_directory", default=None)
+
+
+def storage_path(path) -> str:
+    """
+    Returns the default storage path in the directory of the current session.
+    """
+    directory = storage_directory.get()
+    if directory is None:
+        return join(dirname(abspath(__file__)), path)
+    os.makedirs(directory, exist_ok=True)
+    return join(directory, basename(path))
+
+
+def release_storage(directory: str):
+    """
+    Drops the in-memory state of the files in the directory, before it is removed.
+    """
+    prefix = join(directory, "")
+    for path in [path for path in _PROGRAM_LOGS if path.startswith(prefix)]:
+        del _PROGRAM_LOGS[path]
+    _SESSION_CONNECTIONS.close(lambda path: path.startswith(prefix))
+
+
+@lru_cache(maxsize=PROGRAM_FILE_CACHE_SIZE)
+def _read_program_file(path: str, size: int, mtime_ns: int) -> Tuple[str, str]:
+    if size == 0:
+        return hashlib.sha256().hexdigest(), ""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        with memoryview(data) as view:
+            return hashlib.sha256(view).hexdigest(), str(view, "utf-8")
+
+
+class ProgramFileStore:
+    """
+    Content addressed store of program files.
+    Files are read with mmap and their hash and text are cached by path, size and modification time,
+    so a file is only read again if it changed.
+    Programs that are not files, like stdin, are stored once under the hash of their content,
+    and so is a copy of every loaded file, in case the file is deleted or changed later.
+    """
+
+    def __init__(self, path=PROGRAM_FILES_PATH):
         self.path: str = join(dirname(abspath(__file__)), path)
 
-    def get_program(self):
-        prg = ""
+    def read(self, path: str) -> Tuple[str, str]:
+        """
+        Returns the sha256 hash of the file and its text.
+        """
+        path = abspath(path)
+        stat = os.stat(path)
+        return _read_program_file(path, stat.st_size, stat.st_mtime_ns)
+
+    def put(self, program: str) -> str:
+        """
+        Stores the program and returns the path of its file.
+        """
+        encoded = program.encode("utf-8")
+        return self._store(hashlib.sha256(encoded).hexdigest(), encoded)
+
+    def keep(self, digest: str, program: str) -> str:
+        """
+        Stores the program under the sha256 hash it was read with, unless it is stored already.
+        """
+        path = join(self.path, f"{digest}.lp")
+        return path if os.path.exists(path) else self._store(digest, program.encode("utf-8"))
+
+    def get(self, digest: str) -> Optional[str]:
+        """
+        Returns the stored program with the hash, or None if it is not stored.
+        """
         try:
-            with open(self.path, "r", encoding="utf-8") as f:
-                prg = "".join(f.readlines())
+            with open(join(self.path, f"{digest}.lp"), "r", encoding="utf-8", newline="") as f:
+                return f.read()
         except FileNotFoundError:
-            self.save_program("")
-        return prg
+            return None
+
+    def resolve(self, path: str, digest: str) -> str:
+        """
+        Returns the text of a loaded file as it was when it was loaded: from the file, if its hash is unchanged,
+        and from the stored copy otherwise.
+
+        :raises FileNotFoundError: if the file was deleted or changed, and its copy is not stored.
+        """
+        try:
+            current, program = self.read(path)
+        except FileNotFoundError:
+            current, program = None, ""
+        if current == digest:
+            return program
+        stored = self.get(digest)
+        if stored is None:
+            raise FileNotFoundError(f"The loaded file {path} was {'changed' if current else 'deleted'}, "
+                                    f"and the copy of the loaded content {digest} is not stored.")
+        return stored
+
+    def _store(self, digest: str, encoded: bytes) -> str:
+        path = join(self.path, f"{digest}.lp")
+        if not os.path.exists(path):
+            os.makedirs(self.path, exist_ok=True)
+            with open(f"{path}.{os.getpid()}.tmp", "wb") as f:
+                f.write(encoded)
+            os.replace(f"{path}.{os.getpid()}.tmp", path)
+        return path
+
+
+class _ProgramLog:
+    """
+    The in-memory copy of the program in a session store, shared by the ProgramDatabases of the store.
+    """
+
+    def __init__(self):
+        self.segments: List[str] = []
+        self.program: Optional[str] = ""
+        self.version = 0
+        self.lock = threading.RLock()
+
+
+_PROGRAM_LOGS: Dict[str, _ProgramLog] = {}
+
+
+class ProgramDatabase:
+    """
+    The program, stored as the segments it was added in, e.g. one per loaded file, in the ``SessionStore``.
+    Segments are appended to the store, and the program is read from an in-memory copy,
+    which is only reloaded if the program in the store was changed by another process.
+    Loaded files are not copied into the store, their segments refer to them by path and hash.
+    If a loaded file is deleted or changed, its content is read from the copy in the ``ProgramFileStore``.
+    Every change increments the version and publishes ``Event.PROGRAM_CHANGED``.
+    """
+
+    def __init__(self, store: Optional["SessionStore"] = None, files: Optional[ProgramFileStore] = None):
+        self.store = SessionStore() if store is None else store
+        self.files = ProgramFileStore() if files is None else files
+        self._log = _PROGRAM_LOGS.setdefault(self.store.path, _ProgramLog())
+
+    def get_program(self) -> str:
+        with self._log.lock:
+            self._sync()
+            if self._log.program is None:
+                self._log.program = "".join(self._log.segments)
+            return self._log.program
+
+    def get_program_segments(self) -> List[str]:
+        """
+        Returns the program split into the parts it was added in, e.g. one per loaded file.
+        """
+        with self._log.lock:
+            self._sync()
+            return list(self._log.segments)
+
+    def get_segment_boundaries(self) -> List[Tuple[int, int]]:
+        """
+        Returns the start and end offset of every segment in the program.
+        """
+        boundaries = []
+        start = 0
+        for segment in self.get_program_segments():
+            boundaries.append((start, start + len(segment)))
+            start += len(segment)
+        return boundaries
+
+    @property
+    def version(self) -> int:
+        """
+        A number that changes whenever the program changes, also by other processes,
+        to invalidate what was derived from it.
+        """
+        with self._log.lock:
+            self._sync()
+            return self._log.version
 
     def add_to_program(self, program: str):
-        current = self.get_program()
-        current = current + program
-        self.save_program(current)
+        with self._log.lock:
+            self._sync()
+            self._appended(self.store.add_program_segment(program=program), program)
+
+    def add_file_to_program(self, path: str):
+        """
+        Adds the file as a segment, which refers to the file instead of copying it into the store.
+        """
+        digest, program = self.files.read(path)
+        self.files.keep(digest, program)
+        with self._log.lock:
+            self._sync()
+            self._appended(self.store.add_program_segment(digest=digest, path=abspath(path)), program)
 
     def save_program(self, program: str):
-        with open(self.path, "w", encoding="utf-8") as f:
-            f.write(program)#.split("\n"))
+        with self._log.lock:
+            self._changed([program] if program else [], self.store.save_program(program))
 
     def clear_program(self):
-        with open(self.path, "w", encoding="utf-8") as f:
-            f.write("")
+        self.save_program("")
 
+    def get_stored_segments(self) -> List[ProgramSegment]:
+        """
+        Returns the segments as they are stored, with references to loaded files instead of their text.
+        """
+        return self.store.get_program_segments()[1]
 
-class CallCenter:
+    def restore_segments(self, segments: Sequence[ProgramSegment]):
+        """
+        Replaces the program by segments that were returned by ``get_stored_segments``.
+        """
+        with self._log.lock:
+            self.store.save_program_segments(segments)
+            self._sync()
+
+    def _appended(self, version: int, program: str):
+        if version != self._log.version + 1:
+            # another process changed the program since it was synchronized
+            self._sync()
+            return
+        self._log.segments.append(program)
+        self._changed(self._log.segments, version)
+
+    def _changed(self, segments: List[str], version: int):
+        self._log.segments = segments
+        # joined when it is read
+        self._log.program = None
+        self._log.version = version
+        publish(Event.PROGRAM_CHANGED, self.store.path, version)
+
+    def _sync(self):
+        """
+        Reloads the in-memory copy if the program in the store was changed by someone else.
+        """
+        if self.store.program_version == self._log.version:
+            return
+        version, rows = self.store.get_program_segments()
+        self._changed([program if program is not None else self.files.resolve(path, digest)
+                       for program, digest, path in rows], version)
+
+
+class AnalyzerSnapshotStore:
+    """
+    Content addressed store for ``ProgramAnalyzer`` snapshots that outlives the backend.
+    Only the most recently used ``max_entries`` snapshots are kept.
+    """
+    FORMAT = 2
+
+    def __init__(self, path=ANALYZER_CACHE_PATH, max_entries=ANALYZER_CACHE_SIZE):
+        self.path: str = join(dirname(abspath(__file__)), path)
+        self.max_entries = max_entries
+
+    @classmethod
+    def key(cls, programs: Sequence[str]) -> str:
+        digest = hashlib.sha256(f"{cls.FORMAT}:{clingo.__version__}".encode("utf-8"))
+        for program in programs:
+            encoded = program.encode("utf-8")
+            digest.update(f":{len(encoded)}:".encode("utf-8"))
+            digest.update(encoded)
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        path = join(self.path, f"{key}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # the snapshot may have been evicted by another session in the meantime
+        with suppress(FileNotFoundError):
+            os.utime(path)
+        return snapshot
+
+    def save(self, key: str, snapshot: Dict[str, Any]):
+        os.makedirs(self.path, exist_ok=True)
+        # every writer uses its own temporary file, as other sessions may save the same snapshot at the same time
+        fd, temporary = tempfile.mkstemp(suffix=".tmp", dir=self.path)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(temporary, join(self.path, f"{key}.json"))
+        except BaseException:
+            with suppress(FileNotFoundError):
+                os.remove(temporary)
+            raise
+        self._evict()
+
+    def clear(self):
+        for entry in self._entries():
+            with suppress(FileNotFoundError):
+                os.remove(entry)
+
+    def _entries(self) -> List[str]:
+        try:
+            return [join(self.path, name) for name in os.listdir(self.path) if name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def _evict(self):
+        """
+        Removes all but the most recently used snapshots. Snapshots that other sessions remove meanwhile are skipped.
+        """
+        entries = []
+        for entry in self._entries():
+            with suppress(FileNotFoundError):
+                entries.append((os.path.getmtime(entry), entry))
+        for _, entry in sorted(entries, reverse=True)[self.max_entries:]:
+            with suppress(FileNotFoundError):
+                os.remove(entry)
+
+
+_SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta VALUES ('graph_version', 0);
+INSERT OR IGNORE INTO meta VALUES ('program_version', 0);
+INSERT OR IGNORE INTO meta VALUES ('models_version', 0);
+CREATE TABLE IF NOT EXISTS program_segments (position INTEGER PRIMARY KEY, program TEXT, digest TEXT, path TEXT);
+CREATE TABLE IF NOT EXISTS models (id INTEGER PRIMARY KEY CHECK (id = 0), data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS calls (position INTEGER PRIMARY KEY, uuid TEXT NOT NULL UNIQUE, data TEXT NOT NULL,
+                                  used INTEGER NOT NULL DEFAULT 0);
+CREATE INDEX IF NOT EXISTS calls_pending ON calls (used, position);
+CREATE TABLE IF NOT EXISTS transformations (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS nodes (position INTEGER PRIMARY KEY, uuid TEXT NOT NULL UNIQUE, data TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS edges (position INTEGER PRIMARY KEY, source TEXT NOT NULL, target TEXT NOT NULL,
+                                  transformation INTEGER);
+CREATE INDEX IF NOT EXISTS edges_source ON edges (source);
+CREATE INDEX IF NOT EXISTS edges_target ON edges (target);
+CREATE INDEX IF NOT EXISTS edges_transformation ON edges (transformation);
+"""
+
+class _ConnectionRegistry:
+    """
+    The connections of the session stores, one per database and thread. They are registered across threads,
+    so that all connections to a database can be closed, including those of request threads and job workers.
+    """
 
     def __init__(self):
+        self.connections: Dict[str, Dict[int, sqlite3.Connection]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[sqlite3.Connection]:
+        with self.lock:
+            return self.connections.get(path, {}).get(threading.get_ident())
+
+    def add(self, path: str, connection: sqlite3.Connection):
+        with self.lock:
+            self.connections.setdefault(path, {})[threading.get_ident()] = connection
+
+    def close(self, predicate: Callable[[str], bool]):
+        """
+        Closes the connections of all threads to the databases whose path satisfies the predicate.
+        """
+        with self.lock:
+            paths = [path for path in self.connections if predicate(path)]
+            closed = [connection for path in paths for connection in self.connections.pop(path).values()]
+        for connection in closed:
+            connection.close()
+
+
+_SESSION_CONNECTIONS = _ConnectionRegistry()
+
+
+class SessionStore:
+    """
+    The state of a session in an embedded SQLite database: the segments of its program, its marked models,
+    its graph as nodes, edges and transformations, and its method calls if they are persisted, see ``PERSIST_CALLS``.
+    The database is in WAL mode, so readers in other threads and processes are not blocked by a writer,
+    and every thread uses its own connection. Rows are encoded like the messages of the API.
+    The program, the models and the graph have a version, which changes with every write,
+    so that the copies that are kept in memory are only read again after a change.
+    """
+
+    def __init__(self, path=None):
+        self.path: str = storage_path(SESSION_STORE_PATH) if path is None else join(dirname(abspath(__file__)), path)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = _SESSION_CONNECTIONS.get(self.path)
+        if connection is None:
+            # every thread uses its own connection, which may be closed by another thread when the session ends
+            connection = sqlite3.connect(self.path, timeout=SESSION_STORE_TIMEOUT, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SESSION_SCHEMA)
+            _SESSION_CONNECTIONS.add(self.path, connection)
+        return connection
+
+    @contextmanager
+    def transaction(self, write: bool = True) -> Iterator[sqlite3.Connection]:
+        """
+        Runs the statements of the block in one transaction. Reads in a transaction see a consistent snapshot.
+        """
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def close(self):
+        """
+        Closes the connections of all threads to the database.
+        """
+        _SESSION_CONNECTIONS.close(lambda path: path == self.path)
+
+    def add_calls(self, calls: Sequence[ClingoMethodCall]):
+        with self.transaction() as connection:
+            connection.executemany("INSERT OR IGNORE INTO calls (uuid, data) VALUES (?, ?)",
+                                   [(io.encode_uuid(call.uuid), io.dumps(call)) for call in calls])
+
+    def get_calls(self, pending_only: bool = False) -> List[ClingoMethodCall]:
+        query = "SELECT data FROM calls WHERE used = 0 ORDER BY position" if pending_only \
+            else "SELECT data FROM calls ORDER BY position"
+        return [io.loads(data) for data, in self.connection.execute(query)]
+
+    def mark_calls_as_used(self, uuids: Sequence[Union[UUID, str]]):
+        with self.transaction() as connection:
+            connection.executemany("UPDATE calls SET used = 1 WHERE uuid = ?", [(io.encode_uuid(uuid),) for uuid in uuids])
+
+    def clear_calls(self):
+        self.connection.execute("DELETE FROM calls")
+
+    def _version(self, key: str, connection: Optional[sqlite3.Connection] = None) -> int:
+        connection = self.connection if connection is None else connection
+        return connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _increment(self, connection: sqlite3.Connection, key: str) -> int:
+        connection.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (key,))
+        return self._version(key, connection)
+
+    @property
+    def program_version(self) -> int:
+        """
+        A number that changes whenever the program changes, also by other processes.
+        """
+        return self._version("program_version")
+
+    def get_program_segments(self) -> Tuple[int, List[ProgramSegment]]:
+        """
+        Returns the version of the program and its segments: their text,
+        or the hash and path of the loaded file they refer to.
+        """
+        with self.transaction(write=False) as connection:
+            return self._version("program_version", connection), \
+                connection.execute("SELECT program, digest, path FROM program_segments ORDER BY position").fetchall()
+
+    def add_program_segment(self, program: Optional[str] = None, digest: Optional[str] = None,
+                            path: Optional[str] = None) -> int:
+        """
+        Appends a segment with its text, or the hash and path of the loaded file it refers to.
+
+        :return: The new version of the program.
+        """
+        with self.transaction() as connection:
+            connection.execute("INSERT INTO program_segments (program, digest, path) VALUES (?, ?, ?)",
+                               (program, digest, path))
+            return self._increment(connection, "program_version")
+
+    def save_program(self, program: str) -> int:
+        """
+        Replaces the program by a single segment, or none if it is empty.
+
+        :return: The new version of the program.
+        """
+        return self.save_program_segments([(program, None, None)] if program else [])
+
+    def save_program_segments(self, segments: Sequence[ProgramSegment]) -> int:
+        """
+        Replaces the segments of the program.
+
+        :return: The new version of the program.
+        """
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM program_segments")
+            connection.executemany("INSERT INTO program_segments (program, digest, path) VALUES (?, ?, ?)", segments)
+            return self._increment(connection, "program_version")
+
+    @property
+    def models_version(self) -> int:
+        """
+        A number that changes whenever the marked models are saved, also by other processes.
+        """
+        return self._version("models_version")
+
+    def save_models(self, models: Any) -> int:
+        """
+        Replaces the marked models, which are stored as they were uploaded, usually as a list.
+
+        :return: The new version of the models.
+        """
+        with self.transaction() as connection:
+            connection.execute("INSERT OR REPLACE INTO models (id, data) VALUES (0, ?)", (io.dumps(models),))
+            return self._increment(connection, "models_version")
+
+    def load_models(self) -> Tuple[int, Any]:
+        """
+        Returns the version of the marked models and the models, an empty list if none were saved.
+        """
+        with self.transaction(write=False) as connection:
+            row = connection.execute("SELECT data FROM models WHERE id = 0").fetchone()
+            return self._version("models_version", connection), io.loads(row[0]) if row is not None else []
+
+    @property
+    def graph_version(self) -> int:
+        """
+        A number that changes whenever the graph is saved, also by other processes.
+        """
+        return self._version("graph_version")
+
+    def save_graph(self, graph: nx.Graph):
+        """
+        Replaces the graph. The edges keep their ``transformation``, other edge and graph attributes are dropped.
+        """
+        transformations = {}
+        edges = []
+        for source, target, transformation in graph.edges(data="transformation"):
+            if transformation is not None:
+                transformations[transformation.id] = transformation
+            edges.append((io.encode_uuid(source.uuid), io.encode_uuid(target.uuid),
+                          transformation.id if transformation is not None else None))
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM edges")
+            connection.execute("DELETE FROM nodes")
+            connection.execute("DELETE FROM transformations")
+            connection.executemany("INSERT INTO nodes (uuid, data) VALUES (?, ?)",
+                                   [(io.encode_uuid(node.uuid), io.dumps(node)) for node in graph.nodes])
+            connection.executemany("INSERT INTO transformations (id, data) VALUES (?, ?)",
+                                   [(id, io.dumps(transformation)) for id, transformation in transformations.items()])
+            connection.executemany("INSERT INTO edges (source, target, transformation) VALUES (?, ?, ?)", edges)
+            self._increment(connection, "graph_version")
+
+    def load_graph(self) -> nx.DiGraph:
+        graph = nx.DiGraph()
+        with self.transaction(write=False) as connection:
+            nodes = {uuid: io.loads(data) for uuid, data in
+                     connection.execute("SELECT uuid, data FROM nodes ORDER BY position")}
+            transformations = {id: io.loads(data) for id, data in
+                               connection.execute("SELECT id, data FROM transformations")}
+            edges = connection.execute("SELECT source, target, transformation FROM edges ORDER BY position").fetchall()
+        graph.add_nodes_from(nodes.values())
+        for source, target, transformation in edges:
+            if transformation is None:
+                graph.add_edge(nodes[source], nodes[target])
+            else:
+                graph.add_edge(nodes[source], nodes[target], transformation=transformations[transformation])
+        return graph
+
+    def clear_graph(self):
+        self.save_graph(nx.DiGraph())
+
+    def get_node(self, uuid: Union[UUID, str]) -> Optional[Node]:
+        """
+        Returns the node of the graph with the uuid, not looking into the subgraphs of recursive nodes.
+        """
+        row = self.connection.execute("SELECT data FROM nodes WHERE uuid = ?", (io.encode_uuid(uuid),)).fetchone()
+        return io.loads(row[0]) if row is not None else None
+
+    def get_transformation(self, id: Union[int, str]) -> Optional[Transformation]:
+        try:
+            id = int(id)
+        except ValueError:
+            return None
+        row = self.connection.execute("SELECT data FROM transformations WHERE id = ?", (id,)).fetchone()
+        return io.loads(row[0]) if row is not None else None
+
+    def get_transformations(self) -> List[Transformation]:
+        """
+        Returns the transformations in the order of their first edge.
+        """
+        return [io.loads(data) for data, in self.connection.execute(
+            "SELECT t.data FROM transformations t JOIN edges e ON e.transformation = t.id "
+            "GROUP BY t.id ORDER BY MIN(e.position)")]
+
+    def get_children(self, transformation_id: Union[int, str]) -> List[Node]:
+        """
+        Returns the targets of the edges of the transformation.
+        """
+        try:
+            transformation_id = int(transformation_id)
+        except ValueError:
+            return []
+        return [io.loads(data) for data, in self.connection.execute(
+            "SELECT n.data FROM edges e JOIN nodes n ON n.uuid = e.target WHERE e.transformation = ? "
+            "ORDER BY e.position", (transformation_id,))]
+
+
+class CallCenter:
+    """
+    The log of the method calls, with a cursor after the calls that were already replayed.
+    Calls are replayed in order, so getting the pending calls and marking a call as used
+    only touches the calls after the cursor.
+    The log can be persisted in a ``SessionStore``, from which it is restored when the CallCenter is created.
+    Calls are only marked as used by the replays of their own session, see ``replayer.apply_multiple``.
+    """
+
+    def __init__(self, store: Optional[SessionStore] = None):
         self.calls: List[ClingoMethodCall] = []
-        self.used: Set[UUID] = set()
-        subscribe(Event.CALL_EXECUTED, self.mark_call_as_used)
+        self.positions: Dict[Union[UUID, str], int] = {}
+        self.cursor = 0
+        # calls after the cursor that were used out of order
+        self.used: Set[Union[UUID, str]] = set()
+        self.store = store
+        if store is not None:
+            pending = {call.uuid for call in store.get_calls(pending_only=True)}
+            self._append_all(store.get_calls())
+            self.used = {call.uuid for call in self.calls if call.uuid not in pending}
+            self._advance()
+
+    def __len__(self):
+        return len(self.calls)
 
     def append(self, call: ClingoMethodCall):
-        self.calls.append(call)
+        self.extend([call])
 
-    def extend(self, calls: List[ClingoMethodCall]):
-        self.calls.extend(calls)
+    def extend(self, calls: Sequence[ClingoMethodCall]):
+        """
+        Appends a batch of calls, which is written to the store in one transaction.
+        """
+        self._append_all(calls)
+        if self.store is not None:
+            self.store.add_calls(calls)
 
     def get_all(self) -> List[ClingoMethodCall]:
         return self.calls
 
-    def get_pending(self) -> Optional[List[ClingoMethodCall]]:
-        return list(filter(lambda call: call.uuid not in self.used, self.calls))
+    def get_pending(self) -> List[ClingoMethodCall]:
+        pending = self.calls[self.cursor:]
+        if self.used:
+            return [call for call in pending if call.uuid not in self.used]
+        return pending
 
     def mark_call_as_used(self, call: ClingoMethodCall):
-        self.used.add(call.uuid)
+        position = self.positions.get(call.uuid)
+        if position is None or position < self.cursor:
+            return
+        if self.store is not None:
+            self.store.mark_calls_as_used([call.uuid])
+        if position == self.cursor:
+            self.cursor += 1
+            self._advance()
+        else:
+            self.used.add(call.uuid)
+
+    def _append_all(self, calls: Sequence[ClingoMethodCall]):
+        for call in calls:
+            self.positions[call.uuid] = len(self.calls)
+            self.calls.append(call)
+
+    def _advance(self):
+        """
+        Moves the cursor past the calls that were used out of order.
+        """
+        while self.used and self.cursor < len(self.calls) and self.calls[self.cursor].uuid in self.used:
+            self.used.remove(self.calls[self.cursor].uuid)
+            self.cursor += 1
@@ -1,8 +1,118 @@
-from flask import Flask
+from typing import Any
+
+from flask import Flask, Request, Response, current_app, request
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.utils import find_modules, import_string
+from werkzeug.wsgi import get_input_stream
 
 from flask_cors import CORS
-from viasp.shared.io import DataclassJSONEncoder, DataclassJSONDecoder
+from viasp.shared.compression import compress, content_encodings, decompressing_reader
+from viasp.shared.defaults import JSON_MIMETYPE, COMPRESSION_THRESHOLD, GZIP_COMPRESSION_LEVEL, \
+    ZSTD_COMPRESSION_LEVEL
+from viasp.shared.io import dumps, loads, binary_mimetypes, dumps_binary, loads_binary
+from viasp.server.session import SessionPrefix, enter_request_session, exit_request_session
+
+
+def negotiate_mimetype() -> str:
+    """
+    Returns the mimetype of the response to the current request, JSON unless the client prefers a binary format.
+    """
+    return request.accept_mimetypes.best_match([JSON_MIMETYPE] + binary_mimetypes(), default=JSON_MIMETYPE)
+
+
+class DataclassJSONProvider(DefaultJSONProvider):
+    """
+    Serializes responses with viASP's encoders, using orjson if it is installed.
+    Clients that accept MessagePack or CBOR get the same objects in that format.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, sort_keys=kwargs.get("sort_keys", self.sort_keys), indent=kwargs.get("indent"))
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        mimetype = negotiate_mimetype()
+        if mimetype == JSON_MIMETYPE:
+            response = super().response(*args, **kwargs)
+        else:
+            response = current_app.response_class(dumps_binary(_response_object(args, kwargs), mimetype),
+                                                  mimetype=mimetype)
+        response.vary.add("Accept")
+        return response
+
+
+def _response_object(args, kwargs):
+    """
+    The object of a JSON response, which is passed like the arguments of ``flask.jsonify``.
+    """
+    if args and kwargs:
+        raise TypeError("A response takes either args or kwargs, not both.")
+    if len(args) == 1:
+        return args[0]
+    return args or kwargs or None
+
+
+class ViaspRequest(Request):
+    """
+    A request whose body can also be MessagePack or CBOR, which ``get_json`` decodes like JSON.
+    Like JSON, the body is decoded once and cached.
+    """
+    _decoded_body: Any = Ellipsis
+
+    def get_json(self, force=False, silent=False, cache=True):
+        if self.mimetype not in binary_mimetypes():
+            return super().get_json(force=force, silent=silent, cache=cache)
+        if cache and self._decoded_body is not Ellipsis:
+            return self._decoded_body
+        try:
+            decoded = loads_binary(self.get_data(cache=cache), self.mimetype)
+        except Exception as e:
+            # the decoders raise their own exceptions, which are bad requests just like invalid JSON
+            if silent:
+                return None
+            return self.on_json_loading_failed(e)
+        if cache:
+            self._decoded_body = decoded
+        return decoded
+
+
+class RequestDecompressor:
+    """
+    WSGI middleware that decompresses request bodies with a supported ``Content-Encoding`` while they are read.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding in content_encodings():
+            environ["wsgi.input"] = decompressing_reader(get_input_stream(environ), encoding)
+            environ["wsgi.input_terminated"] = True
+            environ.pop("CONTENT_LENGTH", None)
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.wsgi_app(environ, start_response)
+
+
+def compress_response(response: Response) -> Response:
+    """
+    Compresses responses of at least ``COMPRESSION_THRESHOLD`` bytes with the encoding that the client prefers.
+    """
+    if response.direct_passthrough or response.is_streamed or "Content-Encoding" in response.headers \
+            or response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(content_encodings())
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < current_app.config["COMPRESSION_THRESHOLD"]:
+        return response
+    response.set_data(compress(data, encoding, current_app.config[f"{encoding.upper()}_COMPRESSION_LEVEL"]))
+    response.headers["Content-Encoding"] = encoding
+    return response
 
 
 def register_blueprints(app):
@@ -16,15 +126,19 @@ def register_blueprints(app):
 
 def create_app():
     app = Flask('api',static_url_path='/static', static_folder='/static')
-    app.json_encoder = DataclassJSONEncoder
-    app.json_decoder = DataclassJSONDecoder
+    app.json = DataclassJSONProvider(app)
+    app.request_class = ViaspRequest
     app.config['CORS_HEADERS'] = 'Content-Type'
+    app.config['COMPRESSION_THRESHOLD'] = COMPRESSION_THRESHOLD
+    app.config['GZIP_COMPRESSION_LEVEL'] = GZIP_COMPRESSION_LEVEL
+    app.config['ZSTD_COMPRESSION_LEVEL'] = ZSTD_COMPRESSION_LEVEL
+    app.wsgi_app = SessionPrefix(RequestDecompressor(app.wsgi_app))
+    app.before_request(enter_request_session)
+    app.after_request(compress_response)
+    app.teardown_request(exit_request_session)
 
     register_blueprints(app)
     CORS(app)
 
-    app.json_encoder = DataclassJSONEncoder
-    app.json_decoder = DataclassJSONDecoder
-
     
     return app
@@ -0,0 +1,180 @@
+"""
+Background jobs for the long running endpoints, with their progress and cancellation.
+The jobs of a session run one after another on a worker thread, in the context of the request that started them.
+"""
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TypeVar
+from uuid import uuid4
+
+from ..shared.defaults import JOB_HISTORY_SIZE
+
+T = TypeVar("T")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    A job with its status and progress: the name of its current stage, and how many of the models of the stage are done.
+    Cancelling a job interrupts the Controls and solve handles it registered,
+    everything else is stopped the next time the job checks for cancellation.
+    """
+
+    def __init__(self, kind: str):
+        self.id = uuid4().hex
+        self.kind = kind
+        self.status = PENDING
+        self.stage: Optional[str] = None
+        self.done = 0
+        self.total: Optional[int] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.interruptibles: Dict[int, Any] = {}
+        self.future: Optional[Future] = None
+
+    def report(self, stage: str, done: int = 0, total: Optional[int] = None):
+        self.stage, self.done, self.total = stage, done, total
+
+    def check(self):
+        """
+        :raises JobCancelled: if the job was cancelled.
+        """
+        if self.cancelled.is_set():
+            raise JobCancelled()
+
+    def cancel(self):
+        self.cancelled.set()
+        with self.lock:
+            for interruptible in self.interruptibles.values():
+                if hasattr(interruptible, "interrupt"):
+                    interruptible.interrupt()
+                else:
+                    interruptible.cancel()
+
+    @contextmanager
+    def interruptible(self, obj):
+        """
+        Registers a ``clingo.Control`` or ``clingo.SolveHandle``, which is interrupted if the job is cancelled.
+        """
+        with self.lock:
+            self.interruptibles[id(obj)] = obj
+        try:
+            self.check()
+            yield obj
+        finally:
+            with self.lock:
+                self.interruptibles.pop(id(obj), None)
+        self.check()
+
+    def wait(self, timeout: Optional[float] = None) -> "Job":
+        if self.future is not None:
+            self.future.exception(timeout)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "kind": self.kind, "status": self.status, "stage": self.stage,
+                "done": self.done, "total": self.total, "error": self.error}
+
+    def _run(self, function: Callable[["Job"], Any]):
+        if self.cancelled.is_set():
+            self.status = CANCELLED
+            return
+        self.status = RUNNING
+        token = _current_job.set(self)
+        try:
+            self.result = function(self)
+            self.status = CANCELLED if self.cancelled.is_set() else DONE
+        except JobCancelled:
+            self.status = CANCELLED
+        except Exception as e:
+            if self.cancelled.is_set():
+                self.status = CANCELLED
+            else:
+                self.error = f"{type(e).__name__}: {e}"
+                self.status = FAILED
+        finally:
+            _current_job.reset(token)
+
+
+class Jobs:
+    """
+    The jobs of a session. Only the ``history_size`` most recent finished jobs are kept.
+    """
+
+    def __init__(self, history_size: int = JOB_HISTORY_SIZE):
+        self.history_size = history_size
+        self.jobs: Dict[str, Job] = {}
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.lock = threading.Lock()
+
+    def start(self, kind: str, function: Callable[[Job], Any]) -> Job:
+        """
+        Runs the function as a job, in a copy of the current context.
+        """
+        job = Job(kind)
+        context = contextvars.copy_context()
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="viasp-job")
+            finished = [id for id, other in self.jobs.items() if other.status in FINISHED]
+            for id in finished[:max(0, len(finished) - self.history_size + 1)]:
+                del self.jobs[id]
+            self.jobs[job.id] = job
+            job.future = self.executor.submit(context.run, job._run, function)
+        return job
+
+    def get(self, id: str) -> Optional[Job]:
+        return self.jobs.get(id)
+
+    def active(self) -> bool:
+        """
+        Whether a job is pending or running.
+        """
+        return any(job.status not in FINISHED for job in list(self.jobs.values()))
+
+    def shutdown(self):
+        """
+        Cancels the jobs and waits until the running one has stopped.
+        """
+        for job in list(self.jobs.values()):
+            job.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+
+_current_job: "contextvars.ContextVar[Optional[Job]]" = contextvars.ContextVar("viasp_job", default=None)
+
+
+def current_job() -> Optional[Job]:
+    return _current_job.get()
+
+
+def track(items: Iterable[T], stage: str, total: Optional[int] = None) -> Iterator[T]:
+    """
+    Reports the progress of the current job while the items are consumed, and stops if it is cancelled.
+    Outside of jobs, the items are passed through.
+    """
+    job = current_job()
+    if job is None:
+        yield from items
+        return
+    job.report(stage, 0, total)
+    for done, item in enumerate(items):
+        job.check()
+        yield item
+        job.done = done + 1
+    job.check()
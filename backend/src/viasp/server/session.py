@@ -0,0 +1,223 @@
+"""
+Session-scoped workspaces, so that one backend serves many users.
+A request selects its session with the session header or a ``/session/<id>`` prefix of its path.
+Every session has its own program, call log, marked models and graph, which are kept in its ``SessionStore``.
+"""
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from os.path import join, dirname, abspath
+from typing import Optional, List, Any, Dict
+
+from flask import g, request, abort, Response
+
+from ..shared.defaults import SESSION_HEADER, DEFAULT_SESSION, SESSIONS_PATH, MAX_SESSIONS, SESSION_IDLE_TIMEOUT, \
+    PERSIST_CALLS
+from .jobs import Jobs
+from ..asp.replayer import ReplayCheckpoints
+from .database import CallCenter, SessionStore, storage_directory, release_storage
+
+SESSION_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+SESSION_PREFIX = re.compile(r"/session/([^/]+)(/.*)?")
+
+
+class DataContainer:
+    def __init__(self):
+        self.warnings = []
+        self.transformer = None
+        self.analyzer = None
+        self.analyzed_programs = []
+
+
+class Session:
+    """
+    The state of one user. The default session keeps its files at the storage paths of a backend without sessions,
+    all others in their own directory.
+    """
+
+    def __init__(self, id: str, directory: Optional[str] = None):
+        self.id = id
+        self.directory = directory
+        self.last_used = time.monotonic()
+        # the number of requests that are handled in the session
+        self.requests = 0
+        self.data = DataContainer()
+        self.replay_lock = threading.RLock()
+        self.checkpoints = ReplayCheckpoints()
+        self.using_clingraph: List[str] = []
+        self.graph: Any = None
+        self.graph_version: Optional[int] = None
+        self.jobs = Jobs()
+        token = storage_directory.set(directory)
+        try:
+            self.store = SessionStore()
+            self.calls = CallCenter(self.store if PERSIST_CALLS else None)
+        finally:
+            storage_directory.reset(token)
+        self._models: Any = []
+        self._models_version = 0
+
+    @property
+    def models(self) -> Any:
+        """
+        The marked models, which are only read from the store again if they were saved since, by any thread or process.
+        """
+        version = self.store.models_version
+        if version != self._models_version:
+            self._models_version, self._models = self.store.load_models()
+        return self._models
+
+    @models.setter
+    def models(self, models: Any):
+        self._models_version = self.store.save_models(models)
+        self._models = models
+
+    def busy(self) -> bool:
+        return self.requests > 0 or self.jobs.active()
+
+    def close(self):
+        """
+        Stops the jobs of the session, closes all connections to its files and removes them.
+        """
+        self.jobs.shutdown()
+        self.store.close()
+        if self.directory is not None:
+            release_storage(self.directory)
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class SessionRegistry:
+    """
+    The sessions of the backend, created when they are first used.
+    Sessions that were not used for ``idle_timeout`` seconds are evicted with their files,
+    and so is the least recently used one if there are more than ``max_sessions``.
+    Sessions that are handling a request or running a job are not evicted, so there may be more sessions for a while.
+    The default session is never evicted. Evicted sessions are closed on a background thread.
+    """
+
+    def __init__(self, path=SESSIONS_PATH, max_sessions: int = MAX_SESSIONS,
+                 idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        self.path: str = join(dirname(abspath(__file__)), path)
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.default = Session(DEFAULT_SESSION)
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.lock = threading.Lock()
+        # the threads that close the evicted sessions, by their id
+        self.closing: Dict[str, threading.Thread] = {}
+
+    def get(self, id: str) -> Session:
+        """
+        :raises ValueError: if the id is not a valid session id.
+        """
+        return self._get(id, 0)
+
+    def enter(self, id: str) -> Session:
+        """
+        Returns the session of a request, which is not evicted until the request ``leave``s it.
+
+        :raises ValueError: if the id is not a valid session id.
+        """
+        return self._get(id, 1)
+
+    def leave(self, session: Session):
+        if session is not self.default:
+            with self.lock:
+                session.requests -= 1
+
+    def _get(self, id: str, requests: int) -> Session:
+        if id == DEFAULT_SESSION:
+            self.default.last_used = time.monotonic()
+            return self.default
+        if not SESSION_ID.fullmatch(id):
+            raise ValueError(f"Invalid session id {id}.")
+        with self.lock:
+            session = self.sessions.get(id)
+            if session is None:
+                closing = self.closing.get(id)
+                if closing is not None:
+                    # the directory of the session is removed first, which is quick as its jobs were finished
+                    closing.join()
+                session = Session(id, join(self.path, id))
+                self.sessions[id] = session
+            self.sessions.move_to_end(id)
+            session.last_used = time.monotonic()
+            session.requests += requests
+            for other in self._evict(id):
+                thread = threading.Thread(target=self._close, args=(other,), name="viasp-session-close", daemon=True)
+                self.closing[other.id] = thread
+                thread.start()
+        return session
+
+    def _evict(self, current: str) -> List[Session]:
+        deadline = time.monotonic() - self.idle_timeout
+        idle = [id for id, session in self.sessions.items()
+                if id != current and session.last_used < deadline and not session.busy()]
+        evicted = [self.sessions.pop(id) for id in idle]
+        surplus = [id for id, session in self.sessions.items() if id != current and not session.busy()]
+        for id in surplus[:max(0, len(self.sessions) - self.max_sessions)]:
+            evicted.append(self.sessions.pop(id))
+        return evicted
+
+    def _close(self, session: Session):
+        try:
+            session.close()
+        finally:
+            # not under the lock, which is held while a new session with the same id waits for this thread
+            if self.closing.get(session.id) is threading.current_thread():
+                del self.closing[session.id]
+
+    def __len__(self):
+        return len(self.sessions) + 1
+
+
+SESSIONS = SessionRegistry()
+_current_session: "ContextVar[Optional[Session]]" = ContextVar("viasp_session", default=None)
+
+
+def get_session() -> Session:
+    """
+    Returns the session of the current request, or the default session outside of requests.
+    """
+    session = _current_session.get()
+    return session if session is not None else SESSIONS.default
+
+
+def enter_request_session():
+    """
+    Selects the session of the request, before it is handled.
+    """
+    id = request.environ.get("viasp.session") or request.headers.get(SESSION_HEADER, DEFAULT_SESSION)
+    try:
+        session = SESSIONS.enter(id)
+    except ValueError as e:
+        abort(Response(str(e), 400))
+    g.viasp_session_tokens = (_current_session.set(session), storage_directory.set(session.directory))
+
+
+def exit_request_session(_=None):
+    tokens = g.pop("viasp_session_tokens", None)
+    if tokens is not None:
+        SESSIONS.leave(_current_session.get())
+        _current_session.reset(tokens[0])
+        storage_directory.reset(tokens[1])
+
+
+class SessionPrefix:
+    """
+    WSGI middleware that selects the session of requests to ``/session/<id>/...`` and removes the prefix from the path.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        match = SESSION_PREFIX.fullmatch(environ.get("PATH_INFO", ""))
+        if match is not None:
+            environ["viasp.session"] = match.group(1)
+            environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + f"/session/{match.group(1)}"
+            environ["PATH_INFO"] = match.group(2) or "/"
+        return self.app(environ, start_response)
@@ -23,7 +23,7 @@ from dash._jupyter import _jupyter_config
 from viasp import clingoApiClient
 from viasp.shared.defaults import (DEFAULT_BACKEND_HOST, DEFAULT_BACKEND_PORT,
                                    DEFAULT_BACKEND_PROTOCOL, CLINGRAPH_PATH, 
-                                   GRAPH_PATH, PROGRAM_STORAGE_PATH, STDIN_TMP_STORAGE_PATH)
+                                   SESSION_STORE_PATH, PROGRAM_FILES_PATH, SESSIONS_PATH)
 
 
 
@@ -91,9 +91,10 @@ def run(host=DEFAULT_BACKEND_HOST, port=DEFAULT_BACKEND_PORT, colors=None):
                 the static/clingraph folder
                 and auxiliary program files
         """
-        if os.path.exists(CLINGRAPH_PATH):
-            shutil.rmtree(CLINGRAPH_PATH)
-        for file in [GRAPH_PATH, PROGRAM_STORAGE_PATH, STDIN_TMP_STORAGE_PATH]:
+        for directory in [CLINGRAPH_PATH, PROGRAM_FILES_PATH, SESSIONS_PATH]:
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+        for file in [SESSION_STORE_PATH, f"{SESSION_STORE_PATH}-wal", f"{SESSION_STORE_PATH}-shm"]:
             if os.path.exists(file):
                 os.remove(file)
 
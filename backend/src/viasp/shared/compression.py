@@ -0,0 +1,78 @@
+"""Compression of request and response bodies with gzip, or zstd if zstandard is installed."""
+import gzip
+from io import BytesIO
+from typing import BinaryIO, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .defaults import GZIP_COMPRESSION_LEVEL, ZSTD_COMPRESSION_LEVEL
+
+
+def content_encodings() -> List[str]:
+    """
+    Returns the content encodings that can be used, the preferred first.
+    """
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """
+    :param data: The data to compress.
+    :param encoding: ``"gzip"`` or ``"zstd"``.
+    :param level: The compression level, by default ``GZIP_COMPRESSION_LEVEL`` or ``ZSTD_COMPRESSION_LEVEL``.
+    :raises ValueError: if the encoding is not supported.
+    """
+    if encoding == "gzip":
+        return gzip.compress(data, GZIP_COMPRESSION_LEVEL if level is None else level, mtime=0)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(ZSTD_COMPRESSION_LEVEL if level is None else level).compress(data)
+    raise ValueError(f"Unsupported content encoding {encoding}.")
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    """
+    :raises ValueError: if the encoding is not supported or the data is not valid.
+    """
+    return decompressing_reader(BytesIO(data), encoding).read()
+
+
+def decompressing_reader(stream: BinaryIO, encoding: str) -> BinaryIO:
+    """
+    Wraps a stream of compressed data in a stream of the decompressed data, which is decompressed as it is read.
+
+    :raises ValueError: if the encoding is not supported. Invalid data raises ValueError when it is read.
+    """
+    if encoding == "gzip":
+        return _ValueErrorReader(gzip.GzipFile(fileobj=stream, mode="rb"), (OSError, EOFError))
+    if encoding == "zstd" and zstandard is not None:
+        return _ValueErrorReader(zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True),
+                                 (zstandard.ZstdError,))
+    raise ValueError(f"Unsupported content encoding {encoding}.")
+
+
+class _ValueErrorReader:
+    """
+    Raises the errors of the decompressors as ValueError, like the decoders of the content types.
+    """
+
+    def __init__(self, reader, errors):
+        self.reader = reader
+        self.errors = errors
+
+    def read(self, size: int = -1) -> bytes:
+        try:
+            return self.reader.read(size)
+        except self.errors as e:
+            raise ValueError(f"Invalid compressed data ({e}).") from e
+
+    def readline(self, size: int = -1) -> bytes:
+        try:
+            return self.reader.readline(size)
+        except self.errors as e:
+            raise ValueError(f"Invalid compressed data ({e}).") from e
+
+    def close(self):
+        self.reader.close()
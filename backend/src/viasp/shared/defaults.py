@@ -7,8 +7,66 @@ DEFAULT_BACKEND_PORT = 5050
 DEFAULT_FRONTEND_PORT = 8050
 DEFAULT_BACKEND_URL = f"{DEFAULT_BACKEND_PROTOCOL}://{DEFAULT_BACKEND_HOST}:{DEFAULT_BACKEND_PORT}"
 SHARED_PATH = pathlib.Path(__file__).parent.resolve()
-GRAPH_PATH = SHARED_PATH / "viasp_graph_storage.json"
+SESSION_STORE_PATH = SHARED_PATH / "viasp_session.sqlite"
 STATIC_PATH =  pathlib.Path(__file__).parent.parent.resolve() / "server/static/"
 CLINGRAPH_PATH = os.path.join(STATIC_PATH, "clingraph")
-PROGRAM_STORAGE_PATH = SHARED_PATH / "prg.lp"
-STDIN_TMP_STORAGE_PATH = SHARED_PATH / "viasp_stdin_tmp.lp"
+ANALYSIS_PROCESSES = os.cpu_count() or 1
+PARALLEL_ANALYSIS_THRESHOLD = 1 << 20
+ANALYZER_CACHE_PATH = SHARED_PATH / "analyzer_cache"
+ANALYZER_CACHE_SIZE = 16
+PARSE_CACHE_SIZE = 32
+# "orjson", "json" or "auto" to use orjson if it is installed
+JSON_BACKEND = os.environ.get("VIASP_JSON_BACKEND", "auto")
+SYMBOL_ENCODING_CACHE_SIZE = 1 << 16
+# the server lists the symbol encodings it can decode in this header of the healthcheck
+SYMBOL_ENCODINGS_HEADER = "X-viASP-Symbol-Encodings"
+COMPACT_SYMBOL_ENCODING = "text"
+UPLOAD_CHUNK_SIZE = 1 << 16
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPE = "application/msgpack"
+CBOR_MIMETYPE = "application/cbor"
+# the server lists the content types it can encode and decode in this header of the healthcheck
+CONTENT_TYPES_HEADER = "X-viASP-Content-Types"
+# bodies smaller than this are sent uncompressed
+COMPRESSION_THRESHOLD = 1 << 14
+GZIP_COMPRESSION_LEVEL = 6
+ZSTD_COMPRESSION_LEVEL = 3
+# the server lists the content encodings it can decompress in this header of the healthcheck
+CONTENT_ENCODINGS_HEADER = "X-viASP-Content-Encodings"
+# the parts of marked clingo models that are copied, viASP itself only uses the atoms.
+# The other parts stay empty, they are not computed on demand, as the clingo model is gone once the solver moves on.
+MODEL_CAPTURE = ("atoms",)
+# seconds a write to the session store waits for another writer
+SESSION_STORE_TIMEOUT = 30
+# keep the method calls in the session store, so a restarted backend can replay them
+PERSIST_CALLS = os.environ.get("VIASP_PERSIST_CALLS", "0") == "1"
+# calls that are not replayed when only the program text is needed, separated by commas
+REPLAY_SKIPPED_CALLS = tuple(name for name in os.environ.get("VIASP_REPLAY_SKIP", "ground").split(",") if name)
+# programs of replays that are kept per session, to continue replays of the same calls from them
+REPLAY_CHECKPOINTS = 4
+# programs loaded from stdin or strings, stored by the hash of their content
+PROGRAM_FILES_PATH = SHARED_PATH / "program_files"
+# loaded files whose text is kept in memory
+PROGRAM_FILE_CACHE_SIZE = 8
+# a request selects its session with this header or a /session/<id> prefix of its path
+SESSION_HEADER = "X-viASP-Session"
+DEFAULT_SESSION = "default"
+SESSIONS_PATH = SHARED_PATH / "sessions"
+MAX_SESSIONS = 32
+# seconds after which an unused session is evicted
+SESSION_IDLE_TIMEOUT = 60 * 60
+# finished jobs that are kept per session, to be polled
+JOB_HISTORY_SIZE = 16
+# seconds between the polls of a client that waits for a job
+JOB_POLL_INTERVAL = 0.2
+# keep-alive connections the client keeps open to the backend
+HTTP_POOL_SIZE = 4
+# retries of the client after connection errors and 502, 503 or 504, waiting HTTP_BACKOFF_FACTOR * 2 ** n seconds
+HTTP_RETRIES = 2
+HTTP_BACKOFF_FACTOR = 0.1
+# seconds after a failed request before the client checks the health of the backend again
+HEALTH_RECHECK_INTERVAL = 5
+# the client sends method calls in batches, when this many are buffered
+# or with the first call that is made this many seconds after the first buffered one
+CALL_BUFFER_SIZE = 256
+CALL_BUFFER_DELAY = 1.0
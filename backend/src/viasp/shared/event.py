@@ -5,6 +5,7 @@ REGISTRY = {}
 
 class Event(Enum):
     CALL_EXECUTED = 1
+    PROGRAM_CHANGED = 2
 
 
 def on(event: Event):
@@ -14,9 +14,25 @@ class ViaspClient(ABC):
     def register_function_call(self, name: str, sig: Signature, args: Sequence[Any], kwargs: Dict[str, Any]):
         pass
 
+    def flush(self):
+        """
+        Sends the calls that were registered, but not yet sent. By default, calls are sent when they are registered.
+        """
+
     @abstractmethod
     def set_target_stable_model(self, stable_models: Collection[StableModel]):
-        pass
+        """
+        Sends all marked models. Returns False if they were not received, or a future of whether they were.
+        Any other result counts as received.
+        """
+
+    def update_target_stable_models(self, stable_models: Collection[StableModel], added: Collection[StableModel],
+                                    removed: Collection[StableModel]):
+        """
+        Sends the models that were marked and unmarked since the marked models were last sent,
+        and returns like ``set_target_stable_model``. By default, all marked models are sent again.
+        """
+        return self.set_target_stable_model(stable_models)
 
     @abstractmethod
     def show(self):
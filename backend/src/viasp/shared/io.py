@@ -1,8 +1,11 @@
+import codecs
 import json
+import re
 from enum import IntEnum
-from json import JSONEncoder, JSONDecoder
+from functools import lru_cache
+from json import JSONEncoder, JSONDecoder, JSONDecodeError
 from dataclasses import is_dataclass
-from typing import Any, Union, Collection, Iterable, Dict, Sequence
+from typing import Any, Union, Collection, Iterable, Iterator, Dict, List, Sequence, Callable, Optional
 from pathlib import PosixPath
 from uuid import UUID
 import os
@@ -16,6 +19,18 @@ import types
 
 import clingo
 import networkx as nx
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
 from _clingo.lib import clingo_model_type_brave_consequences, clingo_model_type_cautious_consequences, \
     clingo_model_type_stable_model
 from clingo import Model as clingo_Model, ModelType, Symbol, Application
@@ -24,111 +39,241 @@ from clingo.ast import AST, Transformer
 from .interfaces import ViaspClient
 from .model import Node, Transformation, Signature, StableModel, ClingoMethodCall, TransformationError, FailedReason, SymbolIdentifier, TransformerTransport
 from ..server.database import ProgramDatabase
+from ..asp.parse_cache import get_source_index
+from ..asp.reify import parse_terms
+from .defaults import JSON_BACKEND, SYMBOL_ENCODING_CACHE_SIZE, MSGPACK_MIMETYPE, CBOR_MIMETYPE, MODEL_CAPTURE
 
 
 def model_to_json(model: Union[clingo_Model, Collection[clingo_Model]], *args, **kwargs) -> str:
     return json.dumps(model, *args, cls=DataclassJSONEncoder, **kwargs)
 
 
-def object_hook(obj):
-    if '_type' not in obj:
+class SymbolText(str):
+    """
+    The textual form of a symbol in the compact encoding, until it is parsed by resolve_symbol_texts.
+    """
+
+
+def _map_symbol_texts(obj, function):
+    if isinstance(obj, SymbolText):
+        return function(obj)
+    if isinstance(obj, list):
+        return [_map_symbol_texts(x, function) for x in obj]
+    if isinstance(obj, tuple):
+        return tuple(_map_symbol_texts(x, function) for x in obj)
+    if isinstance(obj, dict):
+        return {k: _map_symbol_texts(v, function) for k, v in obj.items()}
+    return obj
+
+
+def resolve_symbol_texts(obj):
+    """
+    Replaces the SymbolTexts in (nested) lists, tuples and dicts by their symbols. All symbols are parsed at once.
+
+    :raises ValueError: if a text is not a symbol.
+    """
+    texts: Dict[str, None] = {}
+    _map_symbol_texts(obj, lambda text: texts.setdefault(text))
+    if not texts:
         return obj
-    t = obj['_type']
-    del obj['_type']
-    if t == "Function":
-        return clingo.Function(**obj)
-    elif t == "Number":
-        return clingo.Number(**obj)
-    elif t == "Node":
-        obj['atoms'] = frozenset(obj['atoms'])
-        obj['diff'] = frozenset(obj['diff'])
-        return Node(**obj)
-    elif t == "Transformation":
-        return Transformation(**obj)
-    elif t == "Signature":
-        return Signature(**obj)
-    elif t == "Graph":
-        return nx.node_link_graph(obj["_graph"])
-    elif t == "StableModel":
-        return StableModel(**obj)
-    elif t == "ClingoMethodCall":
-        return ClingoMethodCall(**obj)
-    elif t == "SymbolIdentifier":
-        return SymbolIdentifier(**obj)
-    elif t == "Transformer":
-        # Reconstruct the class definition
-        # Get the path to the module containing MyClass
-        my_module_path = obj["Path"]
-        # Add the directory containing my_module to sys.path
-        my_module_dir = os.path.dirname(my_module_path)
-        sys.path.append(my_module_dir)
-        # Load the module containing MyClass
-        module_name = os.path.splitext(os.path.basename(my_module_path))[0]
-        module_spec = importlib.util.spec_from_file_location(module_name, my_module_path)
-        my_module = importlib.util.module_from_spec(module_spec)
-        module_spec.loader.exec_module(my_module)
-
-        # Create a temporary module to hold the class definition
-        module_name = '__temp_module__'
-        module = types.ModuleType(module_name)
-
-        # get the string
-        class_definition_str = obj["Imports"] + "\n" \
-                            + base64.b64decode(obj["Transformer_definition"])\
-                                    .decode('utf-8')
-        
-        # Add the module's original package to sys.path
-        module.__file__ = my_module.__file__
-        sys.modules[module_name] = module
-
-        # Execute the class definition in the temporary module
-        exec(class_definition_str, module.__dict__)
-        return getattr(module, "Transformer")
+    symbols = dict(zip(texts, parse_terms(list(texts))))
+    for text, symbol in symbols.items():
+        if symbol is None:
+            raise ValueError(f"Invalid symbol {text}.")
+    return _map_symbol_texts(obj, lambda text: symbols[text])
+
+
+def decode_function(obj: dict) -> Symbol:
+    obj['arguments'] = resolve_symbol_texts(obj['arguments'])
+    return clingo.Function(**obj)
+
+
+def decode_node(obj: dict) -> Node:
+    obj['atoms'] = frozenset(obj['atoms'])
+    obj['diff'] = frozenset(obj['diff'])
+    return Node(**obj)
+
+
+def decode_clingo_method_call(obj: dict) -> ClingoMethodCall:
+    obj['kwargs'] = resolve_symbol_texts(obj['kwargs'])
+    return ClingoMethodCall(**obj)
+
+
+def decode_symbol_identifier(obj: dict) -> SymbolIdentifier:
+    obj['symbol'] = resolve_symbol_texts(obj['symbol'])
+    return SymbolIdentifier(**obj)
+
+
+def decode_transformer(obj: dict):
+    # Reconstruct the class definition
+    # Get the path to the module containing MyClass
+    my_module_path = obj["Path"]
+    # Add the directory containing my_module to sys.path
+    my_module_dir = os.path.dirname(my_module_path)
+    sys.path.append(my_module_dir)
+    # Load the module containing MyClass
+    module_name = os.path.splitext(os.path.basename(my_module_path))[0]
+    module_spec = importlib.util.spec_from_file_location(module_name, my_module_path)
+    my_module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(my_module)
+
+    # Create a temporary module to hold the class definition
+    module_name = '__temp_module__'
+    module = types.ModuleType(module_name)
+
+    # get the string
+    class_definition_str = obj["Imports"] + "\n" \
+                        + base64.b64decode(obj["Transformer_definition"])\
+                                .decode('utf-8')
+
+    # Add the module's original package to sys.path
+    module.__file__ = my_module.__file__
+    sys.modules[module_name] = module
+
+    # Execute the class definition in the temporary module
+    exec(class_definition_str, module.__dict__)
+    return getattr(module, "Transformer")
+
+
+# decoders of the objects, by their _type, which is removed before the decoder is called
+def decode_model_type(obj) -> Any:
+    if isinstance(obj, dict) and "__enum__" in obj:
+        return getattr(ModelType, obj["__enum__"].rpartition(".")[2])
     return obj
 
 
+def decode_stable_model(obj) -> StableModel:
+    obj = resolve_symbol_texts(obj)
+    if "type" in obj:
+        obj["type"] = decode_model_type(obj["type"])
+    return StableModel(**obj)
+
+
+DECODERS: Dict[str, Callable[[dict], Any]] = {
+    "Symbol": lambda obj: SymbolText(obj["repr"]),
+    "Function": decode_function,
+    "Number": lambda obj: clingo.Number(**obj),
+    "Node": decode_node,
+    "Transformation": lambda obj: Transformation(**obj),
+    "Signature": lambda obj: Signature(**obj),
+    "Graph": lambda obj: nx.node_link_graph(obj["_graph"]),
+    "StableModel": decode_stable_model,
+    "ClingoMethodCall": decode_clingo_method_call,
+    "SymbolIdentifier": decode_symbol_identifier,
+    "Transformer": decode_transformer,
+}
+
+
+def object_hook(obj):
+    t = obj.pop('_type', None)
+    if t is None:
+        return obj
+    decoder = DECODERS.get(t)
+    return obj if decoder is None else decoder(obj)
+
+
 class DataclassJSONDecoder(JSONDecoder):
     def __init__(self, *args, **kwargs):
         JSONDecoder.__init__(self, object_hook=object_hook, *args, **kwargs)
 
+    def decode(self, s, *args, **kwargs):
+        result = super().decode(s, *args, **kwargs)
+        # symbols outside of viASP's objects are parsed once the whole document is read
+        return resolve_symbol_texts(result) if '"Symbol"' in s else result
+
+
+def encode_uuid(o: Union[UUID, str]) -> str:
+    return o.hex if isinstance(o, UUID) else o
+
+
+def encode_model_type(o: ModelType) -> dict:
+    return {"__enum__": str(o)}
+
+
+def encode_failed_reason(o: FailedReason) -> dict:
+    return {"_type": "FailedReason", "value": o.value}
+
+
+def encode_node(o: Node) -> dict:
+    sorted_reason = {} if len(o.reason) == 0 else o.reason
+    return {"_type": "Node", "atoms": o.sorted_atoms(), "diff": o.sorted_diff(), "reason": sorted_reason,
+            "recursive": o.recursive, "uuid": encode_uuid(o.uuid), "rule_nr": o.rule_nr}
+
+
+def encode_transformation_error(o: TransformationError) -> dict:
+    reason = encode_failed_reason(o.reason) if isinstance(o.reason, FailedReason) else o.reason
+    return {"_type": "TransformationError", "ast": o.ast, "reason": reason}
+
+
+def encode_symbol_identifier(o: SymbolIdentifier) -> dict:
+    return {"_type": "SymbolIdentifier", "symbol": o.symbol, "uuid": encode_uuid(o.uuid)}
+
+
+def encode_signature(o: Signature) -> dict:
+    return {"_type": "Signature", "name": o.name, "args": o.args}
+
+
+def encode_transformation(o: Transformation) -> dict:
+    rules = o.sources if len(o.sources) else get_rules_from_input_program(o.rules)
+    return {"_type": "Transformation", "id": o.id, "rules": rules}
+
+
+def encode_stable_model(o: StableModel) -> dict:
+    model_type = encode_model_type(o.type) if isinstance(o.type, ModelType) else o.type
+    return {"_type": "StableModel", "cost": o.cost, "optimality_proven": o.optimality_proven, "type": model_type,
+            "atoms": o.atoms, "terms": o.terms, "shown": o.shown, "theory": o.theory}
+
+
+def encode_clingo_method_call(o: ClingoMethodCall) -> dict:
+    return {"_type": "ClingoMethodCall", "name": o.name, "kwargs": o.kwargs, "uuid": encode_uuid(o.uuid)}
+
+
+def encode_transformer_transport(o: TransformerTransport) -> dict:
+    # Get the class definition as a string
+    class_definition = inspect.getsource(o.transformer)
+    transformer_bytes = base64.b64encode(
+        class_definition.encode('utf-8')).decode('utf-8')
+
+    o_json = {"_type": "Transformer",
+              "Transformer_definition": transformer_bytes,
+              "Imports": o.imports,
+              "Path": o.path}
+    return o_json
+
+
+def encode_graph(o: nx.Graph) -> dict:
+    return {"_type": "Graph", "_graph": nx.node_link_data(o)}
+
 
 def dataclass_to_dict(o):
     if isinstance(o, Node):
-        sorted_atoms = sorted(o.atoms, key=lambda x: x.symbol)
-        sorted_diff = sorted(o.diff, key=lambda x: x.symbol)
-        sorted_reason = {} if len(o.reason) == 0 else o.reason
-        return {"_type": "Node", "atoms": sorted_atoms, "diff": sorted_diff, "reason": sorted_reason, "recursive": o.recursive, "uuid": o.uuid,
-                "rule_nr": o.rule_nr}
+        return encode_node(o)
     elif isinstance(o, TransformationError):
-        return {"_type": "TransformationError", "ast": o.ast, "reason": o.reason}
+        return encode_transformation_error(o)
     elif isinstance(o, SymbolIdentifier):
-        return {"_type": "SymbolIdentifier", "symbol": o.symbol, "uuid": o.uuid}
+        return encode_symbol_identifier(o)
     elif isinstance(o, Signature):
-        return {"_type": "Signature", "name": o.name, "args": o.args}
+        return encode_signature(o)
     elif isinstance(o, Transformation):
-        return {"_type": "Transformation", "id": o.id, "rules": get_rules_from_input_program(o.rules)}
+        return encode_transformation(o)
     elif isinstance(o, StableModel):
-        return {"_type": "StableModel", "cost": o.cost, "optimality_proven": o.optimality_proven, "type": o.type,
-                "atoms": o.atoms, "terms": o.terms, "shown": o.shown, "theory": o.theory}
+        return encode_stable_model(o)
     elif isinstance(o, ClingoMethodCall):
-        return {"_type": "ClingoMethodCall", "name": o.name, "kwargs": o.kwargs, "uuid": o.uuid}
+        return encode_clingo_method_call(o)
     elif isinstance(o, TransformerTransport):
-        # Get the class definition as a string
-        class_definition = inspect.getsource(o.transformer)
-        transformer_bytes = base64.b64encode(
-            class_definition.encode('utf-8')).decode('utf-8')
-        
-        o_json = {"_type": "Transformer",
-                  "Transformer_definition": transformer_bytes,
-                  "Imports": o.imports,
-                  "Path": o.path}
-        return o_json
+        return encode_transformer_transport(o)
     else:
         raise Exception(f"I/O for {type(o)} not implemented!")
 
 
 class DataclassJSONEncoder(JSONEncoder):
+    def __init__(self, *args, compact_symbols: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compact_symbols = compact_symbols
+
     def default(self, o):
+        if self.compact_symbols and type(o) is Symbol:
+            return encode_symbol_text(o)
         encoded = encode_object(o)
         if encoded is not None:
             return encoded
@@ -136,6 +281,9 @@ class DataclassJSONEncoder(JSONEncoder):
 
 
 def encode_object(o):
+    encoder = ENCODERS.get(type(o))
+    if encoder is not None:
+        return encoder(o)
     if isinstance(o, clingo_Model):
         x = model_to_dict(o)
         return x
@@ -146,17 +294,17 @@ def encode_object(o):
     elif isinstance(o, PosixPath):
         return str(o)
     elif isinstance(o, ModelType):
-        return {"__enum__": str(o)}
+        return encode_model_type(o)
     elif isinstance(o, Symbol):
         x = symbol_to_dict(o)
         return x
     elif isinstance(o, FailedReason):
-        return {"_type": "FailedReason", "value": o.value}
+        return encode_failed_reason(o)
     elif is_dataclass(o):
         result = dataclass_to_dict(o)
         return result
     elif isinstance(o, nx.Graph):
-        return {"_type": "Graph", "_graph": nx.node_link_data(o)}
+        return encode_graph(o)
     elif isinstance(o, UUID):
         return o.hex
     elif isinstance(o, frozenset):
@@ -169,6 +317,185 @@ def encode_object(o):
         return list(o)
 
 
+def _orjson_default(o):
+    encoded = encode_object(o)
+    if encoded is None:
+        raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+    return encoded
+
+
+def _orjson_default_compact_symbols(o):
+    if type(o) is Symbol:
+        return encode_symbol_text(o)
+    return _orjson_default(o)
+
+
+def dumps(obj: Any, sort_keys: bool = False, indent: Optional[int] = None, backend: str = JSON_BACKEND,
+          compact_symbols: bool = False) -> str:
+    """
+    Serializes viASP objects to JSON, with orjson if it is installed.
+
+    :param obj: The object to serialize.
+    :param sort_keys: Whether to sort the keys of dictionaries.
+    :param indent: The indentation, orjson only supports 2.
+    :param backend: ``"orjson"``, ``"json"`` or ``"auto"`` to use orjson if it is installed and supports the indent.
+    :param compact_symbols: Whether to encode symbols by their string, which only viASP's decoder understands.
+    """
+    if backend == "orjson" or (backend == "auto" and orjson is not None and indent in (None, 2)):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent is not None:
+            option |= orjson.OPT_INDENT_2
+        default = _orjson_default_compact_symbols if compact_symbols else _orjson_default
+        return orjson.dumps(obj, default=default, option=option).decode("utf-8")
+    separators = None if indent is not None else (",", ":")
+    return json.dumps(obj, cls=DataclassJSONEncoder, ensure_ascii=False, sort_keys=sort_keys,
+                      indent=indent, separators=separators, compact_symbols=compact_symbols)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    return json.loads(data, cls=DataclassJSONDecoder)
+
+
+def _binary_default(o, compact_symbols: bool = False):
+    if compact_symbols and type(o) is Symbol:
+        return encode_symbol_text(o)
+    return _orjson_default(o)
+
+
+def _cbor_object_hook(first, second):
+    # cbor2 5 passes the decoder and the dict, cbor2 6 the dict and whether it has to be immutable
+    return object_hook(first if isinstance(first, dict) else second)
+
+
+# cbor2 has tags for these types, they are encoded like in JSON instead
+_CBOR_ENCODERS = {
+    frozenset: lambda encoder, o: encoder.encode(list(o)),
+    set: lambda encoder, o: encoder.encode(list(o)),
+    UUID: lambda encoder, o: encoder.encode(encode_uuid(o)),
+}
+
+
+def binary_mimetypes() -> List[str]:
+    """
+    Returns the mimetypes of the binary formats whose libraries are installed, the preferred first.
+    """
+    mimetypes = []
+    if msgpack is not None:
+        mimetypes.append(MSGPACK_MIMETYPE)
+    if cbor2 is not None:
+        mimetypes.append(CBOR_MIMETYPE)
+    return mimetypes
+
+
+def dumps_binary(obj: Any, mimetype: str, compact_symbols: bool = False) -> bytes:
+    """
+    Serializes viASP objects to MessagePack or CBOR, with the same type-tagged objects as in JSON.
+
+    :param obj: The object to serialize.
+    :param mimetype: ``MSGPACK_MIMETYPE`` or ``CBOR_MIMETYPE``.
+    :param compact_symbols: Whether to encode symbols by their string, which only viASP's decoder understands.
+    :raises ValueError: if the format is not supported.
+    """
+    if mimetype == MSGPACK_MIMETYPE and msgpack is not None:
+        return msgpack.packb(obj, default=lambda o: _binary_default(o, compact_symbols))
+    if mimetype == CBOR_MIMETYPE and cbor2 is not None:
+        return cbor2.dumps(obj, encoders=_CBOR_ENCODERS,
+                           default=lambda encoder, o: encoder.encode(_binary_default(o, compact_symbols)))
+    raise ValueError(f"Unsupported content type {mimetype}.")
+
+
+def loads_binary(data: bytes, mimetype: str) -> Any:
+    """
+    Deserializes viASP objects from MessagePack or CBOR.
+
+    :raises ValueError: if the format is not supported or the data is not valid.
+    """
+    if mimetype == MSGPACK_MIMETYPE and msgpack is not None:
+        try:
+            result = msgpack.unpackb(data, object_hook=object_hook, strict_map_key=False)
+        except (msgpack.UnpackException, msgpack.ExtraData) as e:
+            raise ValueError(f"Invalid MessagePack data ({e}).") from e
+    elif mimetype == CBOR_MIMETYPE and cbor2 is not None:
+        try:
+            result = cbor2.loads(data, object_hook=_cbor_object_hook)
+        except cbor2.CBORDecodeError as e:
+            raise ValueError(f"Invalid CBOR data ({e}).") from e
+    else:
+        raise ValueError(f"Unsupported content type {mimetype}.")
+    return resolve_symbol_texts(result)
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def iter_loads(chunks: Iterable[Union[str, bytes]]) -> Iterator[Any]:
+    """
+    Decodes a JSON array whose text arrives in chunks, e.g. from the stream of a request,
+    and yields every element as soon as it is complete.
+
+    :param chunks: The text of the array, as str or UTF-8 encoded bytes.
+    :raises ValueError: if the text is not a JSON array.
+    """
+    decoder = DataclassJSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer, position, complete = "", 0, False
+
+    def read():
+        nonlocal buffer, position, complete
+        chunk = next(chunks, None)
+        if chunk is None:
+            chunk, complete = utf8.decode(b"", final=True), True
+        elif isinstance(chunk, bytes):
+            chunk = utf8.decode(chunk)
+        buffer, position = buffer[position:] + chunk, 0
+
+    def peek() -> str:
+        nonlocal position
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position < len(buffer) or complete:
+                return buffer[position:position + 1]
+            read()
+
+    def decode_element():
+        nonlocal position
+        # an incomplete element is parsed again once the buffered text has doubled, so it is parsed O(1) times
+        retry_length = 0
+        while True:
+            if len(buffer) - position >= retry_length or complete:
+                try:
+                    element, end = decoder.raw_decode(buffer, position)
+                    # a number at the end of the buffer could continue in the next chunk
+                    if end < len(buffer) or complete or not buffer[end - 1].isdigit():
+                        position = end
+                        return resolve_symbol_texts(element)
+                except JSONDecodeError:
+                    if complete:
+                        raise
+                retry_length = 2 * (len(buffer) - position)
+            read()
+
+    if peek() != "[":
+        raise ValueError("Expected a JSON array.")
+    position += 1
+    if peek() == "]":
+        position += 1
+    else:
+        while True:
+            peek()
+            yield decode_element()
+            separator = peek()
+            position += 1
+            if separator == "]":
+                break
+            if separator != ",":
+                raise ValueError(f"Expected ',' or ']' instead of {separator!r}.")
+    if peek() != "":
+        raise ValueError("Extra data after the JSON array.")
+
 
 def model_to_dict(model: clingo_Model) -> dict:
     model_dict = {"cost": model.cost, "optimality_proven": model.optimality_proven, "type": model.type,
@@ -178,13 +505,25 @@ def model_to_dict(model: clingo_Model) -> dict:
     return model_dict
 
 
-def clingo_model_to_stable_model(model: clingo_Model) -> StableModel:
-    return StableModel(model.cost, model.optimality_proven, model.type, encode_object(model.symbols(atoms=True)),
-                       encode_object(model.symbols(terms=True)), encode_object(model.symbols(shown=True)),
-                       encode_object(model.symbols(theory=True)))
+def clingo_model_to_stable_model(model: clingo_Model, capture: Collection[str] = MODEL_CAPTURE) -> StableModel:
+    """
+    Copies the parts of a clingo model that are listed in capture as tuples and fingerprints the model.
+    The other parts are left empty, as they cannot be retrieved once the solver moves on.
+
+    :param model: The clingo model.
+    :param capture: ``"atoms"``, ``"terms"``, ``"shown"`` and/or ``"theory"``.
+    """
+    stable_model = StableModel(model.cost, model.optimality_proven, model.type)
+    for part in capture:
+        setattr(stable_model, part, tuple(model.symbols(**{part: True})))
+    stable_model.fingerprint()
+    return stable_model
+
 
 def clingo_symbols_to_stable_model(atoms: Iterable[Symbol]) -> StableModel:
-    return StableModel(atoms=encode_object(atoms))
+    stable_model = StableModel(atoms=tuple(atoms))
+    stable_model.fingerprint()
+    return stable_model
 
 def symbol_to_dict(symbol: clingo.Symbol) -> dict:
     symbol_dict = {}
@@ -199,6 +538,45 @@ def symbol_to_dict(symbol: clingo.Symbol) -> dict:
     return symbol_dict
 
 
+def encode_symbol_text(symbol: Symbol) -> dict:
+    return {"_type": "Symbol", "repr": str(symbol)}
+
+
+@lru_cache(maxsize=SYMBOL_ENCODING_CACHE_SIZE)
+def encode_symbol(symbol: Symbol) -> dict:
+    """
+    Like symbol_to_dict, but with the arguments encoded as well.
+    The result is cached, as the same atoms occur in many nodes, and must not be modified.
+    """
+    symbol_dict = symbol_to_dict(symbol)
+    if "arguments" in symbol_dict:
+        symbol_dict["arguments"] = [encode_symbol(argument) for argument in symbol_dict["arguments"]]
+    return symbol_dict
+
+
+# Encoders by exact type, tried before the isinstance checks of encode_object.
+# They encode enums and UUIDs themselves, so that orjson, which would encode those natively, gives the same output.
+ENCODERS: Dict[type, Callable[[Any], Any]] = {
+    Node: encode_node,
+    SymbolIdentifier: encode_symbol_identifier,
+    Transformation: encode_transformation,
+    Signature: encode_signature,
+    TransformationError: encode_transformation_error,
+    StableModel: encode_stable_model,
+    ClingoMethodCall: encode_clingo_method_call,
+    TransformerTransport: encode_transformer_transport,
+    Symbol: encode_symbol,
+    UUID: encode_uuid,
+    frozenset: list,
+    set: list,
+    FailedReason: encode_failed_reason,
+    ModelType: encode_model_type,
+    PosixPath: str,
+    nx.Graph: encode_graph,
+    nx.DiGraph: encode_graph,
+}
+
+
 class viasp_ModelType(IntEnum):
     """
     Enumeration of the different types of models.
@@ -247,23 +625,12 @@ def deserialize(data: str, *args, **kwargs):
 
 def get_rules_from_input_program(rules) -> Sequence[str]:
     rules_from_input_program: Sequence[str] = []
-    db = ProgramDatabase()
-    program = db.get_program().split("\n")
+    source = None
     for rule in rules:
         if isinstance(rule, str):
             rules_from_input_program.append(rule)
             continue
-        begin_line = rule.location.begin.line
-        begin_colu = rule.location.begin.column
-        end_line = rule.location.end.line
-        end_colu = rule.location.end.column
-        r = ""
-        if begin_line != end_line:
-            r += program[begin_line - 1][begin_colu-1:] + "\n"
-            for i in range(begin_line, end_line - 1):
-                r += program[i] + "\n"
-            r += program[end_line - 1][:end_colu]
-        else:
-            r += program[begin_line - 1][begin_colu - 1:end_colu]
-        rules_from_input_program.append(r)
+        if source is None:
+            source = get_source_index(ProgramDatabase().get_program())
+        rules_from_input_program.append(source.get_source(rule.location))
     return rules_from_input_program
\ No newline at end of file
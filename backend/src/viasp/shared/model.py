@@ -2,7 +2,7 @@ from copy import copy
 from dataclasses import dataclass, field
 from enum import Enum
 from inspect import Signature as inspect_Signature
-from typing import Any, Sequence, Dict, Union, FrozenSet, Collection, List
+from typing import Any, Sequence, Dict, Union, FrozenSet, Collection, List, Tuple, Optional
 from types import MappingProxyType
 from collections import defaultdict
 from uuid import UUID, uuid4
@@ -38,10 +38,29 @@ class Node:
     reason: MappingProxyType = field(default_factory=DefaultMappingProxyType, hash=True) # type: MappingProxyType[str, List[SymbolIdentifier]]
     recursive: Union[bool, nx.DiGraph] = field(default=False, hash=False)
     uuid: UUID = field(default_factory=uuid4, hash=False)
+    _sorted: Dict[str, Tuple[FrozenSet[SymbolIdentifier], List[SymbolIdentifier]]] = \
+        field(default_factory=dict, init=False, repr=False, compare=False, hash=False)
 
     def __hash__(self):
         return hash((self.atoms, self.rule_nr, self.diff))
 
+    def sorted_atoms(self) -> List[SymbolIdentifier]:
+        return self._get_sorted("atoms")
+
+    def sorted_diff(self) -> List[SymbolIdentifier]:
+        return self._get_sorted("diff")
+
+    def _get_sorted(self, name: str) -> List[SymbolIdentifier]:
+        """
+        Returns the attribute sorted by the symbols. The order is cached until the attribute is replaced.
+        """
+        value = getattr(self, name)
+        cached = self._sorted.get(name)
+        if cached is None or cached[0] is not value:
+            cached = (value, sorted(value, key=lambda x: x.symbol))
+            self._sorted[name] = cached
+        return cached[1]
+
     def __eq__(self, o):
         return isinstance(o, type(self)) and (self.atoms, self.rule_nr, self.diff, self.reason) == (o.atoms, o.rule_nr, o.diff, o.reason)
 
@@ -59,6 +78,8 @@ class Node:
 class Transformation:
     id: int
     rules: Sequence[str]
+    # source texts of the rules, in the order of rules
+    sources: Sequence[str] = field(default=(), compare=False)
 
     def __hash__(self):
         return hash(tuple(self.rules))
@@ -97,9 +118,25 @@ class StableModel:
     terms: Collection[Symbol] = field(default_factory=list)
     shown: Collection[Symbol] = field(default_factory=list)
     theory: Collection[Symbol] = field(default_factory=list)
+    _fingerprint: Optional[int] = field(default=None, init=False, repr=False, compare=False)
 
     def __eq__(self, o):
-        return isinstance(o, type(self)) and set(self.atoms) == set(o.atoms)
+        if not isinstance(o, type(self)):
+            return False
+        # models are equal if their atoms are, different fingerprints reject most unequal models in O(1)
+        return self is o or self.fingerprint() == o.fingerprint() and frozenset(self.atoms) == frozenset(o.atoms)
+
+    def __hash__(self):
+        return self.fingerprint()
+
+    def fingerprint(self) -> int:
+        """
+        Returns the hash of the set of atoms, which is computed once, so that unequal models are mostly told apart
+        in O(1). The atoms must not be modified afterwards.
+        """
+        if self._fingerprint is None:
+            self._fingerprint = hash(frozenset(self.atoms))
+        return self._fingerprint
 
     def symbols(self, atoms: bool = False, terms: bool = False, shown: bool = False, theory: bool = False) -> Sequence[Symbol]:
         symbols = []
@@ -1,49 +1,248 @@
 import json
 import sys
 import fileinput
-from inspect import signature
-from typing import List, Union
+from concurrent.futures import Future
+from inspect import Signature, signature
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+from weakref import WeakKeyDictionary
 
 from clingo import Control as InnerControl, Model
 from dataclasses import asdict, is_dataclass
 
+from .asyncClingoApiClient import BackgroundClingoClient
 from .clingoApiClient import ClingoClient
-from .shared.defaults import STDIN_TMP_STORAGE_PATH
+from .server.database import ProgramFileStore
+from .shared.defaults import MODEL_CAPTURE
 from .shared.io import clingo_model_to_stable_model
 from .shared.model import StableModel
 
 
-def is_non_cython_function_call(attr: classmethod):
-    return hasattr(attr, "__call__") and not attr.__name__.startswith("_") and not attr.__name__.startswith("<")
+# options of the connector and its client, which are not passed on to clingo's Control
+CONNECTOR_KWARGS = ("_viasp_client", "viasp_backend_url", "compact_symbols", "content_type", "compression",
+                    "compression_threshold", "compression_level", "model_capture", "pool_size", "retries",
+                    "backoff_factor", "health_recheck_interval", "call_buffer_size", "call_buffer_delay",
+                    "recorded_methods", "background_uploads")
+
+
+# the methods of clingo's Control, all of which are recorded unless the recorded_methods option is passed
+CONTROL_METHODS = frozenset(name for name in dir(InnerControl)
+                            if not name.startswith("_") and callable(getattr(InnerControl, name)))
+
+_signatures: Dict[Callable, Signature] = {}
+
+
+def cached_signature(method: Callable) -> Signature:
+    """
+    Returns the signature of a method, which is computed once per function and not per bound method.
+    """
+    function = getattr(method, "__func__", method)
+    sig = _signatures.get(function)
+    if sig is None:
+        sig = _signatures[function] = signature(method)
+    return sig
+
+
+def recording(connector: "ShowConnector", name: str, method: Callable) -> Callable:
+    """
+    Returns a function that registers the call with the connector before it calls the method.
+    """
+    register = connector.register_function_call
+    sig = cached_signature(method)
+
+    def recorded(*args, **kwargs):
+        register(name, sig, args, kwargs)
+        return method(*args, **kwargs)
+
+    recorded.__name__ = name
+    recorded.__doc__ = method.__doc__
+    return recorded
+
+
+class MarkedModelRegistry:
+    """
+    The marked models in the order they were marked, indexed by their fingerprint, so that marking, unmarking
+    and finding duplicates take O(1). It records the changes since they were last taken to send only those.
+    """
+
+    def __init__(self):
+        self._models: Dict[StableModel, None] = {}
+        self._added: Dict[StableModel, None] = {}
+        self._removed: Dict[StableModel, None] = {}
+        self._reset = True
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def __iter__(self) -> Iterator[StableModel]:
+        return iter(self._models)
+
+    def __contains__(self, model: StableModel) -> bool:
+        return model in self._models
+
+    def mark(self, model: StableModel) -> bool:
+        """
+        Marks a model, unless it is marked already.
+
+        :return: Whether the model was not marked before.
+        """
+        if model in self._models:
+            return False
+        self._models[model] = None
+        if model in self._removed:
+            del self._removed[model]
+        else:
+            self._added[model] = None
+        return True
+
+    def mark_many(self, models: Iterable[StableModel]) -> int:
+        """
+        :return: The number of models that were not marked before.
+        """
+        return sum(self.mark(model) for model in models)
+
+    def unmark(self, model: StableModel):
+        """
+        :raises ValueError: if the model is not marked.
+        """
+        if model not in self._models:
+            raise ValueError(f"{model} is not marked.")
+        del self._models[model]
+        if model in self._added:
+            del self._added[model]
+        else:
+            self._removed[model] = None
+
+    def unmark_where(self, predicate: Callable[[StableModel], bool]) -> int:
+        """
+        Unmarks all models for which the predicate holds.
+
+        :return: The number of unmarked models.
+        """
+        matching = [model for model in self._models if predicate(model)]
+        for model in matching:
+            self.unmark(model)
+        return len(matching)
+
+    def clear(self):
+        self._models.clear()
+        self._added.clear()
+        self._removed.clear()
+        self._reset = True
+
+    def resend_all(self):
+        """
+        Makes the next changes send all models, after sending the last changes failed.
+        """
+        self._reset = True
+        self._added.clear()
+        self._removed.clear()
+
+    def take_changes(self) -> Tuple[bool, List[StableModel], List[StableModel]]:
+        """
+        Returns whether all models have to be sent, as the registry is new or was cleared,
+        and the models that were marked and unmarked since the last call.
+        """
+        changes = (self._reset, list(self._added), list(self._removed))
+        self._reset = False
+        self._added.clear()
+        self._removed.clear()
+        return changes
 
 
 class ShowConnector:
+    r"""
+    Sends the calls and marked models to the viasp backend.
+
+    :param \**kwargs:
+        * *viasp_backend_url* (``str``) --
+          url of the viasp backend
+        * *_viasp_client* (``ClingoClient``) --
+          a viasp client object, which is used instead of the following options
+        * *compact_symbols* (``bool``) --
+          send symbols as strings, if the backend supports it
+        * *content_type* (``str``) --
+          mimetype of the requests, by default MessagePack or CBOR if installed and supported by the backend
+        * *compression* (``bool``) --
+          compress requests of at least *compression_threshold* bytes at *compression_level*, if the backend supports it
+        * *model_capture* (``Collection[str]``) --
+          parts of marked models to copy, by default only ``"atoms"``, the others are left empty
+        * *pool_size*, *retries*, *backoff_factor* (``int``, ``int``, ``float``) --
+          connections kept open to the backend, and retries of failed requests with their backoff
+        * *health_recheck_interval* (``float``) --
+          seconds after which an unavailable backend is checked again
+        * *call_buffer_size*, *call_buffer_delay* (``int``, ``float``) --
+          calls that are sent together, at the latest with the first call after the delay in seconds
+        * *background_uploads* (``bool``) --
+          upload calls and models on a background event loop, without waiting for the backend
+    """
 
     def __init__(self, **kwargs):
-        self._marked: List[StableModel] = []
+        self._marked = MarkedModelRegistry()
         if "_viasp_client" in kwargs:
             self._database = kwargs["_viasp_client"]
+        elif kwargs.get("background_uploads", False):
+            # calls and models are uploaded on a background event loop, without blocking the solving thread
+            self._database = BackgroundClingoClient(**kwargs)
         else:
             self._database = ClingoClient(**kwargs)
         self._connection = None
+        self._capture = kwargs.get("model_capture", MODEL_CAPTURE)
+        self._captured: WeakKeyDictionary = WeakKeyDictionary()
 
     def show(self):
-        self._database.set_target_stable_model(self._marked)
+        self._database.flush()
+        self._send_marked()
         self._database.show()
 
+    def _send_marked(self):
+        reset, added, removed = self._marked.take_changes()
+        try:
+            if reset:
+                sent = self._database.set_target_stable_model(list(self._marked))
+            elif added or removed:
+                sent = self._database.update_target_stable_models(list(self._marked), added, removed)
+            else:
+                return
+        except BaseException:
+            self._marked.resend_all()
+            raise
+        # a failed upload would leave the marked models of the backend behind, so all of them are sent next time
+        if isinstance(sent, Future):
+            sent.add_done_callback(self._resend_if_failed)
+        elif sent is False:
+            self._marked.resend_all()
+
+    def _resend_if_failed(self, sent: Future):
+        if sent.cancelled() or sent.exception() is not None or sent.result() is False:
+            self._marked.resend_all()
+
+    def _to_stable_model(self, model: Union[Model, StableModel]) -> StableModel:
+        if not isinstance(model, Model):
+            return model
+        # a clingo model can only be read during the solve step, so a marked model is captured once
+        captured = self._captured.get(model)
+        if captured is None:
+            captured = clingo_model_to_stable_model(model, self._capture)
+            self._captured[model] = captured
+        return captured
+
     def unmark(self, model: Union[Model, StableModel]):
-        if isinstance(model, Model):
-            serialized = clingo_model_to_stable_model(model)
-        else:
-            serialized = model
-        self._marked.remove(serialized)
+        self._marked.unmark(self._to_stable_model(model))
 
     def mark(self, model: Union[Model, StableModel]):
-        if isinstance(model, Model):
-            serialized = clingo_model_to_stable_model(model)
-        else:
-            serialized = model
-        self._marked.append(serialized)
+        self._marked.mark(self._to_stable_model(model))
+
+    def mark_many(self, models: Iterable[Union[Model, StableModel]]) -> int:
+        """
+        Marks all models that are not marked yet and returns their number.
+        """
+        return self._marked.mark_many(self._to_stable_model(model) for model in models)
+
+    def unmark_where(self, predicate: Callable[[StableModel], bool]) -> int:
+        """
+        Unmarks all models for which the predicate holds and returns their number.
+        """
+        return self._marked.unmark_where(predicate)
 
     def clear(self):
         self._marked.clear()
@@ -62,7 +261,8 @@ class ShowConnector:
         :param collect_variables: ``bool``
             default=True (collect variables from body as a tuple in the head literal)
         """
-        self._database.set_target_stable_model(self._marked)
+        self._database.flush()
+        self._send_marked()
         self._database._reconstruct()
         kwargs = {"head_name": head_name, "collect_variables": collect_variables}
         return self._database.relax_constraints(**kwargs)
@@ -79,7 +279,8 @@ class ShowConnector:
         :param collect_variables: ``bool``
             default=True (collect variables from body as a tuple in the head literal)
         """
-        self._database.set_target_stable_model(self._marked)
+        self._database.flush()
+        self._send_marked()
         self._database._reconstruct()
         kwargs = {"head_name": head_name, "collect_variables": collect_variables}
         
@@ -94,6 +295,7 @@ class ShowConnector:
 
 
     def clingraph(self, viz_encoding, engine="dot", graphviz_type="graph"):
+        self._database.flush()
         self._database.clingraph(viz_encoding, engine, graphviz_type)
 
     def register_transformer(self, transformer, imports="", path=""):
@@ -101,8 +303,14 @@ class ShowConnector:
 
 
 class Control:
-    
-    
+    """
+    A clingo Control whose method calls are recorded by viASP. The methods are bound once, when the Control is
+    created: the recorded ones to functions that register the call first, the others directly to clingo's Control.
+    Only the methods in the ``recorded_methods`` option are recorded, by default all of them.
+    ``load`` and ``add`` are always recorded, as the backend needs the program.
+    The options of the connection to the backend are those of ``ShowConnector``.
+    """
+
     def __init__(self, *args, **kwargs):
         if 'files' in kwargs:
             # files is only passed to call InnerControl with only the options
@@ -117,44 +325,37 @@ class Control:
         else:
             self.passed_control = InnerControl(*args)
         self.viasp = ShowConnector(**kwargs)
+        recorded_methods = frozenset(kwargs.get("recorded_methods", CONTROL_METHODS))
+
+        for name in CONNECTOR_KWARGS:
+            kwargs.pop(name, None)
+
+        for name in CONTROL_METHODS - {"load", "add"}:
+            method = getattr(self.passed_control, name, None)
+            if method is None:
+                continue
+            setattr(self, name, recording(self.viasp, name, method) if name in recorded_methods else method)
+        self._add_signature = cached_signature(self.passed_control._add2)
 
-        if "_viasp_client" in kwargs:
-            del kwargs["_viasp_client"]
-        if "viasp_backend_url" in kwargs:
-            del kwargs["viasp_backend_url"]
-        
         self.viasp.register_function_call("__init__", signature(self.passed_control.__init__), args, kwargs)
 
     def load(self, path: str) -> None:
         if path == "-":
-            path = str(STDIN_TMP_STORAGE_PATH)
-            tmp = sys.stdin.readlines()
-            with open(path, "w", encoding="utf-8") as f:
-                f.writelines(tmp)
-        else:
-            with open(path, "r", encoding="utf-8") as f, open(STDIN_TMP_STORAGE_PATH, "a", encoding="utf-8") as out:
-                out.writelines(f.readlines())
-        self.viasp.register_function_call("load", signature(self.passed_control.load), [], kwargs={"path": path})
+            path = ProgramFileStore().put(sys.stdin.read())
+        self.viasp.register_function_call("load", cached_signature(self.passed_control.load), [],
+                                          kwargs={"path": path})
         self.passed_control.load(path=str(path))
 
     def add(self, *args, **kwargs):
-        self.viasp.register_function_call("add", signature(self.passed_control._add2), [], kwargs=dict(zip(['name', 'parameters', 'program'], args)))
+        self.viasp.register_function_call("add", self._add_signature, [], kwargs=dict(zip(['name', 'parameters', 'program'], args)))
         self.passed_control.add(*args, **kwargs)
 
-    def __getattribute__(self, name):
-        try:
-            attr = object.__getattribute__(self, name)
-        except AttributeError:
-            attr = self.passed_control.__getattribute__(name) 
-        if is_non_cython_function_call(attr) and name != "load" and name != "add":
-            def wrapper_func(*args, **kwargs):
-                self.viasp.register_function_call(attr.__name__, signature(attr), args, kwargs)
-                result = attr(*args, **kwargs)
-                return result
-
-            return wrapper_func
-        else:
-            return attr
+    def __getattr__(self, name):
+        # only called for the attributes that were not bound when the Control was created, like its properties
+        if name == "passed_control":
+            raise AttributeError(name)
+        return getattr(self.passed_control, name)
+
 
 class EnhancedJSONEncoder(json.JSONEncoder):
     def default(self, o):
@@ -1,7 +1,11 @@
 import json
 import time
+from unittest import mock
+
+from clingo import Control
 
 from viasp.shared.io import DataclassJSONEncoder, DataclassJSONDecoder
+from viasp.server.database import ProgramDatabase
 from viasp.shared.model import ClingoMethodCall
 
 
@@ -30,6 +34,14 @@ def test_reconstruct_endpoint(client, clingo_call_run_sample):
     assert res.status_code == 405
 
 
+def test_reconstruct_replays_only_the_program(client, clingo_call_run_sample):
+    with mock.patch.object(Control, "ground") as ground:
+        client.post("/control/add_call", json=clingo_call_run_sample)
+        client.get("/control/reconstruct")
+        ground.assert_not_called()
+    assert ProgramDatabase().get_program() == "a. {b}. c :- not b."
+
+
 def test_model_endpoint(client, clingo_stable_models):
     res = client.post("/control/models", json=clingo_stable_models)
     assert res.status_code == 200
@@ -41,6 +53,15 @@ def test_model_endpoint(client, clingo_stable_models):
     assert len(res.json) == 0
 
 
+def test_invalid_upload_keeps_the_models(client, clingo_stable_models):
+    client.post("/control/models", json=clingo_stable_models)
+    res = client.post("/control/models", data=json.dumps(clingo_stable_models, cls=DataclassJSONEncoder)[:-10],
+                      headers={"Content-Type": "application/json"})
+    assert res.status_code == 400
+    assert len(client.get("/control/models").json) == len(clingo_stable_models), \
+        "A failed upload should not replace the models."
+
+
 def test_show_endpoint(client, clingo_stable_models):
     client.delete("/graph")
     res = client.get("/graph")
@@ -50,3 +71,20 @@ def test_show_endpoint(client, clingo_stable_models):
     assert res.status_code == 200
     res = client.get("/graph")
     assert len(list(res.json.nodes)) > 0
+
+
+def test_show_runs_as_job(client, clingo_call_run_sample, clingo_stable_models):
+    client.post("/control/add_call", json=clingo_call_run_sample)
+    client.post("/control/models", json=clingo_stable_models)
+    res = client.post("/control/show?async=true")
+    assert res.status_code == 202
+    job = res.json
+    assert res.headers["Location"].endswith(f"/control/jobs/{job['id']}")
+    for _ in range(100):
+        job = client.get(f"/control/jobs/{job['id']}").json
+        if job["status"] not in ("pending", "running"):
+            break
+        time.sleep(0.05)
+    assert job["status"] == "done"
+    assert job["stage"] == "saving graph"
+    assert client.get("/control/jobs/unknown").status_code == 404
@@ -1,3 +1,15 @@
+from unittest import mock
+
+import pytest
+from flask import request
+
+from viasp.server.factory import create_app
+from viasp.shared.compression import compress, content_encodings, decompress
+from viasp.shared.defaults import SYMBOL_ENCODINGS_HEADER, CONTENT_TYPES_HEADER, JSON_MIMETYPE, \
+    CONTENT_ENCODINGS_HEADER
+from viasp.shared.io import binary_mimetypes, dumps, dumps_binary, loads, loads_binary
+
+
 def test_healthcheck_endpoint(client):
     res = client.get("/healthcheck")
     assert res.status_code == 200
@@ -7,3 +19,62 @@ def test_healthcheck_endpoint(client):
     assert res.status_code == 405
     res = client.put("/healthcheck")
     assert res.status_code == 405
+
+
+def test_healthcheck_announces_symbol_encodings(client):
+    res = client.get("/healthcheck")
+    assert "text" in res.headers[SYMBOL_ENCODINGS_HEADER]
+
+
+@pytest.mark.skipif(not binary_mimetypes(), reason="neither msgpack nor cbor2 is installed")
+def test_binary_content_negotiation(clingo_stable_models):
+    client = create_app().test_client()
+    assert JSON_MIMETYPE in client.get("/healthcheck").headers[CONTENT_TYPES_HEADER]
+    for mimetype in binary_mimetypes():
+        res = client.post("/control/models", data=dumps_binary(clingo_stable_models, mimetype),
+                          headers={"Content-Type": mimetype})
+        assert res.status_code == 200
+        res = client.get("/control/models", headers={"Accept": mimetype})
+        assert res.mimetype == mimetype
+        assert loads_binary(res.data, mimetype) == clingo_stable_models
+        res = client.get("/control/models")
+        assert res.mimetype == JSON_MIMETYPE
+        assert len(res.json) == len(clingo_stable_models)
+        res = client.post("/control/models", data=b"\xc1", headers={"Content-Type": mimetype})
+        assert res.status_code == 400
+        for data in (b"\xc1", dumps_binary({"_type": "StableModel", "unknown": 1}, mimetype)):
+            res = client.post("/control/add_call", data=data, headers={"Content-Type": mimetype})
+            assert res.status_code == 400, "Bodies that cannot be decoded should be bad requests."
+
+
+@pytest.mark.skipif(not binary_mimetypes(), reason="neither msgpack nor cbor2 is installed")
+def test_binary_bodies_are_decoded_once(clingo_stable_models):
+    app = create_app()
+    mimetype = binary_mimetypes()[0]
+    with mock.patch("viasp.server.factory.loads_binary", side_effect=loads_binary) as decode, \
+            app.test_request_context("/control/models", method="POST", data=dumps_binary(clingo_stable_models, mimetype),
+                                     content_type=mimetype):
+        assert request.json is request.json
+    assert decode.call_count == 1, "The body should be decoded once per request."
+
+
+def test_responses_and_requests_are_compressed(clingo_stable_models):
+    app = create_app()
+    app.config["COMPRESSION_THRESHOLD"] = 0
+    client = app.test_client()
+    assert "gzip" in client.get("/healthcheck").headers[CONTENT_ENCODINGS_HEADER]
+    for encoding in content_encodings():
+        res = client.post("/control/models", data=compress(dumps(clingo_stable_models).encode("utf-8"), encoding),
+                          headers={"Content-Type": JSON_MIMETYPE, "Content-Encoding": encoding})
+        assert res.status_code == 200
+        res = client.get("/control/models", headers={"Accept-Encoding": encoding})
+        assert res.headers["Content-Encoding"] == encoding
+        assert len(loads(decompress(res.data, encoding))) == len(clingo_stable_models)
+        res = client.post("/control/models", data=b"not compressed",
+                          headers={"Content-Type": JSON_MIMETYPE, "Content-Encoding": encoding})
+        assert res.status_code == 400
+    res = client.get("/control/models")
+    assert "Content-Encoding" not in res.headers
+    app.config["COMPRESSION_THRESHOLD"] = 1 << 30
+    res = client.get("/control/models", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in res.headers
@@ -1,3 +1,4 @@
+import threading
 from inspect import signature
 from typing import Dict, List
 from uuid import uuid4
@@ -9,6 +10,7 @@ from clingo.symbol import Function, Number
 from flask import Flask
 from flask.testing import FlaskClient
 from networkx import node_link_data
+from werkzeug.serving import make_server
 
 from helper import get_stable_models_for_program
 from viasp.asp.justify import build_graph
@@ -19,7 +21,8 @@ from viasp.server.blueprints.dag_api import bp as dag_bp
 from viasp.shared.io import DataclassJSONEncoder, DataclassJSONDecoder, clingo_model_to_stable_model
 from viasp.shared.model import ClingoMethodCall, Node, StableModel, SymbolIdentifier
 from viasp.server.database import ProgramDatabase
-from viasp.shared.defaults import CLINGRAPH_PATH, GRAPH_PATH, PROGRAM_STORAGE_PATH, STDIN_TMP_STORAGE_PATH
+from viasp.server.factory import create_app
+from viasp.shared.defaults import ANALYZER_CACHE_PATH, CLINGRAPH_PATH, SESSION_STORE_PATH, PROGRAM_FILES_PATH, SESSIONS_PATH
 
 def create_app_with_registered_blueprints(*bps) -> Flask:
     app = Flask(__name__)
@@ -141,8 +144,34 @@ def cleanup(request):
         import shutil
         if os.path.exists(CLINGRAPH_PATH):
             shutil.rmtree(CLINGRAPH_PATH)
-        for file in [GRAPH_PATH, PROGRAM_STORAGE_PATH, STDIN_TMP_STORAGE_PATH]:
+        if os.path.exists(ANALYZER_CACHE_PATH):
+            shutil.rmtree(ANALYZER_CACHE_PATH)
+        for directory in [PROGRAM_FILES_PATH, SESSIONS_PATH]:
+            if os.path.exists(directory):
+                shutil.rmtree(directory)
+        for file in [SESSION_STORE_PATH, f"{SESSION_STORE_PATH}-wal", f"{SESSION_STORE_PATH}-shm"]:
             if os.path.exists(file):
                 os.remove(file)
 
     request.addfinalizer(remove_test_dir)
+
+
+@pytest.fixture
+def live_backend():
+    """
+    Serves a backend on a free port and yields its url, its app and the paths of the requests it received.
+    """
+    app = create_app()
+    paths = []
+
+    def record(environ, start_response, wsgi_app=app.wsgi_app):
+        paths.append(environ["PATH_INFO"])
+        return wsgi_app(environ, start_response)
+
+    app.wsgi_app = record
+    server = make_server("localhost", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://localhost:{server.port}", app, paths
+    server.shutdown()
+    server.server_close()
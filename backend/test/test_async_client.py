@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from inspect import signature
+
+from clingo import Control
+
+from viasp.asyncClingoApiClient import AsyncClingoClient, BackgroundClingoClient
+
+
+def test_async_client_uploads_concurrently_and_in_order(live_backend, clingo_call_run_sample,
+                                                       clingo_stable_models):
+    url, app, paths = live_backend
+
+    async def run():
+        client = AsyncClingoClient(viasp_backend_url=f"{url}/session/async", retries=0)
+        assert paths == [], "The health of the backend should be checked by the first request."
+        ctl = Control()
+        await asyncio.gather(client.set_target_stable_model(clingo_stable_models),
+                             *(client.register_function_call(call.name, signature(getattr(ctl, call.name)), [],
+                                                             call.kwargs)
+                               for call in clingo_call_run_sample))
+        job = await client.show(poll_interval=0.01, timeout=30)
+        client.close()
+        return job
+
+    assert asyncio.run(run())["status"] == "done"
+    calls = app.test_client().get("/session/async/control/calls").json
+    assert [call.name for call in calls] == [call.name for call in clingo_call_run_sample]
+    assert len(app.test_client().get("/session/async/control/models").json) == len(clingo_stable_models)
+
+    client = BackgroundClingoClient(viasp_backend_url=f"{url}/session/async", retries=0)
+    assert client.wait_for_job("unknown", poll_interval=0.01, timeout=5)["status"] == "failed"
+    client.close()
+
+
+def test_background_client_does_not_wait_for_uploads(live_backend, clingo_call_run_sample, clingo_stable_models):
+    url, app, _ = live_backend
+    uploading, release = threading.Event(), threading.Event()
+
+    def slow(environ, start_response, wsgi_app=app.wsgi_app):
+        if "/control/" in environ["PATH_INFO"]:
+            uploading.set()
+            release.wait(5)
+        return wsgi_app(environ, start_response)
+
+    app.wsgi_app = slow
+    client = BackgroundClingoClient(viasp_backend_url=f"{url}/session/background", retries=0)
+    ctl = Control()
+    for call in clingo_call_run_sample:
+        client.register_function_call(call.name, signature(getattr(ctl, call.name)), [], call.kwargs)
+    sent = client.set_target_stable_model(clingo_stable_models)
+    assert uploading.wait(5), "The uploads should have started."
+    assert not sent.done(), "Uploading models should return before the upload finishes."
+    release.set()
+    assert sent.result(5)
+    client.close()
+    assert len(app.test_client().get("/session/background/control/calls").json) == len(clingo_call_run_sample)
+    assert len(app.test_client().get("/session/background/control/models").json) == len(clingo_stable_models)
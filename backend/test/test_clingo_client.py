@@ -0,0 +1,61 @@
+import time
+
+import pytest
+from requests import exceptions
+
+from viasp.clingoApiClient import ClingoClient, CallBuffer
+
+
+def test_client_checks_health_only_after_failures(live_backend, clingo_call_run_sample):
+    url, app, requests = live_backend
+    client = ClingoClient(viasp_backend_url=f"{url}/session/client", retries=0, health_recheck_interval=0)
+    for call in clingo_call_run_sample:
+        client._register_function_call(call)
+    assert requests == ["/session/client/healthcheck"] + \
+           ["/session/client/control/add_call"] * len(clingo_call_run_sample), \
+        "The health of the backend should only be checked once."
+    assert len(app.test_client().get("/session/client/control/calls").json) == len(clingo_call_run_sample)
+    client.backend_url = "http://localhost:1"
+    with pytest.raises(exceptions.ConnectionError):
+        client._register_function_call(clingo_call_run_sample[0])
+    assert not client.is_available(), "A failed request should make the backend unavailable."
+
+
+def test_calls_that_were_not_sent_are_kept(live_backend, clingo_call_run_sample):
+    url, app, _ = live_backend
+    client = ClingoClient(viasp_backend_url="http://localhost:1", retries=0, health_recheck_interval=0,
+                          call_buffer_size=2)
+    for call in clingo_call_run_sample:
+        client.calls.append(call)
+    with pytest.raises(exceptions.ConnectionError):
+        client.flush()
+    assert len(client.calls) == len(clingo_call_run_sample), "Calls should be kept when the backend is unavailable."
+    client.backend_url = f"{url}/session/retry"
+    client.flush()
+    assert len(client.calls) == 0
+    assert len(app.test_client().get("/session/retry/control/calls").json) == len(clingo_call_run_sample)
+
+
+def test_calls_are_sent_in_batches(clingo_call_run_sample):
+    batches = []
+    calls = CallBuffer(batches.append, max_size=3, max_delay=None)
+    for call in clingo_call_run_sample:
+        calls.append(call)
+    assert batches == [clingo_call_run_sample[:3]], "A full buffer should be sent."
+    calls.flush()
+    calls.flush()
+    assert batches == [clingo_call_run_sample[:3], clingo_call_run_sample[3:]]
+
+    calls = CallBuffer(batches.append, max_delay=0.01)
+    calls.append(clingo_call_run_sample[0])
+    time.sleep(0.02)
+    calls.append(clingo_call_run_sample[1])
+    assert batches[-1] == clingo_call_run_sample[:2] and len(calls) == 0, \
+        "The buffer should be sent with the first call after the delay."
+
+
+def test_unknown_jobs_are_reported_as_failed(live_backend):
+    url, _, _ = live_backend
+    client = ClingoClient(viasp_backend_url=f"{url}/session/jobs", retries=0)
+    job = client.wait_for_job("unknown", poll_interval=0.01, timeout=5)
+    assert job["status"] == "failed" and "404" in job["error"]
@@ -1,4 +1,14 @@
-from viasp.server.database import CallCenter
+import shutil
+import sqlite3
+import threading
+
+import pytest
+
+from networkx import node_link_graph
+
+from viasp.server.database import CallCenter, AnalyzerSnapshotStore, ProgramDatabase, SessionStore, ProgramFileStore
+from viasp.shared.event import Event, subscribe
+from viasp.shared.io import dumps
 
 
 def test_add_a_call_to_database(clingo_call_run_sample):
@@ -14,3 +24,150 @@ def test_add_a_call_to_database(clingo_call_run_sample):
     assert len(db.calls) == 4, "Database should contain 4 after adding 4."
     assert len(db.get_all()) == 4, "Database should contain 4 after adding 4."
     assert len(db.get_pending()) == 3, "Database should contain 3 pending after adding 4 and consuming one."
+
+
+
+def test_call_center_cursor_and_persistence(tmp_path, clingo_call_run_sample):
+    store = SessionStore(tmp_path / "session.sqlite")
+    db = CallCenter(store)
+    db.extend(clingo_call_run_sample[:3])
+    db.append(clingo_call_run_sample[3])
+    db.mark_call_as_used(clingo_call_run_sample[1])
+    assert db.get_pending() == [clingo_call_run_sample[i] for i in (0, 2, 3)]
+    db.mark_call_as_used(clingo_call_run_sample[0])
+    assert db.cursor == 2, "The cursor should skip calls that were used out of order."
+    assert db.get_pending() == clingo_call_run_sample[2:]
+
+    restored = CallCenter(store)
+    assert len(restored) == 4
+    assert restored.cursor == 2
+    assert [call.name for call in restored.get_pending()] == [call.name for call in clingo_call_run_sample[2:]]
+
+def test_analyzer_snapshot_store(tmp_path):
+    store = AnalyzerSnapshotStore(tmp_path, max_entries=2)
+    keys = [store.key(["a."]), store.key(["a.", "b."]), store.key(["a.b."])]
+    assert len(set(keys)) == 3, "Keys should depend on the program parts."
+    assert store.load(keys[0]) is None
+    for i, key in enumerate(keys):
+        store.save(key, {"i": i})
+    assert store.load(keys[2]) == {"i": 2}
+    assert len(list(tmp_path.iterdir())) == 2, "Only the most recent snapshots should be kept."
+
+
+def test_analyzer_snapshots_are_saved_concurrently(tmp_path):
+    store = AnalyzerSnapshotStore(tmp_path, max_entries=1)
+    keys = [store.key(["a."]), store.key(["b."])]
+    errors = []
+
+    def save(i):
+        try:
+            for _ in range(50):
+                store.save(keys[i % 2], {"i": i})
+                store.load(keys[i % 2])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [], "Sessions saving and evicting snapshots at the same time should not fail."
+    assert [path.suffix for path in tmp_path.iterdir()] == [".json"]
+
+
+def test_program_database_appends_segments(tmp_path):
+    store = SessionStore(tmp_path / "session.sqlite")
+    db = ProgramDatabase(store)
+    changes = []
+    subscribe(Event.PROGRAM_CHANGED, lambda path, version: changes.append(version) if path == store.path else None)
+    db.clear_program()
+    db.add_to_program("a.\r\n")
+    db.add_to_program("b :- a.")
+    version = db.version
+    assert db.get_program() == "a.\r\nb :- a."
+    assert db.get_program_segments() == ["a.\r\n", "b :- a."]
+    assert db.get_segment_boundaries() == [(0, 4), (4, 11)]
+    assert changes == [version - 2, version - 1, version]
+
+    other = ProgramDatabase(SessionStore(tmp_path / "session.sqlite"))
+    assert other.get_program() is db.get_program(), "The program should be read from memory."
+    # a change of another process, which bypasses the in-memory copy
+    store.add_program_segment(program=" c.")
+    assert db.get_program_segments() == ["a.\r\n", "b :- a.", " c."], "Changes of other processes should be reloaded."
+    assert db.version > version
+    db.add_to_program(" d.")
+    assert db.get_program() == "a.\r\nb :- a. c. d."
+
+
+def test_loaded_files_are_referenced(tmp_path):
+    store = ProgramFileStore(tmp_path / "files")
+    path = store.put("b :- a.\n")
+    assert store.put("b :- a.\n") == path, "Equal programs should be stored once."
+    assert store.read(path)[1] == "b :- a.\n"
+    session = SessionStore(tmp_path / "session.sqlite")
+    db = ProgramDatabase(session, store)
+    db.clear_program()
+    db.add_to_program("a.\n")
+    db.add_file_to_program(path)
+    assert db.get_program_segments() == ["a.\n", "b :- a.\n"]
+    assert session.get_program_segments()[1][1] == (None, store.read(path)[0], path), \
+        "The file should not be copied into the store."
+
+    session.add_program_segment(program="c.\n")
+    assert db.get_program_segments() == ["a.\n", "b :- a.\n", "c.\n"], "A reload should read the referenced file."
+
+
+def test_deleted_and_changed_loaded_files_are_read_from_their_copy(tmp_path):
+    store = ProgramFileStore(tmp_path / "files")
+    loaded = tmp_path / "loaded.lp"
+    loaded.write_text("b :- a.\n")
+    session = SessionStore(tmp_path / "session.sqlite")
+    db = ProgramDatabase(session, store)
+    db.clear_program()
+    db.add_file_to_program(loaded)
+
+    loaded.write_text("b :- not a.\n")
+    session.add_program_segment(program="c.\n")
+    assert db.get_program() == "b :- a.\nc.\n", "A changed file should be read from its copy."
+    loaded.unlink()
+    session.add_program_segment(program="d.\n")
+    assert db.get_program() == "b :- a.\nc.\nd.\n", "A deleted file should be read from its copy."
+    shutil.rmtree(tmp_path / "files")
+    session.add_program_segment(program="e.\n")
+    with pytest.raises(FileNotFoundError, match="deleted"):
+        db.get_program()
+
+
+def test_session_store(tmp_path, serializable_graph, clingo_call_run_sample, clingo_stable_models):
+    store = SessionStore(tmp_path / "session.sqlite")
+    assert store.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    graph = node_link_graph(serializable_graph)
+    version = store.graph_version
+    store.save_graph(graph)
+    assert store.graph_version == version + 1
+    loaded = store.load_graph()
+    assert list(loaded.nodes) == list(graph.nodes)
+    assert list(loaded.edges) == list(graph.edges)
+    assert dumps(list(loaded.edges(data=True))) == dumps(list(graph.edges(data=True)))
+    node = next(iter(graph.nodes))
+    assert store.get_node(node.uuid) == node
+    source, target, transformation = next(iter(graph.edges(data="transformation")))
+    assert dumps(store.get_transformation(str(transformation.id))) == dumps(transformation)
+    assert target in store.get_children(transformation.id)
+    assert store.get_transformations()[0].id == transformation.id
+
+    store.add_calls(clingo_call_run_sample)
+    store.add_calls(clingo_call_run_sample[:1])
+    store.mark_calls_as_used([clingo_call_run_sample[0].uuid])
+    assert len(store.get_calls()) == 4
+    assert [call.name for call in store.get_calls(pending_only=True)] == \
+        [call.name for call in clingo_call_run_sample[1:]]
+
+    version = store.models_version
+    assert store.save_models(clingo_stable_models) == version + 1
+    assert store.load_models() == (version + 1, clingo_stable_models)
+
+    other_process = sqlite3.connect(store.path)
+    assert other_process.execute("SELECT COUNT(*) FROM nodes").fetchone()[0] == len(graph.nodes)
+    other_process.close()
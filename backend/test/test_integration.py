@@ -11,7 +11,7 @@ def test_calls_are_filtered_after_application(clingo_call_run_sample):
     db.extend(clingo_call_run_sample)
     assert len(db.get_all()) == 4, "There should be four unused calls before reconstruction."
     assert len(db.get_pending()) == 4, "There should be four unused calls before reconstruction."
-    _ = apply_multiple(db.get_all())
+    _ = apply_multiple(db.get_all(), call_center=db)
     assert len(db.get_all()) == 4, "Get all should still return all of them after application."
     assert len(db.get_pending()) == 0, "The call objects should be marked as used after application."
 
@@ -1,16 +1,18 @@
 import json
+import pytest
 
 import clingo.ast
 import networkx as nx
 from clingo import Control, ModelType
 from networkx import node_link_data, node_link_graph
 
-from viasp.shared.io import DataclassJSONEncoder, DataclassJSONDecoder, clingo_model_to_stable_model
+from viasp.shared.io import DataclassJSONEncoder, DataclassJSONDecoder, clingo_model_to_stable_model, dumps, loads, orjson, \
+    iter_loads, binary_mimetypes, dumps_binary, loads_binary, clingo_symbols_to_stable_model
 from helper import get_stable_models_for_program
 from viasp.asp.justify import build_graph
 from viasp.asp.reify import ProgramAnalyzer, reify_list
 from viasp.shared.model import StableModel, ClingoMethodCall, Signature, Transformation, TransformationError, \
-    FailedReason
+    FailedReason, Node, SymbolIdentifier
 
 
 def test_networkx_graph_with_dataclasses_is_isomorphic_after_dumping_and_loading_again():
@@ -48,6 +50,40 @@ def test_serialization_model():
         assert isinstance(model, StableModel)
 
 
+def test_model_capture_policy():
+    ctl = Control(["0"])
+    ctl.add("base", [], "{a(1..2)}. b(X) :- a(X). #show a/1.")
+    ctl.ground([("base", [])])
+    lean, full = [], []
+    with ctl.solve(yield_=True) as h:
+        for model in h:
+            lean.append(clingo_model_to_stable_model(model))
+            full.append(clingo_model_to_stable_model(model, ("atoms", "shown")))
+    for lean_model, full_model in zip(lean, full):
+        assert isinstance(lean_model.atoms, tuple)
+        assert list(lean_model.shown) == []
+        assert all(symbol.name == "a" for symbol in full_model.shown)
+        assert lean_model == full_model
+        assert lean_model.fingerprint() == full_model.fingerprint()
+    assert len(set(lean + full)) == 4
+    colliding = StableModel(atoms=[clingo.Function("x")])
+    colliding._fingerprint = lean[0].fingerprint()
+    assert colliding != lean[0], "Models whose fingerprints collide should still differ."
+    decoded = loads(dumps(lean))
+    assert set(decoded) == set(lean)
+
+
+def test_models_with_equal_atoms_are_equal():
+    ctl = Control(["0"])
+    ctl.add("base", [], "{a(1..2)}. :~ a(X). [1,X]")
+    ctl.ground([("base", [])])
+    with ctl.solve(yield_=True) as h:
+        captured = [clingo_model_to_stable_model(model) for model in h]
+    assert captured[0].cost == [0]
+    rebuilt = [clingo_symbols_to_stable_model(model.atoms) for model in captured]
+    assert rebuilt == captured, "Models from the same atoms should be equal, whatever their cost."
+
+
 def test_serialization_calls(clingo_call_run_sample):
     serialized = json.dumps(clingo_call_run_sample, cls=DataclassJSONEncoder)
     deserialized = json.loads(serialized, cls=DataclassJSONDecoder)
@@ -85,3 +121,85 @@ def test_signature():
     object_to_serialize = Signature("a", 1)
     serialized = json.dumps(object_to_serialize, cls=DataclassJSONEncoder)
     assert serialized
+
+
+def test_transformation_rule_texts_are_taken_from_the_analysis(monkeypatch):
+    analyzer = ProgramAnalyzer()
+    sorted_program = analyzer.sort_program("c(1).\nb(X) :-\n  c(X).  a(X) :- b(X).")
+
+    def no_database():
+        raise AssertionError("the program database should not be read")
+    monkeypatch.setattr("viasp.shared.io.ProgramDatabase", no_database)
+    serialized = json.loads(json.dumps(sorted_program, cls=DataclassJSONEncoder))
+    assert [t["rules"] for t in serialized] == [["b(X) :-\n  c(X)."], ["a(X) :- b(X)."]]
+    loaded = json.loads(json.dumps(serialized), cls=DataclassJSONDecoder)
+    assert json.loads(json.dumps(loaded, cls=DataclassJSONEncoder)) == serialized
+
+
+def test_node_caches_sorted_atoms_until_they_are_replaced():
+    a, b = SymbolIdentifier(clingo.Function("a")), SymbolIdentifier(clingo.Function("b"))
+    node = Node(frozenset([b]), 1, frozenset([b, a]))
+    assert node.sorted_atoms() == [a, b]
+    assert node.sorted_atoms() is node.sorted_atoms()
+    node.atoms = frozenset([b])
+    assert node.sorted_atoms() == [b]
+
+
+def test_json_backends_serialize_graphs_alike():
+    orig_program = "c(1). c(2). b(X) :- c(X). a(X) :- b(X)."
+    analyzer = ProgramAnalyzer()
+    sorted_program = analyzer.sort_program(orig_program)
+    graph = build_graph(get_stable_models_for_program(orig_program), reify_list(sorted_program), analyzer, set())
+    data = [node_link_data(graph), TransformationError(analyzer.rules[0], FailedReason.WARNING),
+            StableModel(), ClingoMethodCall("ground", {})]
+    expected = json.loads(json.dumps(data, cls=DataclassJSONEncoder))
+    assert json.loads(dumps(data, backend="json")) == expected
+    if orjson is not None:
+        assert json.loads(dumps(data, backend="orjson")) == expected
+    assert nx.is_isomorphic(node_link_graph(loads(dumps(data[0]))), graph)
+
+
+def test_compact_symbol_encoding_round_trip():
+    symbols = [clingo.parse_term(s) for s in
+               ['edge(1,-2)', '"a \\"quoted\\" \\\\ string\\n"', '-3', '(1,"x",(a,))', '()', '-a(b)', '#inf', '#sup',
+                'f("a/b+c",-(1,2))']]
+    data = [StableModel(atoms=symbols), ClingoMethodCall("assign_external", {"external": symbols[0], "truth": True}),
+            symbols, {"nested": [(symbols[3], 1)]}]
+    for backend in ["json"] + (["orjson"] if orjson is not None else []):
+        serialized = dumps(data, backend=backend, compact_symbols=True)
+        assert '"arguments"' not in serialized
+        model, call, plain, nested = loads(serialized)
+        assert list(model.atoms) == symbols
+        assert call.kwargs["external"] == symbols[0]
+        assert plain == symbols
+        assert nested == {"nested": [[symbols[3], 1]]}
+
+
+def test_iter_loads_decodes_chunks_element_by_element():
+    symbols = [clingo.parse_term(s) for s in ['a(1)', 'b(c,-12)']]
+    data = [StableModel(atoms=symbols), 12345, "ä€", [], {"x": None}]
+    for compact_symbols in [False, True]:
+        serialized = dumps(data, compact_symbols=compact_symbols).encode("utf-8")
+        for size in [1, 3, 64, len(serialized)]:
+            chunks = [serialized[i:i + size] for i in range(0, len(serialized), size)]
+            assert list(iter_loads(chunks)) == data
+    elements = iter_loads(iter(['[1, {"a"', ': 2}, ', '"incomplete']))
+    assert next(elements) == 1
+    assert next(elements) == {"a": 2}
+    with pytest.raises(ValueError):
+        next(elements)
+    with pytest.raises(ValueError):
+        list(iter_loads(['{"not": "an array"}']))
+
+
+@pytest.mark.skipif(not binary_mimetypes(), reason="neither msgpack nor cbor2 is installed")
+def test_binary_formats_decode_like_json():
+    symbols = [clingo.parse_term(s) for s in ['a(1)', 'b(c,-2)', '(1,(x,))']]
+    data = [StableModel(atoms=symbols), ClingoMethodCall("ground", {"parts": [("base", [])]}),
+            SymbolIdentifier(symbols[1]), {"set": frozenset([1]), "nested": [symbols[2]]}]
+    expected = loads(dumps(data, backend="json"))
+    for mimetype in binary_mimetypes():
+        for compact_symbols in [False, True]:
+            assert loads_binary(dumps_binary(data, mimetype, compact_symbols), mimetype) == expected
+        with pytest.raises(ValueError):
+            loads_binary(b"\xc1", mimetype)
@@ -0,0 +1,36 @@
+import threading
+
+from clingo import Control
+
+from viasp.server.jobs import Jobs, track, CANCELLED, DONE, FAILED
+
+
+def test_jobs_report_progress_and_results():
+    jobs = Jobs()
+    job = jobs.start("count", lambda job: sum(track(range(4), "counting", 4)))
+    job.wait(10)
+    assert job.status == DONE
+    assert job.result == 6
+    assert (job.stage, job.done, job.total) == ("counting", 4, 4)
+    failing = jobs.start("fail", lambda job: 1 / 0).wait(10)
+    assert failing.status == FAILED
+    assert "ZeroDivisionError" in failing.error
+
+
+def test_cancelled_jobs_stop_solving():
+    started = threading.Event()
+
+    def solve(job):
+        ctl = Control(["0"])
+        ctl.add("base", [], "{a(1..30)}. :- #count{X: a(X)} = 15.")
+        ctl.ground([("base", [])])
+        with job.interruptible(ctl), ctl.solve(async_=True) as handle, job.interruptible(handle):
+            started.set()
+            handle.wait()
+
+    jobs = Jobs()
+    job = jobs.start("solve", solve)
+    assert started.wait(10)
+    job.cancel()
+    job.wait(10)
+    assert job.status == CANCELLED
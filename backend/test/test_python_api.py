@@ -239,11 +239,12 @@ def test_mark_model_from_file(client):
     res = client.get("control/models")
     assert res.status_code == 200
     assert len(res.json) == 1
+    # marking the same model again does not duplicate it
     mark_from_file(sample_model)
     show()
     res = client.get("control/models")
     assert res.status_code == 200
-    assert len(res.json) == 2
+    assert len(res.json) == 1
 
 
 def test_unmark_model_from_clingo_model(client):
@@ -325,7 +326,7 @@ def test_call_in_different_order(client):
     show()
     res = client.get("control/models")
     assert res.status_code == 200
-    assert len(res.json) == 2
+    assert len(res.json) == 1
 
 def test_mix_methods(client):
     debug_client = DebugClient(client)
@@ -1,3 +1,4 @@
+import json
 from typing import List
 
 import clingo
@@ -6,7 +7,8 @@ from clingo.ast import ASTType, parse_string
 
 from viasp.asp.ast_types import (SUPPORTED_TYPES, UNSUPPORTED_TYPES,
                                  make_unknown_AST_enum_types)
-from viasp.asp.reify import ProgramAnalyzer, transform
+from viasp.asp.parse_cache import parse_program
+from viasp.asp.reify import ProgramAnalyzer, extract_symbols, transform
 
 
 def assertProgramEqual(actual, expected, message=None):
@@ -290,3 +292,92 @@ def test_constraints_gets_put_last():
     assert len(result[0].rules) == 1
     assert len(result[1].rules) == 1
     assert len(result[2].rules) == 3
+
+
+def test_add_programs_equals_add_program_of_concatenation():
+    programs = ["p(1). p(2).\nq(a, -1).", "r(X) :- p(X).\ns(X) :- r(X), q(_, _).", "#const n=3. t(n)."]
+    whole = ProgramAnalyzer()
+    whole.add_program("".join(programs))
+    split = ProgramAnalyzer()
+    split.add_programs(programs, processes=2, parallel_threshold=0)
+
+    assert set(whole.get_facts()) == set(split.get_facts())
+    assert [t.rules for t in whole.get_sorted_program()] == [t.rules for t in split.get_sorted_program()]
+    assert [r.location for r in whole.rules if len(r.body)] == [r.location for r in split.rules if len(r.body)]
+
+
+def test_facts_only_program_skips_the_transformer():
+    analyzer = ProgramAnalyzer()
+    analyzer.add_programs(["a(1). a(2). b(\"s\",(1,2)).", "c(X) :- a(X)."], processes=1)
+    assert len(analyzer.fact_symbols) == 3
+    assert not analyzer.facts
+    assert len(analyzer.rules) == 1
+
+
+def test_analyzer_snapshot_restores_the_analysis():
+    programs = ["p(1). p(2).\n", "r(X) :- p(X).\n  x(\"ä\"). s(X):-r(X),x(_).\n:- #count{X: p(X)} > 3.",
+                "#const n=3. t(n). #minimize{1,X: r(X)}. {a;b}. c :- a. a :- c."]
+    analyzer = ProgramAnalyzer()
+    analyzer.add_programs(programs)
+    snapshot = json.loads(json.dumps(analyzer.to_snapshot("".join(programs))))
+    restored = ProgramAnalyzer.from_snapshot(snapshot)
+
+    assert [t.rules for t in analyzer.get_sorted_program()] == [t.rules for t in restored.get_sorted_program()]
+    assert [r.location for r in analyzer.rules] == [r.location for r in restored.rules]
+    assert set(analyzer.get_facts()) == set(restored.get_facts())
+    assert analyzer.check_positive_recursion() == restored.check_positive_recursion()
+    assert len(restored.pass_through) == 1
+
+
+def test_get_facts_matches_grounding_and_is_cached():
+    analyzer = ProgramAnalyzer()
+    analyzer.add_program("#const n=2. a(1). b(\"s\", (1, x)). c(n). d(1..3). e(2+3). -f(1). g(m). h(n, 1).")
+    facts = analyzer.get_facts()
+    assert set(facts) == set(extract_symbols(analyzer.facts, analyzer.constants))
+    assert analyzer.get_facts() is facts
+
+    analyzer.add_program("i(n).")
+    assert clingo.parse_term("i(2)") in analyzer.get_facts()
+
+
+def test_incremental_add_program_equals_whole_program():
+    programs = ["p(1). q(X) :- p(X).\n", "r(X) :- q(X).\n", "s(X) :- r(X), not t(X).\n", "p(X) :- s(X).\n:- r(2)."]
+    incremental = ProgramAnalyzer()
+    for program in programs:
+        incremental.add_program(program)
+        incremental.get_sorted_program()
+    whole = ProgramAnalyzer()
+    whole.add_program("".join(programs))
+
+    assert [t.rules for t in incremental.get_sorted_program()] == [t.rules for t in whole.get_sorted_program()]
+    assert [r.location for r in incremental.rules] == [r.location for r in whole.rules]
+    assert incremental.check_positive_recursion() == whole.check_positive_recursion()
+
+
+def test_rules_nothing_depends_on_are_appended_to_the_sorted_program():
+    analyzer = ProgramAnalyzer()
+    analyzer.add_program("a(1). b(X) :- a(X).")
+    before = analyzer.get_sorted_program()
+    analyzer.add_program("c(X) :- b(X), a(X).")
+    assert analyzer.can_append_to_sorted(analyzer._unsorted_rules)
+    after = analyzer.get_sorted_program()
+    assert [t.rules for t in after[:-1]] == [t.rules for t in before]
+    assert len(after) == len(before) + 1
+    analyzer.add_program("a(X) :- c(X).")
+    assert not analyzer.can_append_to_sorted(analyzer._unsorted_rules)
+
+
+def test_analyzer_and_relaxer_share_the_parsed_program():
+    from viasp.asp.relax import ProgramRelaxer, relax_constraints
+    parts = ["p(\"ä\").\nq(X) :- p(X),\n  not r(X).", " :- q(1)."]
+    parse_program.cache_clear()
+    analyzer = ProgramAnalyzer()
+    analyzer.add_programs(parts)
+    relax_constraints(ProgramRelaxer(), parts)
+    assert parse_program.cache_info().misses == 3
+
+    rule = next(r for r in analyzer.rules if len(r.body) == 2)
+    source = parse_program(parts[0]).source
+    assert source.get_source(rule.location) == "q(X) :- p(X),\n  not r(X)."
+    constraint = next(r for r in analyzer.rules if str(r).startswith("#false"))
+    assert parse_program(parts[1], 2, 11).source.get_source(constraint.location) == ":- q(1)."
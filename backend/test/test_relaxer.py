@@ -1,5 +1,6 @@
 from typing import List
 from clingo.ast import parse_string, AST
+from viasp.asp.parse_cache import parse_programs
 from viasp.asp.relax import relax_constraints, ProgramRelaxer
 
 
@@ -92,4 +93,11 @@ def test_double_negation_literal():
     rule = "c(1..3).d(X):-c(X).:- not not d(X)."
     expected = "c((1..3)).d(X) :- c(X).unsat(r1) :- not not d(X).:~ unsat(R,T). [1,R,T]"
     visitor = ProgramRelaxer(head_name = "unsat", collect_variables = True)
-    assertProgramEqual(relax_constraints(visitor,rule), parse_program_to_ast(expected))
\ No newline at end of file
+    assertProgramEqual(relax_constraints(visitor,rule), parse_program_to_ast(expected))
+
+def test_relaxing_program_parts_does_not_change_the_shared_statements():
+    parts = ["a(1).\n:- a(X), X > 0.", "\nb :- a(1).\n:- b."]
+    visitor = ProgramRelaxer(head_name = "unsat", collect_variables = True)
+    relaxed = relax_constraints(visitor, parts)
+    assertProgramEqual(relaxed, relax_constraints(ProgramRelaxer(head_name = "unsat"), "".join(parts)))
+    assert [str(s) for s in parse_programs(parts) if "unsat" in str(s)] == []
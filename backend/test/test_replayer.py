@@ -1,4 +1,8 @@
-from viasp.asp.replayer import apply_multiple
+from dataclasses import replace
+from unittest import mock
+
+from viasp.asp.replayer import apply_multiple, ReplayCheckpoints
+from viasp.server.database import ProgramDatabase
 
 
 def test_run(clingo_call_run_sample):
@@ -9,3 +13,17 @@ def test_run(clingo_call_run_sample):
             _ = m.symbols(atoms=True)
             num_models += 1
     assert num_models == 2
+
+
+def test_replays_continue_from_checkpoints(clingo_call_run_sample):
+    db = ProgramDatabase()
+    checkpoints = ReplayCheckpoints()
+    checkpoints.replay(clingo_call_run_sample, db)
+    assert db.get_program() == "a. {b}. c :- not b."
+    db.clear_program()
+    # the same script run again, with new calls
+    calls = [replace(call, uuid=None) for call in clingo_call_run_sample]
+    with mock.patch.object(ProgramDatabase, "add_to_program") as add_to_program:
+        checkpoints.replay(calls, db)
+    add_to_program.assert_not_called()
+    assert db.get_program() == "a. {b}. c :- not b."
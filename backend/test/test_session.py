@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import time
+from os.path import join
+
+import pytest
+
+from viasp.server.factory import create_app
+from viasp.server.database import SessionStore, ProgramDatabase
+from viasp.server.session import SessionRegistry
+from viasp.shared.defaults import SESSION_HEADER
+
+
+def test_sessions_have_their_own_program(clingo_call_run_sample):
+    client = create_app().test_client()
+    client.post("/session/first/control/add_call", json=clingo_call_run_sample)
+    assert client.get("/session/first/control/program").data == b"a. {b}. c :- not b."
+    assert client.get("/control/program", headers={SESSION_HEADER: "first"}).data == b"a. {b}. c :- not b."
+    assert client.get("/session/second/control/program").data == b""
+    assert len(client.get("/session/second/control/calls").json) == 0
+    assert client.get("/control/program", headers={SESSION_HEADER: "../first"}).status_code == 400
+
+
+def test_replaying_a_session_does_not_use_the_calls_of_another(clingo_call_run_sample):
+    client = create_app().test_client()
+    client.post("/session/first/control/add_call", json=clingo_call_run_sample)
+    client.post("/session/second/control/add_call", json=clingo_call_run_sample)
+    assert client.get("/session/first/control/program").data == b"a. {b}. c :- not b."
+    assert client.get("/session/second/control/program").data == b"a. {b}. c :- not b."
+
+
+def test_workers_share_the_program_and_models_of_a_session(tmp_path, clingo_stable_models):
+    first, second = SessionRegistry(tmp_path).get("shared"), SessionRegistry(tmp_path).get("shared")
+    assert second.models == []
+    first.models = clingo_stable_models
+    assert second.models == clingo_stable_models, "The models should be read from the store of the session."
+    second.models = []
+    assert first.models == []
+    ProgramDatabase(first.store).add_to_program("a.")
+    assert second.store.get_program_segments()[1] == [("a.", None, None)]
+
+
+def test_idle_and_surplus_sessions_are_evicted(tmp_path):
+    sessions = SessionRegistry(tmp_path, max_sessions=2, idle_timeout=60)
+    first = sessions.get("first")
+    sessions.get("second")
+    assert sessions.get("first") is first
+    sessions.get("third")
+    assert set(sessions.sessions) == {"first", "third"}, "The least recently used session should be evicted."
+    first.last_used = time.monotonic() - 120
+    sessions.get("third")
+    assert set(sessions.sessions) == {"third"}, "Idle sessions should be evicted."
+
+
+def test_busy_sessions_are_not_evicted(tmp_path):
+    sessions = SessionRegistry(tmp_path, max_sessions=1)
+    first = sessions.enter("first")
+    sessions.get("second")
+    assert "first" in sessions.sessions, "Sessions that handle a request should not be evicted."
+    sessions.leave(first)
+    job = first.jobs.start("wait", lambda job: job.cancelled.wait(5))
+    sessions.get("second")
+    assert "first" in sessions.sessions, "Sessions that run a job should not be evicted."
+    job.cancel()
+    job.wait()
+    sessions.get("second")
+    assert set(sessions.sessions) == {"second"}
+
+
+def test_evicted_sessions_close_all_connections_in_the_background(tmp_path):
+    sessions = SessionRegistry(tmp_path, max_sessions=1)
+    first = sessions.get("first")
+    connections = []
+
+    def hold_connection(_):
+        connections.append(SessionStore(join(first.directory, "viasp_session.sqlite")).connection)
+
+    first.jobs.start("hold", hold_connection).wait()
+    sessions.get("second")
+    closing = sessions.closing.get("first")
+    if closing is not None:
+        closing.join()
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute("SELECT 1")
+    assert not os.path.exists(first.directory)
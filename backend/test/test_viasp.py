@@ -68,3 +68,74 @@ def test_load_from_stdin(client):
     res = client.get("control/program")
     assert res.status_code == 200
     assert res.data == b"sample.{encoding} :- sample."
+
+
+class ChangesDebugClient(DebugClient):
+    def __init__(self, internal_client: FlaskClient):
+        super().__init__(internal_client)
+        self.updates = []
+
+    def update_target_stable_models(self, stable_models, added, removed):
+        self.updates.append((list(added), list(removed)))
+        self.client.post("control/models/update", json={"added": added, "removed": removed})
+
+
+def test_marked_models_are_deduplicated_and_sent_as_changes(client):
+    debug_client = ChangesDebugClient(client)
+    ctl = wrapper.Control(["0"], _viasp_client=debug_client, model_capture=("atoms", "shown"))
+    ctl.add("base", [], "{a(1..2)}.")
+    ctl.ground([("base", [])])
+    with ctl.solve(yield_=True) as handle:
+        assert ctl.viasp.mark_many(handle) == 4
+    ctl.viasp.mark(StableModel(atoms=[]))
+    ctl.viasp.show()
+    assert debug_client.updates == []
+    assert len(client.get("control/models").json) == 4
+
+    assert ctl.viasp.unmark_where(lambda model: len(model.atoms) == 0) == 1
+    ctl.viasp.show()
+    assert debug_client.updates == [([], [StableModel(atoms=[])])]
+    assert len(client.get("control/models").json) == 3
+    ctl.viasp.show()
+    assert len(debug_client.updates) == 1
+
+
+class RecordingDebugClient(DebugClient):
+    def __init__(self, internal_client: FlaskClient):
+        super().__init__(internal_client)
+        self.names = []
+
+    def register_function_call(self, name: str, sig: Signature, args: Sequence[Any], kwargs: Dict[str, Any]):
+        self.names.append(name)
+        super().register_function_call(name, sig, args, kwargs)
+
+
+def test_only_the_configured_methods_are_recorded(client):
+    debug_client = RecordingDebugClient(client)
+    ctl = wrapper.Control(["0"], _viasp_client=debug_client, recorded_methods={"ground"})
+    ctl.add("base", [], "{a}.")
+    ctl.ground([("base", [])])
+    assert len(ctl.symbolic_atoms) == 1
+    assert ctl.solve().satisfiable
+    assert debug_client.names == ["__init__", "add", "ground"]
+    assert [call.name for call in client.get("control/calls").json[-3:]] == debug_client.names
+
+
+class FailingUpdateDebugClient(ChangesDebugClient):
+    def update_target_stable_models(self, stable_models, added, removed):
+        self.updates.append((list(added), list(removed)))
+        return False
+
+
+def test_all_models_are_sent_after_a_failed_update(client):
+    debug_client = FailingUpdateDebugClient(client)
+    ctl = wrapper.Control(["0"], _viasp_client=debug_client)
+    ctl.viasp.mark(StableModel(atoms=[]))
+    ctl.viasp.show()
+    ctl.viasp.unmark(StableModel(atoms=[]))
+    ctl.viasp.show()
+    assert len(debug_client.updates) == 1
+    assert len(client.get("control/models").json) == 1, "The failed update should not have been received."
+    ctl.viasp.show()
+    assert len(client.get("control/models").json) == 0, "All marked models should be sent after a failed update."
+    assert len(debug_client.updates) == 1